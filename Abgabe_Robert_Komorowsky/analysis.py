@@ -1,4 +1,4 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import json
 import os
 from datetime import datetime
@@ -47,16 +47,28 @@ def compute_journal_stats(processed_data: List[Dict[str, Any]]) -> Dict[str, int
             journals.append(journal_name)  # Keine Auftrennung an Kommata
     return dict(Counter(journals))
 
-def save_results(processed_data: List[Dict[str, Any]], metadata: Dict[str, Any]) -> None:
+def save_results(processed_data: List[Dict[str, Any]],
+                 metadata: Dict[str, Any],
+                 cache_stats: Optional[Dict[str, int]] = None,
+                 name: Optional[str] = None) -> str:
     """
     Speichert die verarbeiteten Ergebnisse und die Metadaten in separaten JSON-Dateien mit Zeitstempel.
     
     :param processed_data: Liste der verarbeiteten Publikationen.
     :param metadata: Dictionary mit zusätzlichen Metadaten.
+    :param cache_stats: Optionale Zähler des API-Antwort-Caches (Treffer, Fehlzugriffe, Revalidierungen),
+                        die unter dem Schlüssel "cache" in die Metadaten geschrieben werden.
+    :param name: Optionaler Name, der an die Dateinamen angehängt wird (z. B. bei mehreren Suchen pro Lauf).
+    :return: Der Pfad der Ergebnisdatei.
     """
+    if cache_stats is not None:
+        metadata = {**metadata, "cache": cache_stats}
+
     print("Speichere Ergebnisse und Metadaten...")
     os.makedirs("data", exist_ok=True)
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    if name:
+        timestamp = f"{timestamp}_{name}"
 
     results_filename = f"literature_search_results_{timestamp}.json"
     results_filepath = os.path.join("data", results_filename)
@@ -70,6 +82,7 @@ def save_results(processed_data: List[Dict[str, Any]], metadata: Dict[str, Any])
 
     print(f"Ergebnisse wurden in '{results_filepath}' gespeichert.")
     print(f"Metadaten wurden in '{metadata_filepath}' gespeichert.")
+    return results_filepath
 
 def display_results(processed_data: List[Dict[str, Any]]) -> None:
     """
@@ -0,0 +1,123 @@
+from typing import List, Dict, Any, Optional, Tuple
+import json
+import os
+import re
+import sys
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+from rate_limiter import configure_rate_limits
+from response_cache import ResponseCache
+from extraction import process_papers
+from analysis import save_results, display_results
+from main import run_search, build_metadata, RATE_LIMIT_STATE
+
+SPEC_DEFAULTS = {
+    "or_terms": [],
+    "not_terms": [],
+    "start_year": None,
+    "end_year": None,
+    "last_n_years": None,
+    "limit": 10,
+    "open_access_only": False,
+    "pdf_available_only": False,
+    "bulk": False,
+    "field_profile": "full",
+    "two_phase": False
+}
+
+def load_specs(spec_path: str) -> List[Dict[str, Any]]:
+    """
+    Lädt die Suchaufträge aus einer YAML- oder JSON-Datei.
+
+    Die Datei enthält entweder direkt eine Liste von Suchaufträgen oder ein Objekt mit den Schlüsseln
+    "defaults" (gemeinsame Parameter) und "queries" (Liste der Suchaufträge). Jeder Suchauftrag verwendet
+    die Parameternamen von main.main; "required_terms" ist Pflicht, "name" optional.
+
+    :param spec_path: Pfad zur Datei (.yaml/.yml oder .json).
+    :return: Liste vollständiger Suchaufträge mit eindeutigem Namen.
+    """
+    with open(spec_path, "r", encoding="utf-8") as f:
+        if spec_path.endswith((".yaml", ".yml")):
+            if yaml is None:
+                raise ImportError("Für YAML-Dateien wird das Paket 'pyyaml' benötigt.")
+            content = yaml.safe_load(f)
+        else:
+            content = json.load(f)
+
+    if isinstance(content, list):
+        defaults, queries = {}, content
+    else:
+        defaults, queries = content.get("defaults", {}), content.get("queries", [])
+
+    specs = []
+    for index, query in enumerate(queries, start=1):
+        spec = {**SPEC_DEFAULTS, **defaults, **query}
+        if not spec.get("required_terms"):
+            raise ValueError(f"Suchauftrag {index} enthält keine 'required_terms'.")
+        spec["name"] = re.sub(r"[^\w\-]", "_", str(spec.get("name") or f"query_{index}"))
+        specs.append(spec)
+    return specs
+
+def run_batch(specs: List[Dict[str, Any]], cache: Optional[ResponseCache] = None) -> Dict[str, Any]:
+    """
+    Führt mehrere Suchaufträge in einem Prozess aus.
+
+    Alle Suchen teilen sich Antwort-Cache, Rate-Limiter und bereits ausgeführte Teilanfragen (letztere nur
+    zwischen Suchaufträgen mit denselben Filtern, demselben Limit und demselben Feldprofil). Die gefundenen
+    Publikationen werden anhand der paperId dedupliziert und gemeinsam nur einmal verarbeitet
+    (PDF-Download, Vektorisierung mit demselben Modell in einen gemeinsamen Index, KI-Analyse).
+    Anschließend werden Ergebnisse und Metadaten je Suchauftrag gespeichert.
+
+    :param specs: Suchaufträge, z. B. aus load_specs.
+    :param cache: Optionaler ResponseCache (Standard: data/http_cache.sqlite3).
+    :return: Zusammenfassung mit der Anzahl der Treffer je Suchauftrag sowie eindeutiger und doppelter Publikationen.
+    """
+    os.makedirs("data", exist_ok=True)
+    configure_rate_limits(RATE_LIMIT_STATE)
+    own_cache = cache is None
+    cache = cache or ResponseCache()
+    memo: Dict[Tuple[str, Tuple[Any, ...]], Tuple[List[Dict[str, Any]], bool]] = {}
+
+    papers_by_id: Dict[str, Dict[str, Any]] = {}
+    searches = []
+    for spec in specs:
+        print(f"\nSuchauftrag '{spec['name']}'...")
+        search_parameters, papers, search_stats = run_search(
+            spec["required_terms"], spec["or_terms"], spec["not_terms"], spec["start_year"], spec["end_year"],
+            spec["last_n_years"], spec["limit"], spec["open_access_only"], spec["pdf_available_only"],
+            spec["bulk"], spec["field_profile"], spec["two_phase"], cache=cache, memo=memo
+        )
+        paper_ids = []
+        for paper in papers:
+            paper_id = paper.get("paperId") or paper.get("title")
+            papers_by_id.setdefault(paper_id, paper)
+            paper_ids.append(paper_id)
+        searches.append((spec, search_parameters, search_stats, paper_ids))
+
+    total_hits = sum(len(paper_ids) for *_, paper_ids in searches)
+    print(f"\n{len(papers_by_id)} eindeutige Publikationen aus {total_hits} Treffern in {len(specs)} Suchaufträgen.")
+    records_by_id = dict(zip(papers_by_id, process_papers(list(papers_by_id.values()))))
+
+    summary = {"queries": {}, "unique_papers": len(papers_by_id), "duplicates": total_hits - len(papers_by_id)}
+    for spec, search_parameters, search_stats, paper_ids in searches:
+        processed_data = [records_by_id[paper_id] for paper_id in paper_ids]
+        metadata = build_metadata(search_parameters, search_stats, processed_data)
+        metadata["batch"] = {"name": spec["name"], "queries": len(specs), **{k: summary[k] for k in ("unique_papers", "duplicates")}}
+
+        print(f"\nAnalyse-Ergebnisse für '{spec['name']}':")
+        print(metadata["analysis"])
+        display_results(processed_data)
+        save_results(processed_data, metadata, cache_stats=cache.stats(), name=spec["name"])
+        summary["queries"][spec["name"]] = len(processed_data)
+
+    if own_cache:
+        cache.close()
+    return summary
+
+if __name__ == "__main__":
+
+    run_batch(load_specs(sys.argv[1]))
@@ -0,0 +1,81 @@
+from typing import List, Dict, Any
+import json
+import sys
+
+from research import fetch_paper_details
+from extraction import format_paper, RESULT_KEYS_BY_FIELD
+from harvest_state import paper_id_from_result
+
+REFRESH_FIELDS = "citationCount,referenceCount,tldr,isOpenAccess,openAccessPdf,publicationTypes,journal,year"
+
+def refresh_records(records: List[Dict[str, Any]],
+                    fields: str = REFRESH_FIELDS,
+                    **batch_options: Any) -> Dict[str, Any]:
+    """
+    Aktualisiert gespeicherte Ergebnisse mit aktuellen Daten aus dem Batch-Endpunkt.
+
+    Es werden ausschließlich die Ergebnisschlüssel überschrieben, die zu den angefragten Feldern
+    gehören und deren Wert sich tatsächlich geändert hat. KI-Analysen bleiben unverändert.
+
+    :param records: Liste der gespeicherten Ergebnisse (wird in-place aktualisiert).
+    :param fields: Kommaseparierte Liste der zu aktualisierenden API-Felder.
+    :param batch_options: Weitere Optionen für research.fetch_paper_details (z. B. chunk_size, max_workers).
+    :return: Statistik mit der Anzahl angefragter, gefundener und geänderter Publikationen sowie
+             der Anzahl an Änderungen pro Ergebnisschlüssel.
+    """
+    keys = [RESULT_KEYS_BY_FIELD[field] for field in fields.split(",") if field in RESULT_KEYS_BY_FIELD]
+    indexed = [(record, paper_id_from_result(record)) for record in records]
+    indexed = [(record, paper_id) for record, paper_id in indexed if paper_id]
+
+    details = fetch_paper_details([paper_id for _, paper_id in indexed], fields=fields, **batch_options)
+
+    changed_fields: Dict[str, int] = {}
+    updated_papers = 0
+    for (record, _), paper in zip(indexed, details):
+        if not paper:
+            continue
+        fresh = format_paper(paper)
+        changed = False
+        for key in keys:
+            if record.get(key) != fresh[key]:
+                record[key] = fresh[key]
+                changed_fields[key] = changed_fields.get(key, 0) + 1
+                changed = True
+        updated_papers += changed
+
+    return {
+        "requested": len(indexed),
+        "found": sum(1 for paper in details if paper),
+        "updated_papers": updated_papers,
+        "changed_fields": changed_fields
+    }
+
+def refresh_results_file(results_path: str,
+                         fields: str = REFRESH_FIELDS,
+                         **batch_options: Any) -> Dict[str, Any]:
+    """
+    Aktualisiert eine gespeicherte Datei data/literature_search_results_*.json ohne erneute Suche.
+    Die Datei wird nur neu geschrieben, wenn sich mindestens ein Wert geändert hat.
+
+    :param results_path: Pfad zur Ergebnisdatei.
+    :param fields: Kommaseparierte Liste der zu aktualisierenden API-Felder.
+    :return: Statistik wie bei refresh_records.
+    """
+    with open(results_path, "r", encoding="utf-8") as f:
+        records = json.load(f)
+
+    summary = refresh_records(records, fields, **batch_options)
+
+    if summary["updated_papers"]:
+        with open(results_path, "w", encoding="utf-8") as f:
+            json.dump(records, f, ensure_ascii=False, indent=4)
+
+    print(f"{summary['updated_papers']} von {summary['requested']} Publikationen in '{results_path}' aktualisiert.")
+    return summary
+
+if __name__ == "__main__":
+
+    results_path = sys.argv[1]
+    fields = sys.argv[2] if len(sys.argv) > 2 and sys.argv[2] else REFRESH_FIELDS
+
+    refresh_results_file(results_path, fields)
@@ -1,12 +1,20 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Sized, Optional, Tuple
 import os
 import json
+import threading
 
-from pdf_manipulations.pdf_downloader import download_pdfs, sanitize_filename
-from pdf_manipulations.pdf_vectorization import vectorising_pdfs
+from pipeline import Stage, run_pipeline
+from pdf_manipulations.pdf_downloader import (download_pdfs, download_pdf, sanitize_filename, create_session,
+                                              create_run_folder, MAX_DOWNLOAD_WORKERS)
+from pdf_manipulations.pdf_store import PdfStore
+from pdf_manipulations.text_cache import TextCache
+from pdf_manipulations.pdf_vectorization import vectorising_pdfs, vectorise_pdf, document_key, index_documents
+from pdf_manipulations.embedding_store import EmbeddingStore
 from rag.query_to_cohere import query_to_cohere
 
 OUTPUT_DIR = "pdf_manipulations"
+EXTRACT_WORKERS = os.cpu_count() or 2
+ANALYSIS_WORKERS = 2
 METADATA_FILE = os.path.join(OUTPUT_DIR, "metadata.json")
 
 def extract_metadata(paper: Dict[str, Any]) -> Dict[str, str]:
@@ -23,6 +31,54 @@ def extract_metadata(paper: Dict[str, Any]) -> Dict[str, str]:
         "Abstract": paper.get("abstract", "N/A")
     }
 
+RESULT_KEYS_BY_FIELD = {
+    "title": "Title",
+    "authors": "Authors",
+    "year": "Year",
+    "externalIds": "DOI",
+    "url": "URL",
+    "abstract": "Abstract",
+    "citationCount": "Citation Count",
+    "referenceCount": "Reference Count",
+    "isOpenAccess": "isOpenAccess",
+    "openAccessPdf": "OpenAccessPDF",
+    "publicationTypes": "PublicationTypes",
+    "journal": "Journal",
+    "tldr": "TLDR"
+}
+
+def format_paper(paper: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Überführt ein Paper-Dictionary der Semantic Scholar API in das Ergebnisformat (siehe process_papers).
+    Die Zuordnung von API-Feldern zu Ergebnisschlüsseln ist in RESULT_KEYS_BY_FIELD hinterlegt.
+
+    :param paper: Ein Dictionary mit den Paper-Daten.
+    :return: Ein Dictionary im Ergebnisformat mit Platzhaltern für die KI-Analyse.
+    """
+    open_access_pdf = paper.get("openAccessPdf") or {}
+    tldr = paper.get("tldr", "N/A")
+
+    return {
+        "Title": paper.get("title", "N/A"),
+        "Authors": ", ".join(author.get("name", "N/A") for author in paper.get("authors") or []),
+        "Year": paper.get("year", "N/A"),
+        "DOI": (paper.get("externalIds") or {}).get("DOI", "N/A"),
+        "URL": paper.get("url", "N/A"),
+        "Abstract": paper.get("abstract", "N/A"),
+        "Citation Count": paper.get("citationCount", "N/A"),
+        "Reference Count": paper.get("referenceCount", "N/A"),
+        "isOpenAccess": paper.get("isOpenAccess", False),
+        "OpenAccessPDF": open_access_pdf.get("url", "N/A"),
+        "PublicationTypes": ", ".join(paper.get("publicationTypes")) if paper.get("publicationTypes") else "N/A",
+        "Journal": (paper.get("journal") or {}).get("name", "N/A"),
+        "TLDR": tldr.get("text", "N/A") if isinstance(tldr, dict) else tldr,
+        "AI_analysis": {
+            "Research Question": "N/A",
+            "Objective": "N/A",
+            "Contribution": "N/A"
+        }
+    }
+
 def save_metadata_incrementally(paper: Dict[str, Any]):
     """
     Speichert Metadaten eines Papers schrittweise in metadata.json, ohne die Datei zu überschreiben.
@@ -62,32 +118,155 @@ def enrich_with_ai_analysis(papers: List[Dict[str, Any]]) -> List[Dict[str, Any]
     :return: Die Liste der Paper-Dictionaries mit angereicherten KI-Analysen.
     """
     for paper in papers:
-        pdf_title = sanitize_filename(paper["Title"])
-        
-        print(f"Führe AI-Analyse durch für: {pdf_title}")
-
-        research_question = query_to_cohere("What is the research question of the paper?", pdf_title)
-        objective = query_to_cohere("What is the objective of the paper?", pdf_title)
-        contribution = query_to_cohere("What is the main contribution of the paper?", pdf_title)
-
-        paper["AI_analysis"] = {
-            "Research Question": research_question,
-            "Objective": objective,
-            "Contribution": contribution
-        }
+        analyse_paper(paper)
     
     print("AI-Analyse abgeschlossen.")
     return papers
 
-def process_papers(papers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def analyse_paper(paper: Dict[str, Any], stored_data: Optional[Any] = None) -> Dict[str, Any]:
+    """
+    Ergänzt ein einzelnes verarbeitetes Paper um die KI-Analyse (siehe enrich_with_ai_analysis).
+
+    :param paper: Ein verarbeitetes Paper-Dictionary.
+    :param stored_data: Optional bereits vorliegende Absätze des PDFs (sonst wird die Embeddings-Datei gelesen).
+    :return: Das Paper-Dictionary mit dem Schlüssel "AI_analysis".
+    """
+    pdf_title = sanitize_filename(paper["Title"])
+    
+    print(f"Führe AI-Analyse durch für: {pdf_title}")
+
+    options = {"stored_data": stored_data} if stored_data is not None else {}
+    research_question = query_to_cohere("What is the research question of the paper?", pdf_title, **options)
+    objective = query_to_cohere("What is the objective of the paper?", pdf_title, **options)
+    contribution = query_to_cohere("What is the main contribution of the paper?", pdf_title, **options)
+
+    paper["AI_analysis"] = {
+        "Research Question": research_question,
+        "Objective": objective,
+        "Contribution": contribution
+    }
+    return paper
+
+def process_pipelined(entries: Iterable[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]],
+                      stats: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    Verarbeitet die Papers als Stufenkette Download → Vektorisierung → Indexierung → KI-Analyse.
+
+    Jede Stufe hat einen eigenen Worker-Pool und ist über eine begrenzte Warteschlange mit der nächsten
+    verbunden (siehe pipeline.run_pipeline). Die Einträge werden erst beim Einspeisen in die Kette konsumiert,
+    sodass ein Generator bereits verarbeitet wird, während er noch weitere Papers liefert. Jeder Worker der
+    Vektorisierung treibt einen eigenen Extraktionsprozess (siehe vectorise_pdf), damit pdfminer nicht am GIL
+    hängt, und chunkt und kodiert dessen Seiten, während die folgenden noch extrahiert werden; der ganze Text
+    eines PDFs liegt dabei nie im Speicher. Ein Paper wird bereits vektorisiert, während andere noch
+    herunterladen, und analysiert, sobald seine eigenen Embeddings vorliegen. Papers ohne PDF durchlaufen
+    die Kette ohne Download und Vektorisierung.
+    Wie bei vectorising_pdfs werden PDFs, die mit demselben Dokumentschlüssel bereits im EmbeddingStore
+    liegen, weder extrahiert noch neu kodiert; jedes PDF wird dafür nur einmal gehasht. Die Absätze der
+    übrigen PDFs übernimmt die Indexierungsstufe einzeln in den EmbeddingStore, sobald sie kodiert sind
+    (siehe index_documents); Papers früherer (z. B. inkrementeller) Läufe bleiben dort erhalten.
+
+    :param entries: Je Paper das formatierte Paper (siehe format_paper) und ein Dictionary mit "url", "title"
+                    und "paper_id" oder None (kein PDF); eine Liste oder ein Iterator.
+    :param stats: Optionales Dictionary für die Laufzeitstatistik der Stufen.
+    :return: Die Papers mit KI-Analysen in der ursprünglichen Reihenfolge.
+    """
+    resources: Dict[str, Any] = {}
+    resources_lock = threading.Lock()
+
+    def open_resources() -> Dict[str, Any]:
+        # Speicher, Session und Lauf-Ordner werden erst mit dem ersten PDF angelegt.
+        with resources_lock:
+            if not resources:
+                embedding_store = EmbeddingStore()
+                resources.update(store=PdfStore(), session=create_session(MAX_DOWNLOAD_WORKERS),
+                                 save_dir=create_run_folder(), text_cache=TextCache(),
+                                 embedding_store=embedding_store, indexed=embedding_store.document_keys())
+            return resources
+
+    def download(job: Dict[str, Any]) -> Dict[str, Any]:
+        pdf = job["pdf"]
+        if pdf:
+            shared = open_resources()
+            pdf_path = os.path.join(shared["save_dir"], f"{pdf['title']}.pdf")
+            status, _ = download_pdf(shared["session"], shared["store"], pdf["url"], pdf_path, pdf["paper_id"])
+            print(f"PDF {status}: {pdf['url']}")
+            job["pdf_path"] = pdf_path if status not in ("failed", "rejected") else None
+        return job
+
+    def vectorise(job: Dict[str, Any]) -> Dict[str, Any]:
+        if job.get("pdf_path"):
+            title = job["record"]["Title"]
+            # Das PDF wird nur einmal gehasht; derselbe Schlüssel dient Dokumentschlüssel und Textcache.
+            text_key = TextCache.make_key(job["pdf_path"])
+            job["doc_key"] = document_key(job["pdf_path"], text_key)
+            if job["doc_key"] and resources["indexed"].get(job["pdf"]["title"]) == job["doc_key"]:
+                print(f"PDF {job['pdf']['title']} unverändert, Embeddings werden übernommen.")
+                job["indexed"] = True
+                return job
+            print(f"Vektorisiere PDF {job['pdf']['title']} - {title}...")
+            job["paragraphs"], error = vectorise_pdf(job["pdf"]["title"], title, job["pdf_path"],
+                                                     resources["text_cache"], text_key)
+            if error:
+                print(f"Fehler beim Extrahieren von Text aus {job['pdf_path']}: {error}")
+                job["doc_key"] = None
+        return job
+
+    def index(job: Dict[str, Any]) -> Dict[str, Any]:
+        if job.get("paragraphs"):
+            summary = index_documents(resources["embedding_store"],
+                                      {job["pdf"]["title"]: (job["doc_key"], job["paragraphs"])})
+            with resources_lock:
+                resources["paragraphs"] = resources.get("paragraphs", 0) + len(job["paragraphs"])
+                resources["compacted"] = resources.get("compacted", 0) + summary["compacted"]
+        return job
+
+    def analyse(job: Dict[str, Any]) -> Dict[str, Any]:
+        # Die Absätze liegen bereits im EmbeddingStore und werden nach der Analyse nicht mehr gehalten.
+        rows = job.pop("paragraphs", None)
+        if job.get("indexed"):
+            analyse_paper(job["record"], resources["embedding_store"].load([job["pdf"]["title"]]))
+        elif rows:
+            analyse_paper(job["record"], {column: [row[column] for row in rows]
+                                          for column in ("pdf_id", "embedding", "paragraph_text")})
+        else:
+            analyse_paper(job["record"])
+        return job
+
+    stages = [
+        Stage("download", download, MAX_DOWNLOAD_WORKERS),
+        Stage("vectorise", vectorise, EXTRACT_WORKERS),
+        Stage("index", index, 1),
+        Stage("analyse", analyse, ANALYSIS_WORKERS)
+    ]
+    pipeline_stats = stats if stats is not None else {}
+    jobs = run_pipeline(({"record": record, "pdf": pdf} for record, pdf in entries), stages, stats=pipeline_stats)
+    print("Laufzeit der Verarbeitungsstufen:", pipeline_stats)
+
+    if resources:
+        resources["store"].close()
+        text_cache, embedding_store = resources["text_cache"], resources["embedding_store"]
+        if text_cache:
+            print("Textcache:", text_cache.stats())
+            text_cache.close()
+        unchanged = sum(1 for job in jobs if job.get("indexed"))
+        print(f"{resources.get('paragraphs', 0)} Absätze erfolgreich vektorisiert, "
+              f"{unchanged} PDFs unverändert übernommen, {resources.get('compacted', 0)} Zeilen kompaktiert.",
+              embedding_store.stats())
+        embedding_store.close()
+    return [job["record"] for job in jobs]
+
+def process_papers(papers: Iterable[Dict[str, Any]], pipelined: bool = True) -> List[Dict[str, Any]]:
     """
     Verarbeitet Publikationen, speichert Metadaten, lädt PDFs herunter und erzeugt Embeddings.
 
-    - Extrahiert relevante Felder aus den Paper-Daten.
+    - Extrahiert relevante Felder aus den Paper-Daten (siehe format_paper).
     - Falls ein Open-Access-PDF vorhanden ist, wird es heruntergeladen.
     - Die Vektorisierung der PDFs erfolgt zur späteren RAG-Nutzung.
     - Die Papers werden mit KI-Analysen angereichert.
 
+    Standardmäßig überlappen sich Download, Vektorisierung und KI-Analyse als Stufenkette
+    (siehe process_pipelined). Mit pipelined=False laufen die Phasen wie bisher nacheinander.
+
     Verwendete API-Felder:
     - title: Der Titel der Publikation.
     - authors: Liste von Autoren, deren Namen als kommaseparierte Zeichenkette dargestellt werden.
@@ -108,69 +287,57 @@ def process_papers(papers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     
     Fehlende oder nicht verfügbare Felder werden durch den Wert "N/A" ersetzt.
 
-    :param papers: Eine Liste von Paper-Dictionaries.
+    Die Papers werden einzeln konsumiert, sodass auch ein Generator (z. B. research.stream_semantic_scholar)
+    übergeben werden kann, ohne dass die Rohdaten aller Papers gleichzeitig im Speicher liegen. Im
+    Pipeline-Modus speist der Generator die Stufenkette direkt; Download und Analyse der ersten Papers
+    beginnen, während weitere noch gestreamt werden.
+
+    :param papers: Eine Liste oder ein Iterator von Paper-Dictionaries.
+    :param pipelined: Falls True, werden die Verarbeitungsstufen überlappend ausgeführt.
     :return: Die Liste der Paper-Dictionaries mit verarbeiteten Daten und KI-Analysen.
     """
     
     if os.path.exists(METADATA_FILE):
         os.remove(METADATA_FILE)
 
-    print(f"Beginne Verarbeitung von {len(papers)} Publikationen...")
+    total = len(papers) if isinstance(papers, Sized) else None
+    if total is not None:
+        print(f"Beginne Verarbeitung von {total} Publikationen...")
+    else:
+        print("Beginne Verarbeitung gestreamter Publikationen...")
 
-    processed = []
     pdf_urls = []
     pdf_titles = []
+    pdf_paper_ids = []
+
+    def entries() -> Iterable[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]]:
+        for index, paper in enumerate(papers, start=1):
+            progress = f"{index}/{total}" if total is not None else str(index)
+            print(f"Verarbeite Paper {progress}: {paper.get('title', 'Unbekannter Titel')}")
+
+            save_metadata_incrementally(paper)
+
+            record = format_paper(paper)
+
+            if record["OpenAccessPDF"] != "N/A":
+                pdf_urls.append(record["OpenAccessPDF"])
+                pdf_titles.append(sanitize_filename(record["Title"]))
+                pdf_paper_ids.append(paper.get("paperId"))
+                yield record, {"url": pdf_urls[-1], "title": pdf_titles[-1], "paper_id": pdf_paper_ids[-1]}
+            else:
+                yield record, None
+
+    if pipelined:
+        # Die Stufenkette konsumiert den Generator selbst; ein Paper wird verarbeitet, sobald es eintrifft.
+        processed = process_pipelined(entries())
+        print(f"Verarbeitung abgeschlossen. {len(processed)} Publikationen verarbeitet.")
+        return processed
 
-    for index, paper in enumerate(papers, start=1):
-        print(f"Verarbeite Paper {index}/{len(papers)}: {paper.get('title', 'Unbekannter Titel')}")
-        
-        save_metadata_incrementally(paper)
-
-        title = paper.get("title", "N/A")
-        authors = ", ".join(author.get("name", "N/A") for author in paper.get("authors", []))
-        year = paper.get("year", "N/A")
-        doi = paper.get("externalIds", {}).get("DOI", "N/A")
-        url = paper.get("url", "N/A")
-        abstract = paper.get("abstract", "N/A")
-        
-        open_access_pdf = paper.get("openAccessPdf") or {}
-        open_access_pdf_url = open_access_pdf.get("url", "N/A")
-        
-        citation_count = paper.get("citationCount", "N/A")
-        reference_count = paper.get("referenceCount", "N/A")
-        is_open_access = paper.get("isOpenAccess", False)
-        publication_types_str = ", ".join(paper.get("publicationTypes", [])) if paper.get("publicationTypes") else "N/A"
-        journal_name = paper.get("journal", {}).get("name", "N/A")
-        tldr_text = paper.get("tldr", {}).get("text", "N/A") if isinstance(paper.get("tldr"), dict) else paper.get("tldr", "N/A")
-
-        if open_access_pdf_url != "N/A":
-            pdf_urls.append(open_access_pdf_url)
-            pdf_titles.append(sanitize_filename(title))
-
-        processed.append({
-            "Title": title,
-            "Authors": authors,
-            "Year": year,
-            "DOI": doi,
-            "URL": url,
-            "Abstract": abstract,
-            "Citation Count": citation_count,
-            "Reference Count": reference_count,
-            "isOpenAccess": is_open_access,
-            "OpenAccessPDF": open_access_pdf_url,
-            "PublicationTypes": publication_types_str,
-            "Journal": journal_name,
-            "TLDR": tldr_text,
-            "AI_analysis": {
-                "Research Question": "N/A",
-                "Objective": "N/A",
-                "Contribution": "N/A"
-            }
-        })
+    processed = [record for record, _ in entries()]
 
     if pdf_urls:
         print(f"Lade {len(pdf_urls)} PDFs herunter...")
-        download_pdfs(pdf_urls, pdf_titles)
+        download_pdfs(pdf_urls, pdf_titles, pdf_paper_ids)
 
     print("Starte Vektorisierung der PDFs...")
     vectorising_pdfs()
@@ -0,0 +1,146 @@
+from typing import List, Dict, Any, Optional, Set
+from datetime import date, timedelta
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+STATE_PATH = os.path.join("data", "harvest_state.sqlite3")
+LOOKBACK_DAYS = 30
+STATE_KEY_PARAMETERS = ("query", "start_year", "end_year", "last_n_years", "open_access_only", "pdf_available_only")
+
+def paper_id_from_result(record: Dict[str, Any]) -> Optional[str]:
+    """
+    Ermittelt eine für den Batch-Endpunkt geeignete ID aus einem gespeicherten Ergebnis.
+
+    Bevorzugt wird die paperId aus der Semantic-Scholar-URL, alternativ der DOI ("DOI:<doi>").
+
+    :param record: Ein Eintrag aus einer literature_search_results-Datei.
+    :return: Die ID oder None, falls weder URL noch DOI verwertbar sind.
+    """
+    match = re.search(r"semanticscholar\.org/paper/(?:[^/]+/)?([0-9a-f]{40})", str(record.get("URL", "")))
+    if match:
+        return match.group(1)
+    doi = record.get("DOI")
+    if doi and doi != "N/A":
+        return f"DOI:{doi}"
+    return None
+
+def state_key(search_parameters: Dict[str, Any]) -> str:
+    """
+    Erzeugt den Schlüssel eines Suchauftrags aus der kanonischen Query und den Filtern.
+    Limit, Feldprofil und Zwei-Phasen-Modus beeinflussen die Treffermenge nicht und gehen nicht ein.
+    """
+    relevant = {name: search_parameters.get(name) for name in STATE_KEY_PARAMETERS}
+    return hashlib.sha256(json.dumps(relevant, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+class HarvestState:
+    """
+    Persistenter Zustand inkrementeller Suchläufe ("seit dem letzten Lauf") in einer SQLite-Datei.
+
+    Je Suchauftrag werden die bereits verarbeiteten paperIds, das neueste Veröffentlichungsdatum
+    (Wasserzeichen) und der Pfad der zuletzt gespeicherten Ergebnisdatei festgehalten. Folgeläufe
+    fragen nur Publikationen ab dem Wasserzeichen (abzüglich 'lookback_days' für nachträglich
+    indexierte Publikationen) an und verarbeiten nur noch unbekannte paperIds.
+    """
+    def __init__(self, path: str = STATE_PATH, lookback_days: int = LOOKBACK_DAYS):
+        self.path = path
+        self.lookback_days = lookback_days
+        self.lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS watermarks (
+                key TEXT PRIMARY KEY,
+                query TEXT NOT NULL,
+                newest_date TEXT,
+                results_path TEXT,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS seen (
+                key TEXT NOT NULL,
+                paper_id TEXT NOT NULL,
+                PRIMARY KEY (key, paper_id)
+            );
+        """)
+        self.connection.commit()
+
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Liefert den gespeicherten Zustand eines Suchauftrags oder None beim ersten Lauf.
+
+        :return: Dictionary mit 'query', 'newest_date', 'results_path' und 'updated_at'.
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT query, newest_date, results_path, updated_at FROM watermarks WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("query", "newest_date", "results_path", "updated_at"), row))
+
+    def since(self, key: str) -> Optional[str]:
+        """
+        Liefert das Datum ('YYYY-MM-DD'), ab dem im nächsten Lauf gesucht wird, oder None (vollständige Suche).
+        """
+        state = self.load(key)
+        if not state or not state["newest_date"]:
+            return None
+        return (date.fromisoformat(state["newest_date"]) - timedelta(days=self.lookback_days)).isoformat()
+
+    def seen_ids(self, key: str) -> Set[str]:
+        """
+        Liefert die paperIds, die für einen Suchauftrag bereits verarbeitet wurden.
+        """
+        with self.lock:
+            rows = self.connection.execute("SELECT paper_id FROM seen WHERE key = ?", (key,)).fetchall()
+        return {paper_id for (paper_id,) in rows}
+
+    def update(self, key: str, query: str, papers: List[Dict[str, Any]], results_path: Optional[str]) -> None:
+        """
+        Übernimmt neu verarbeitete Publikationen in den Zustand und verschiebt das Wasserzeichen.
+
+        :param papers: Die neu verarbeiteten Publikationen (Rohdaten mit 'paperId' und 'publicationDate').
+        :param results_path: Pfad der gespeicherten, zusammengeführten Ergebnisdatei.
+        """
+        dates = [paper["publicationDate"] for paper in papers if paper.get("publicationDate")]
+        with self.lock:
+            row = self.connection.execute("SELECT newest_date FROM watermarks WHERE key = ?", (key,)).fetchone()
+            newest = max([d for d in [row[0] if row else None] + dates if d], default=None)
+            self.connection.execute(
+                "INSERT OR REPLACE INTO watermarks (key, query, newest_date, results_path, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, query, newest, results_path, time.time())
+            )
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO seen (key, paper_id) VALUES (?, ?)",
+                [(key, paper["paperId"]) for paper in papers if paper.get("paperId")]
+            )
+            self.connection.commit()
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
+
+def merge_results(new_records: List[Dict[str, Any]], previous_path: Optional[str]) -> List[Dict[str, Any]]:
+    """
+    Führt neu verarbeitete Ergebnisse mit der Ergebnisdatei des vorherigen Laufs zusammen.
+    Neue Einträge stehen vorne; bereits vorhandene Publikationen (gleiche paperId bzw. DOI) werden nicht doppelt übernommen.
+
+    :param new_records: Die im aktuellen Lauf verarbeiteten Ergebnisse.
+    :param previous_path: Pfad der vorherigen Ergebnisdatei oder None.
+    :return: Die zusammengeführte Ergebnisliste.
+    """
+    if not previous_path or not os.path.exists(previous_path):
+        return list(new_records)
+
+    with open(previous_path, "r", encoding="utf-8") as f:
+        previous = json.load(f)
+
+    known = {paper_id_from_result(record) for record in new_records} - {None}
+    return list(new_records) + [record for record in previous if paper_id_from_result(record) not in known]
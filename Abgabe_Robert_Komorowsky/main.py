@@ -1,15 +1,27 @@
+from typing import List, Dict, Any, Iterable, Tuple
 import sys
-from research import build_query, search_semantic_scholar
+import os
+from functools import partial
+from rate_limiter import configure_rate_limits, rate_limiter_metrics
+from response_cache import ResponseCache
+from research import search_semantic_scholar, stream_semantic_scholar
+from query_compiler import from_terms, compile_query, query_hash, execute_query
+from harvest_state import HarvestState, state_key, merge_results
 from extraction import process_papers
 from analysis import total_publications, compute_publication_stats, compute_journal_stats, save_results, display_results
 
-def main(required_terms, or_terms, not_terms, start_year, end_year, last_n_years, limit, open_access_only, pdf_available_only) -> None:
+RATE_LIMIT_STATE = os.path.join("data", "rate_limits.sqlite3")
+
+def main(required_terms, or_terms, not_terms, start_year, end_year, last_n_years, limit, open_access_only, pdf_available_only, bulk=False,
+         field_profile="full", two_phase=False, incremental=False) -> None:
     """
     Führt eine automatisierte Literaturrecherche durch, analysiert die Ergebnisse und speichert die Analyse.
 
     Die Funktion führt folgende Schritte aus:
     1. Erstellung einer Suchanfrage basierend auf den gegebenen Schlüsselwörtern und Filtern.
     2. Durchführung einer Suche in Semantic Scholar nach relevanten wissenschaftlichen Publikationen.
+       Ohne Bulk-Modus wird die Anfrage in Teilanfragen zerlegt, deren Ergebnisse anhand der paperId
+       vereinigt bzw. um ausgeschlossene Begriffe bereinigt werden (siehe query_compiler.execute_query).
     3. Extraktion relevanter Informationen aus den gefundenen Publikationen.
     4. Analyse der Ergebnisse (z. B. Anzahl der Publikationen pro Jahr, häufige Publikationstypen, Journal-Statistiken).
     5. Speicherung und Anzeige der Analyse-Ergebnisse.
@@ -24,50 +36,125 @@ def main(required_terms, or_terms, not_terms, start_year, end_year, last_n_years
     - limit (int): Maximale Anzahl an zurückgegebenen Publikationen (Standard: 10).
     - open_access_only (bool): Falls True, werden nur Open-Access-Publikationen berücksichtigt.
     - pdf_available_only (bool): Falls True, werden nur Publikationen mit verfügbarem PDF berücksichtigt.
+    - bulk (bool): Falls True, wird der Bulk-Endpunkt genutzt und die Publikationen werden als Stream
+                   verarbeitet (geeignet für große Ergebnismengen jenseits der Offset-Grenze).
+    - field_profile (str): Feldprofil der Suche ("triage", "metadata" oder "full", siehe research.FIELD_PROFILES).
+    - two_phase (bool): Falls True, wird zunächst nur mit dem Profil "triage" gesucht und das gewählte
+                        Feldprofil anschließend nur für die gefilterten Publikationen nachgeladen.
+    - incremental (bool): Falls True, werden nur Publikationen seit dem letzten Lauf derselben Suche angefragt
+                          und nur bisher unbekannte verarbeitet; die Ergebnisse werden mit der Ergebnisdatei des
+                          vorherigen Laufs zusammengeführt (siehe harvest_state).
 
     Rückgabewert:
     - None
     """
     print("Starte Literaturrecherche...")
+    os.makedirs("data", exist_ok=True)
+    configure_rate_limits(RATE_LIMIT_STATE)
+    cache = ResponseCache()
+    state = HarvestState() if incremental else None
 
-    query = build_query(required_terms, or_terms, not_terms)
-
-    if last_n_years:
-        papers = search_semantic_scholar(
-            query,
-            last_n_years=last_n_years,
-            limit=limit,
-            open_access_only=open_access_only,
-            pdf_available_only=pdf_available_only
-        )
-    else:
-        papers = search_semantic_scholar(
-            query,
-            start_year=start_year,
-            end_year=end_year,
-            limit=limit,
-            open_access_only=open_access_only,
-            pdf_available_only=pdf_available_only
-        )
+    search_parameters, papers, search_stats = run_search(
+        required_terms, or_terms, not_terms, start_year, end_year, last_n_years, limit, open_access_only,
+        pdf_available_only, bulk, field_profile, two_phase, cache=cache, state=state
+    )
     
+    if state:
+        papers = list(papers)
     processed_data = process_papers(papers)
+    if state:
+        previous = state.load(state_key(search_parameters))
+        processed_data = merge_results(processed_data, previous["results_path"] if previous else None)
+    metadata = build_metadata(search_parameters, search_stats, processed_data)
     
+    print("\nAnalyse-Ergebnisse:")
+    print(metadata["analysis"])
+    
+    display_results(processed_data)
+    results_path = save_results(processed_data, metadata, cache_stats=cache.stats())
+    cache.close()
+
+    if state:
+        state.update(state_key(search_parameters), search_parameters["query"], papers, results_path)
+        state.close()
+
+def run_search(required_terms, or_terms, not_terms, start_year, end_year, last_n_years, limit, open_access_only, pdf_available_only,
+               bulk=False, field_profile="full", two_phase=False, cache=None, memo=None, state=None) -> Tuple[Dict[str, Any], Iterable[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Erstellt die Suchanfrage und führt die Suche in Semantic Scholar aus (Parameter siehe main).
+
+    :param cache: Optionaler, gemeinsam genutzter ResponseCache.
+    :param memo: Optionales Dictionary zur Wiederverwendung von Teilergebnissen über mehrere Suchen hinweg
+                 (siehe query_compiler.execute_query).
+    :param state: Optionaler HarvestState; falls gesetzt, wird ab dem Wasserzeichen des letzten Laufs gesucht
+                  und es werden nur bisher unbekannte Publikationen geliefert.
+    :return: Tupel aus Suchparametern (inkl. Query und Query-Hash), Publikationen (im Bulk-Modus ein Iterator)
+             und Suchstatistik.
+    """
+    query_ast = from_terms(required_terms, or_terms, not_terms)
+    query = compile_query(query_ast)
+    search_stats = {}
+
+    search_parameters = {
+        "required_terms": required_terms,
+        "or_terms": or_terms,
+        "not_terms": not_terms,
+        "start_year": start_year,
+        "end_year": end_year,
+        "last_n_years": last_n_years,
+        "open_access_only": open_access_only,
+        "pdf_available_only": pdf_available_only,
+        "field_profile": field_profile,
+        "two_phase": two_phase,
+        "query": query,
+        "query_hash": query_hash(query_ast)
+    }
+
+    since, incremental_options = None, {}
+    if state:
+        since = state.since(state_key(search_parameters))
+        seen = state.seen_ids(state_key(search_parameters))
+        search_stats["incremental"] = {"since": since, "known_papers": len(seen)}
+        # Bekannte Publikationen werden schon in der Suche übersprungen und verbrauchen das Limit nicht.
+        incremental_options["exclude_ids"] = frozenset(seen)
+    if since:
+        print(f"Inkrementeller Lauf: Suche nach Publikationen ab {since}.")
+
+    search = partial(
+        stream_semantic_scholar if bulk else search_semantic_scholar,
+        start_year=start_year,
+        end_year=end_year,
+        last_n_years=last_n_years or None,
+        limit=limit,
+        open_access_only=open_access_only,
+        pdf_available_only=pdf_available_only,
+        cache=cache,
+        profile=field_profile,
+        two_phase=two_phase,
+        since=since,
+        **incremental_options
+    )
+    if bulk:
+        papers = search(query, stats=search_stats)
+    else:
+        papers = execute_query(query_ast, search, limit=limit, memo=memo, stats=search_stats)
+
+    return search_parameters, papers, search_stats
+
+def build_metadata(search_parameters: Dict[str, Any],
+                   search_stats: Dict[str, Any],
+                   processed_data: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Analysiert die verarbeiteten Publikationen und stellt die Metadaten für save_results zusammen.
+    """
     publications_results = total_publications(processed_data)
     publication_stats = compute_publication_stats(processed_data)
     journal_stats = compute_journal_stats(processed_data)
     
-    metadata = {
-        "search_parameters": {
-            "required_terms": required_terms,
-            "or_terms": or_terms,
-            "not_terms": not_terms,
-            "start_year": start_year,
-            "end_year": end_year,
-            "last_n_years": last_n_years,
-            "open_access_only": open_access_only,
-            "pdf_available_only": pdf_available_only,
-            "query": query
-        },
+    return {
+        "search_parameters": search_parameters,
+        "search_statistics": search_stats,
+        "rate_limits": rate_limiter_metrics(),
         "analysis": {
             "total_publications": publications_results.get("total", 0),
             "publications_per_year": publications_results.get("by_year", {}),
@@ -75,12 +162,6 @@ def main(required_terms, or_terms, not_terms, start_year, end_year, last_n_years
             "frequent_journal_types": journal_stats
         }
     }
-    
-    print("\nAnalyse-Ergebnisse:")
-    print(metadata["analysis"])
-    
-    display_results(processed_data)
-    save_results(processed_data, metadata)
 
 if __name__ == "__main__":
 
@@ -93,5 +174,10 @@ if __name__ == "__main__":
     limit = int(sys.argv[7]) if len(sys.argv) > 7 and sys.argv[7].isdigit() else 10
     open_access_only = sys.argv[8].lower() == "ja" if len(sys.argv) > 8 else False
     pdf_available_only = sys.argv[9].lower() == "ja" if len(sys.argv) > 9 else False
+    bulk = sys.argv[10].lower() == "ja" if len(sys.argv) > 10 else False
+    field_profile = sys.argv[11] if len(sys.argv) > 11 and sys.argv[11] else "full"
+    two_phase = sys.argv[12].lower() == "ja" if len(sys.argv) > 12 else False
+    incremental = sys.argv[13].lower() == "ja" if len(sys.argv) > 13 else False
     
-    main(required_terms, or_terms, not_terms, start_year, end_year, last_n_years, limit, open_access_only, pdf_available_only)
+    main(required_terms, or_terms, not_terms, start_year, end_year, last_n_years, limit, open_access_only, pdf_available_only, bulk,
+         field_profile, two_phase, incremental)
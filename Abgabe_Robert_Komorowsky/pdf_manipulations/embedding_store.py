@@ -0,0 +1,387 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Any, Optional, Iterable, Iterator, Tuple, Union
+
+import numpy as np
+
+EMBEDDING_STORE_PATH = os.path.join("pdf_manipulations", "embedding_store")
+NPY_HEADER_SIZE = 128
+LOCK_TIMEOUT = 60
+
+class EmbeddingStore:
+    """Spaltenorientierter Speicher für Absätze und ihre Embeddings.
+
+    Ein Verzeichnis mit drei Dateien:
+
+    - embeddings.npy: alle Embeddings als eine zusammenhängende float32- (oder float16-)Matrix im .npy-Format,
+      die mit np.load(mmap_mode='r') eingeblendet werden kann. Der Header hat eine feste Größe, sodass beim
+      Anhängen nur die neuen Zeilen geschrieben und die Form im Header aktualisiert werden.
+    - texts.bin: die Absatztexte hintereinander als UTF-8.
+    - metadata.sqlite3: je Zeile der Matrix pdf_id, pdf_id_order, Titel, Seite sowie Offset und Länge des
+      Textes in texts.bin.
+
+    Die Metadaten werden zuletzt geschrieben; gültig sind nur Zeilen, deren Metadaten festgeschrieben sind.
+    Mehrere Prozesse können denselben Speicher gleichzeitig öffnen: Schreibende Methoden halten die
+    Schreibsperre der SQLite-Datei (BEGIN IMMEDIATE) und schneiden erst unter dieser Sperre Zeilen und Texte
+    ab, die ein abgebrochener Schreiber ohne Metadaten hinterlassen hat. Lesende Methoden verändern nichts
+    und lesen innerhalb einer Lesetransaktion nur festgeschriebene Zeilen; das Öffnen selbst ist frei von
+    Nebenwirkungen.
+
+    Zu jedem PDF wird ein Dokumentschlüssel gespeichert (siehe pdf_vectorization.document_key). Wird ein PDF
+    ersetzt oder entfernt, werden seine bisherigen Zeilen nur als gelöscht markiert (Tombstones); compact
+    schreibt Matrix und Texte ohne diese Zeilen neu. Die Zeilen eines PDFs liegen stets zusammenhängend.
+
+    Zeilennummern bleiben gültig, bis 'generation' sich ändert (durch compact oder clear); darauf verlassen
+    sich abgeleitete Strukturen wie der HNSW-Index in rag.hnsw_cosine. Ab Generation 1 tragen Matrix und Texte
+    die Generation im Dateinamen ('embeddings.g<n>.npy', 'texts.g<n>.bin'). compact schreibt die Dateien der
+    nächsten Generation und schaltet mit dem Commit der Metadaten atomar um. Der Commit wartet, bis laufende
+    Lesetransaktionen beendet sind; Dateien anderer Generationen (die vorherige oder die eines abgebrochenen
+    compact) entfernt danach der nächste Schreiber unter der Schreibsperre.
+
+    Args:
+        root (str): Verzeichnis des Speichers.
+        dtype (Union[str, np.dtype]): Datentyp der Matrix beim Anlegen (float32 oder float16); ein
+            bestehender Speicher behält seinen Datentyp.
+    """
+    def __init__(self, root: str = EMBEDDING_STORE_PATH, dtype: Union[str, np.dtype] = np.float32):
+        self.root = root
+        self.dtype = np.dtype(dtype)
+        self.lock = threading.Lock()
+
+        os.makedirs(root, exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(root, "metadata.sqlite3"), timeout=LOCK_TIMEOUT,
+                                          check_same_thread=False)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                row INTEGER PRIMARY KEY,
+                pdf_id TEXT NOT NULL,
+                pdf_id_order TEXT NOT NULL,
+                title TEXT,
+                page INTEGER,
+                text_offset INTEGER NOT NULL,
+                text_length INTEGER NOT NULL,
+                deleted INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self.connection.execute("CREATE INDEX IF NOT EXISTS chunks_pdf_id ON chunks (pdf_id, row)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS documents (
+                pdf_id TEXT PRIMARY KEY,
+                doc_key TEXT,
+                indexed_at REAL NOT NULL
+            )
+        """)
+        self.connection.commit()
+
+        self.generation: Optional[int] = None
+        self.rows, self.dimension = 0, None
+        with self._reading():
+            pass
+
+    def _paths(self, generation: int) -> Tuple[str, str]:
+        suffix = f".g{generation}" if generation else ""
+        return (os.path.join(self.root, f"embeddings{suffix}.npy"), os.path.join(self.root, f"texts{suffix}.bin"))
+
+    def _refresh(self) -> None:
+        """Liest Generation und Anzahl der festgeschriebenen Zeilen neu ein (innerhalb einer Transaktion)."""
+        row = self.connection.execute("SELECT value FROM info WHERE key = 'generation'").fetchone()
+        generation = row[0] if row else 0
+        self.rows = self.connection.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM chunks").fetchone()[0]
+        if generation != self.generation or self.dimension is None:
+            self.generation = generation
+            self.matrix_path, self.texts_path = self._paths(generation)
+            self.dimension = None
+            if os.path.exists(self.matrix_path):
+                with open(self.matrix_path, "rb") as file:
+                    np.lib.format.read_magic(file)
+                    shape, _, self.dtype = np.lib.format.read_array_header_1_0(file)
+                self.dimension = shape[1]
+
+    @contextmanager
+    def _reading(self) -> Iterator[None]:
+        """Lesetransaktion: liest den festgeschriebenen Stand ein und hält ihn bis zum Ende des Blocks fest."""
+        with self.lock:
+            self.connection.execute("BEGIN")
+            try:
+                self._refresh()
+                yield
+            finally:
+                self.connection.rollback()
+
+    @contextmanager
+    def _writing(self) -> Iterator[None]:
+        """Schreibtransaktion unter der prozessübergreifenden Schreibsperre; repariert vorher den Speicher."""
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                self._refresh()
+                self._remove_stale_files()
+                self._truncate()
+                yield
+                self.connection.commit()
+            except BaseException:
+                self.connection.rollback()
+                raise
+
+    def _remove_stale_files(self) -> None:
+        """Entfernt Matrix- und Textdateien anderer Generationen (abgebrochenes oder abgeschlossenes compact)."""
+        current = {os.path.basename(path) for path in (self.matrix_path, self.texts_path)}
+        for name in os.listdir(self.root):
+            if re.fullmatch(r"(embeddings(\.g\d+)?\.npy|texts(\.g\d+)?\.bin)", name) and name not in current:
+                try:
+                    os.remove(os.path.join(self.root, name))
+                except OSError:
+                    # Noch eingeblendet (z. B. unter Windows); wird beim nächsten Schreiben entfernt.
+                    pass
+
+    def _write_header(self, file, rows: Optional[int] = None) -> None:
+        # Fester Header (Format 1.0), damit die Daten immer bei NPY_HEADER_SIZE beginnen.
+        header = repr({"descr": np.lib.format.dtype_to_descr(self.dtype), "fortran_order": False,
+                       "shape": (self.rows if rows is None else rows, self.dimension)}).encode("latin1")
+        header = header.ljust(NPY_HEADER_SIZE - 10 - 1) + b"\n"
+        file.seek(0)
+        file.write(np.lib.format.magic(1, 0) + len(header).to_bytes(2, "little") + header)
+
+    def _truncate(self) -> None:
+        """Entfernt Zeilen und Texte ohne festgeschriebene Metadaten (abgebrochenes Anhängen; nur in _writing)."""
+        if self.dimension is not None:
+            size = NPY_HEADER_SIZE + self.rows * self.dimension * self.dtype.itemsize
+            if os.path.getsize(self.matrix_path) != size:
+                with open(self.matrix_path, "r+b") as file:
+                    self._write_header(file)
+                    file.truncate(size)
+        end = self.connection.execute("SELECT COALESCE(MAX(text_offset + text_length), 0) FROM chunks").fetchone()[0]
+        if os.path.exists(self.texts_path) and os.path.getsize(self.texts_path) > end:
+            with open(self.texts_path, "r+b") as file:
+                file.truncate(end)
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM chunks WHERE deleted = 0").fetchone()[0]
+
+    def append(self, paragraphs: List[Dict[str, Any]], embeddings: Optional[np.ndarray] = None) -> range:
+        """
+        Hängt Absätze an, ohne bestehende Daten neu zu schreiben.
+
+        Args:
+            paragraphs (List[Dict[str, Any]]): Absatz-Einträge (siehe pdf_vectorization.embed_chunks).
+            embeddings (Optional[np.ndarray]): Optional die Embeddings als Matrix (sonst aus 'embedding'
+                der Einträge).
+
+        Returns:
+            range: Die Zeilennummern der angehängten Absätze.
+        """
+        with self._writing():
+            rows = self._append(paragraphs, embeddings)
+        return rows
+
+    def _append(self, paragraphs: List[Dict[str, Any]], embeddings: Optional[np.ndarray]) -> range:
+        if not paragraphs:
+            return range(self.rows, self.rows)
+        if embeddings is None:
+            embeddings = np.stack([paragraph["embedding"] for paragraph in paragraphs])
+        embeddings = np.ascontiguousarray(embeddings, dtype=self.dtype)
+
+        if self.dimension is None:
+            self.dimension = embeddings.shape[1]
+            with open(self.matrix_path, "wb") as file:
+                self._write_header(file)
+        if embeddings.shape != (len(paragraphs), self.dimension):
+            raise ValueError(f"Embeddings der Form {embeddings.shape} passen nicht zu "
+                             f"{len(paragraphs)} Absätzen der Dimension {self.dimension}.")
+
+        first = self.rows
+        texts = [paragraph["paragraph_text"].encode("utf-8") for paragraph in paragraphs]
+        with open(self.texts_path, "ab") as file:
+            offset = file.tell()
+            file.write(b"".join(texts))
+        with open(self.matrix_path, "r+b") as file:
+            file.seek(NPY_HEADER_SIZE + first * self.dimension * self.dtype.itemsize)
+            file.write(embeddings.tobytes())
+            self.rows += len(paragraphs)
+            self._write_header(file)
+
+        records = []
+        for row, (paragraph, text) in enumerate(zip(paragraphs, texts), start=first):
+            records.append((row, paragraph["pdf_id"], paragraph.get("pdf_id_order", f"{paragraph['pdf_id']}_{row}"),
+                            paragraph.get("title"), paragraph.get("page"), offset, len(text)))
+            offset += len(text)
+        self.connection.executemany("INSERT INTO chunks (row, pdf_id, pdf_id_order, title, page, text_offset, "
+                                    "text_length) VALUES (?, ?, ?, ?, ?, ?, ?)", records)
+        return range(first, self.rows)
+
+    def _next_generation(self) -> None:
+        # 'generation' zählt jede Umnummerierung der Zeilen (compact, clear); gelesen wird er in _refresh.
+        self.connection.execute("INSERT OR REPLACE INTO info (key, value) VALUES ('generation', ?)",
+                                (self.generation + 1,))
+
+    def document_keys(self) -> Dict[str, Optional[str]]:
+        """Liefert je gespeichertem PDF den Dokumentschlüssel, mit dem es vektorisiert wurde."""
+        with self.lock:
+            return dict(self.connection.execute("SELECT pdf_id, doc_key FROM documents").fetchall())
+
+    def replace_document(self, pdf_id: str, doc_key: Optional[str], paragraphs: List[Dict[str, Any]],
+                         embeddings: Optional[np.ndarray] = None) -> range:
+        """
+        Ersetzt die Absätze eines PDFs: die bisherigen Zeilen werden als gelöscht markiert, die neuen angehängt.
+
+        Args:
+            pdf_id (str): Die ID des PDFs.
+            doc_key (Optional[str]): Der Dokumentschlüssel (None: beim nächsten Lauf erneut vektorisieren).
+            paragraphs (List[Dict[str, Any]]): Die Absatz-Einträge des PDFs.
+            embeddings (Optional[np.ndarray]): Optional die Embeddings als Matrix.
+
+        Returns:
+            range: Die Zeilennummern der angehängten Absätze.
+        """
+        with self._writing():
+            self.connection.execute("UPDATE chunks SET deleted = 1 WHERE pdf_id = ?", (pdf_id,))
+            rows = self._append(paragraphs, embeddings)
+            self.connection.execute("INSERT OR REPLACE INTO documents (pdf_id, doc_key, indexed_at) "
+                                    "VALUES (?, ?, ?)", (pdf_id, doc_key, time.time()))
+        return rows
+
+    def remove_documents(self, pdf_ids: Iterable[str]) -> int:
+        """Markiert alle Zeilen der angegebenen PDFs als gelöscht und liefert deren Anzahl."""
+        removed = 0
+        with self._writing():
+            for pdf_id in pdf_ids:
+                removed += self.connection.execute("UPDATE chunks SET deleted = 1 WHERE pdf_id = ? AND deleted = 0",
+                                                   (pdf_id,)).rowcount
+                self.connection.execute("DELETE FROM documents WHERE pdf_id = ?", (pdf_id,))
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        """Liefert Anzahl der PDFs, der gültigen und der als gelöscht markierten Zeilen sowie die Dateigröße."""
+        with self._reading():
+            live = self.connection.execute("SELECT COUNT(*) FROM chunks WHERE deleted = 0").fetchone()[0]
+            documents = self.connection.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+            size = sum(os.path.getsize(path) for path in (self.matrix_path, self.texts_path) if os.path.exists(path))
+            return {"documents": documents, "rows": live, "tombstones": self.rows - live, "bytes": size}
+
+    def compact(self) -> int:
+        """
+        Schreibt Matrix und Texte ohne die als gelöscht markierten Zeilen neu und nummeriert die Zeilen fortlaufend.
+
+        Returns:
+            int: Anzahl der entfernten Zeilen.
+        """
+        with self._writing():
+            live = self.connection.execute("SELECT row, text_offset, text_length FROM chunks WHERE deleted = 0 "
+                                           "ORDER BY row").fetchall()
+            removed = self.rows - len(live)
+            if not removed:
+                return 0
+
+            # Die neue Generation wird in eigene Dateien geschrieben; erst der Commit der Metadaten schaltet um.
+            matrix_path, texts_path = self._paths(self.generation + 1)
+            try:
+                rows = np.asarray([record[0] for record in live], dtype=np.int64)
+                matrix = np.load(self.matrix_path, mmap_mode="r") if self.rows else None
+                with open(matrix_path, "wb") as file:
+                    if self.dimension is not None:
+                        self._write_header(file, len(live))
+                        for start in range(0, len(rows), 4096):
+                            file.write(np.ascontiguousarray(matrix[rows[start:start + 4096]]).tobytes())
+                del matrix
+
+                offset = 0
+                with open(self.texts_path, "rb") as source, open(texts_path, "wb") as target:
+                    self.connection.execute("DELETE FROM chunks WHERE deleted = 1")
+                    # Aufsteigend umnummerieren: die neue Zeilennummer ist nie größer als die alte und damit frei.
+                    for new_row, (row, text_offset, text_length) in enumerate(live):
+                        source.seek(text_offset)
+                        target.write(source.read(text_length))
+                        self.connection.execute("UPDATE chunks SET row = ?, text_offset = ? WHERE row = ?",
+                                                (new_row, offset, row))
+                        offset += text_length
+
+                self._next_generation()
+            except Exception:
+                for path in (matrix_path, texts_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+                raise
+
+        # Die Dateien der vorherigen Generation liest nach dem Commit keine Lesetransaktion mehr.
+        self.repair()
+        return removed
+
+    def repair(self) -> None:
+        """Entfernt unter der Schreibsperre Reste abgebrochener Schreibvorgänge und veralteter Generationen."""
+        with self._writing():
+            pass
+
+    def embeddings(self) -> np.ndarray:
+        """Liefert die festgeschriebenen Zeilen der Embedding-Matrix schreibgeschützt eingeblendet (mmap_mode='r')."""
+        with self._reading():
+            return self._embeddings()
+
+    def _embeddings(self) -> np.ndarray:
+        if not self.rows:
+            return np.empty((0, self.dimension or 0), dtype=self.dtype)
+        return np.load(self.matrix_path, mmap_mode="r")[:self.rows]
+
+    def pdf_ids(self) -> List[str]:
+        """Liefert die IDs aller gespeicherten PDFs."""
+        with self.lock:
+            return [row[0] for row in self.connection.execute("SELECT DISTINCT pdf_id FROM chunks WHERE deleted = 0 "
+                                                              "ORDER BY pdf_id")]
+
+    def load(self, pdf_ids: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """
+        Lädt die Absätze (optional nur ausgewählter PDFs) spaltenweise.
+
+        Args:
+            pdf_ids (Optional[Iterable[str]]): Die gewünschten PDF-IDs (Standard: alle).
+
+        Returns:
+            Dict[str, Any]: Listen "row", "pdf_id", "pdf_id_order", "title", "page", "paragraph_text" und die
+            Matrix "embedding" (bei zusammenhängenden Zeilen eine Sicht auf die eingeblendete Datei).
+        """
+        query = "SELECT row, pdf_id, pdf_id_order, title, page, text_offset, text_length FROM chunks WHERE deleted = 0"
+        parameters: List[str] = []
+        if pdf_ids is not None:
+            parameters = list(dict.fromkeys(pdf_ids))
+            query += f" AND pdf_id IN ({', '.join('?' * len(parameters))})"
+        with self._reading():
+            records = self.connection.execute(query + " ORDER BY row", parameters).fetchall()
+
+            texts = []
+            if records:
+                with open(self.texts_path, "rb") as file:
+                    for record in records:
+                        file.seek(record[5])
+                        texts.append(file.read(record[6]).decode("utf-8"))
+
+            rows = [record[0] for record in records]
+            matrix = self._embeddings()
+            if rows and rows[-1] - rows[0] + 1 == len(rows):
+                embedding = matrix[rows[0]:rows[-1] + 1]
+            else:
+                embedding = matrix[np.asarray(rows, dtype=np.int64)]
+        return {
+            "row": rows,
+            "pdf_id": [record[1] for record in records],
+            "pdf_id_order": [record[2] for record in records],
+            "title": [record[3] for record in records],
+            "page": [record[4] for record in records],
+            "paragraph_text": texts,
+            "embedding": embedding
+        }
+
+    def clear(self) -> None:
+        """Entfernt alle Absätze und Embeddings."""
+        with self._writing():
+            self.connection.execute("DELETE FROM chunks")
+            self.connection.execute("DELETE FROM documents")
+            self._next_generation()
+        self.repair()
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
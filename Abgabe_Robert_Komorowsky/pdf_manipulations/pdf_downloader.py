@@ -1,9 +1,30 @@
 import os
 import re
+import hashlib
+import itertools
+import threading
+import time
 import requests
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from urllib.parse import urlparse
 from datetime import datetime
-from typing import List
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+
+from rate_limiter import get_rate_limiter, DEFAULT_RATES, RETRYABLE_STATUS_CODES
+from pdf_manipulations.pdf_store import PdfStore
+
+MAX_DOWNLOAD_WORKERS = 8
+MAX_DOWNLOADS_PER_HOST = 2
+CHUNK_SIZE = 256 * 1024
+DOWNLOAD_TIMEOUT = 60
+MAGIC_WINDOW = 1024
+PERMANENT_STATUS_CODES = (404, 410)
+
+_host_slots: Dict[str, threading.Semaphore] = {}
+_host_slots_lock = threading.Lock()
+_url_locks: Dict[str, List[Any]] = {}
+_url_locks_lock = threading.Lock()
 
 def sanitize_filename(name: str) -> str:
     """Ersetzt ungültige Zeichen in Dateinamen durch Unterstriche und kürzt lange Namen.
@@ -17,53 +38,264 @@ def sanitize_filename(name: str) -> str:
     name = re.sub(r'[<>:"/\\|?*]', '_', name) 
     return name[:100]  
 
-def download_pdfs(urls: List[str], titles: List[str]) -> None:
-    """Lädt PDFs von den übergebenen URLs herunter und speichert sie mit den zugehörigen Titeln.
-    
-    Erstellt einen Unterordner mit einem Zeitstempel und speichert die heruntergeladenen PDFs dort.
-    
-    Args:
-        urls (List[str]): Eine Liste von URLs zu den PDF-Dateien.
-        titles (List[str]): Eine Liste von Dateinamen für die heruntergeladenen PDFs.
+def _host_slot(host: str) -> threading.Semaphore:
+    """Liefert die Semaphore, die gleichzeitige Downloads von einem Host begrenzt."""
+    with _host_slots_lock:
+        if host not in _host_slots:
+            _host_slots[host] = threading.Semaphore(MAX_DOWNLOADS_PER_HOST)
+        return _host_slots[host]
+
+@contextmanager
+def _url_lock(url: str) -> Iterator[None]:
+    """Serialisiert Downloads derselben URL, die sich Teildatei und Validatoren im Speicher teilen."""
+    with _url_locks_lock:
+        entry = _url_locks.setdefault(url, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _url_locks_lock:
+            entry[1] -= 1
+            if not entry[1]:
+                del _url_locks[url]
+
+def _expected_size(response: requests.Response, offset: int) -> Optional[int]:
+    """Ermittelt die erwartete Gesamtgröße aus Content-Range (bei 206) bzw. Content-Length."""
+    content_range = response.headers.get("Content-Range", "")
+    if "/" in content_range and content_range.rsplit("/", 1)[1].isdigit():
+        return int(content_range.rsplit("/", 1)[1])
+    content_length = response.headers.get("Content-Length")
+    if content_length and content_length.isdigit():
+        return offset + int(content_length)
+    return None
+
+def _rejection_reason(content_type: Optional[str], head: bytes) -> Optional[str]:
+    """Prüft Content-Type und Dateianfang einer Antwort und liefert den Ablehnungsgrund, falls es kein PDF ist.
+
+    Laut PDF-Spezifikation muss '%PDF-' innerhalb der ersten 1024 Bytes stehen. Generische Typen wie
+    'application/octet-stream' werden akzeptiert, sofern die Signatur passt.
+    """
+    media_type = (content_type or "").split(";", 1)[0].strip().lower()
+    if media_type.startswith("text/") or any(kind in media_type for kind in ("html", "json", "xml")):
+        return f"Content-Type {media_type}"
+    if b"%PDF-" not in head[:MAGIC_WINDOW]:
+        return "keine PDF-Signatur" if head else "leere Antwort"
+    return None
+
+def create_run_folder() -> str:
+    """Legt den Zeitstempel-Ordner (Lauf-Ansicht) unter pdf_manipulations/pdf_db an.
+
+    Returns:
+        str: Der Pfad des Ordners.
     """
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")  
     save_dir = os.path.join("pdf_manipulations", "pdf_db", timestamp)
     os.makedirs(save_dir, exist_ok=True)  
+    return save_dir
 
+def create_session(max_workers: int = MAX_DOWNLOAD_WORKERS) -> requests.Session:
+    """Erzeugt die gemeinsam genutzte Session mit einem Verbindungspool für 'max_workers' Downloads."""
     session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
     session.headers.update({
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/110.0.0.0 Safari/537.36"
     })
+    return session
+
+def download_pdf(session: requests.Session, store: PdfStore, url: str, file_path: str,
+                  paper_id: Optional[str], revalidate: bool = False) -> Tuple[str, int]:
+    """Lädt ein einzelnes PDF in den Speicher und verlinkt es in die Lauf-Ansicht.
+
+    Der Inhalt wird in die Teildatei der URL im Speicher geschrieben und erst nach vollständigem und
+    geprüftem Download (Größe laut Content-Length/Content-Range) atomar übernommen, sodass unvollständige
+    Dateien nie in der Lauf-Ansicht erscheinen. Ein unterbrochener Download wird beim nächsten Versuch per
+    Range-Anfrage fortgesetzt; If-Range stellt sicher, dass sich das Dokument zwischenzeitlich nicht
+    geändert hat (sonst liefert der Server das vollständige Dokument neu).
+
+    Content-Type und die ersten Bytes einer neuen Übertragung werden geprüft, bevor der Rest geladen wird.
+    Liefert die URL kein PDF (z. B. eine HTML-Landingpage) oder existiert sie nicht mehr (HTTP 404/410),
+    wird die Übertragung abgebrochen und die URL samt Grund im Negativ-Cache des Speichers vermerkt;
+    spätere Läufe überspringen sie ohne Anfrage.
+
+    Gleichzeitige Aufrufe für dieselbe URL (z. B. zwei Papers mit demselben PDF) laufen nacheinander, da sie
+    dieselbe Teildatei verwenden; der spätere Aufruf übernimmt das Dokument dann aus dem Speicher.
+
+    Returns:
+        Tuple[str, int]: Status ("cached", "revalidated", "downloaded", "resumed", "rejected" oder "failed")
+        und Anzahl übertragener Bytes.
+    """
+    with _url_lock(url):
+        return _download_pdf(session, store, url, file_path, paper_id, revalidate)
 
-    for url, title in zip(urls, titles):
-        try:
-            parsed_url = urlparse(url)
-            referer = f"{parsed_url.scheme}://{parsed_url.netloc}/"
+def _download_pdf(session: requests.Session, store: PdfStore, url: str, file_path: str,
+                  paper_id: Optional[str], revalidate: bool) -> Tuple[str, int]:
+    sha256 = store.lookup(url, paper_id)
+    if sha256 and not revalidate:
+        store.register(sha256, url, paper_id)
+        store.link(sha256, file_path)
+        return "cached", 0
+
+    reason = store.rejection(url)
+    if reason:
+        return "rejected", 0
+
+    parsed_url = urlparse(url)
+    referer = f"{parsed_url.scheme}://{parsed_url.netloc}/"
+
+    headers = {
+        "Referer": referer
+    }
+
+    partial = store.partial_info(url)
+    if sha256:
+        headers.update(store.validators(url))
+    elif partial and partial["offset"] and (partial["etag"] or partial["last_modified"]):
+        headers["Range"] = f"bytes={partial['offset']}-"
+        headers["If-Range"] = partial["etag"] or partial["last_modified"]
+
+    limiter = get_rate_limiter(f"pdf_download:{parsed_url.netloc}", DEFAULT_RATES["pdf_download"])
+    with _host_slot(parsed_url.netloc):
+        attempt = 0
+        while True:
+            limiter.acquire()
+            response = session.get(url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT)
+            if response.status_code not in RETRYABLE_STATUS_CODES:
+                limiter.success()
+                break
+            response.close()
+            if limiter.backoff(attempt, response.headers.get("Retry-After")) is None:
+                break
+            attempt += 1
+
+        if response.status_code == 304 and sha256:
+            store.register(sha256, url, paper_id)
+            store.link(sha256, file_path)
+            return "revalidated", 0
+
+        if response.status_code == 416:
+            store.discard_partial(url)
+        if response.status_code in PERMANENT_STATUS_CODES:
+            store.reject(url, f"HTTP {response.status_code}")
+        if response.status_code not in (200, 206):
+            print(f"Failed to download {url}. Status code: {response.status_code}")
+            return "failed", 0
+
+        resumed = response.status_code == 206
+        offset = partial["offset"] if resumed else 0
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        expected = _expected_size(response, offset)
+        part_path = store.partial_path(url)
+
+        chunks = response.iter_content(chunk_size=CHUNK_SIZE)
+        if not resumed:
+            head = next(chunks, b"")
+            reason = _rejection_reason(response.headers.get("Content-Type"), head)
+            if reason:
+                response.close()
+                store.discard_partial(url)
+                store.reject(url, reason)
+                print(f"Kein PDF unter {url} ({reason}). URL wird künftig übersprungen.")
+                return "rejected", len(head)
+            chunks = itertools.chain([head], chunks)
+            store.save_partial_info(url, etag, last_modified, expected)
+
+        digest = hashlib.sha256()
+        if resumed:
+            with open(part_path, "rb") as file:
+                for block in iter(lambda: file.read(CHUNK_SIZE), b""):
+                    digest.update(block)
+
+        size = 0
+        with open(part_path, "ab" if resumed else "wb") as file:
+            for chunk in chunks:
+                digest.update(chunk)
+                file.write(chunk)
+                size += len(chunk)
+
+    if expected is not None and os.path.getsize(part_path) != expected:
+        print(f"Unvollständiger Download von {url} ({os.path.getsize(part_path)} von {expected} Bytes). "
+              "Wird beim nächsten Lauf fortgesetzt.")
+        return "failed", size
+
+    sha256 = store.add_file(part_path, url, paper_id, digest.hexdigest(),
+                            etag or (partial or {}).get("etag"), last_modified or (partial or {}).get("last_modified"),
+                            expected)
+    store.link(sha256, file_path)
+    return "resumed" if resumed else "downloaded", size
+
+def download_pdfs(urls: List[str], titles: List[str], paper_ids: Optional[List[Optional[str]]] = None,
+                  store: Optional[PdfStore] = None, max_workers: int = MAX_DOWNLOAD_WORKERS,
+                  revalidate: bool = False) -> Dict[str, Any]:
+    """Lädt PDFs von den übergebenen URLs parallel herunter und speichert sie mit den zugehörigen Titeln.
+    
+    Die Dokumente werden im inhaltsadressierten Speicher (siehe PdfStore) abgelegt. Bereits bekannte
+    Dokumente (gleiche paperId oder URL) werden ohne Netzwerkzugriff übernommen. Für den Lauf wird ein
+    Unterordner mit einem Zeitstempel angelegt, der die PDFs als Hardlinks auf den Speicher enthält.
+
+    Die Downloads laufen in einem Thread-Pool über eine gemeinsame Session mit Verbindungspool. Pro Host
+    sind höchstens MAX_DOWNLOADS_PER_HOST Verbindungen gleichzeitig offen; zusätzlich erhält jeder Host
+    einen eigenen, prozessweit geteilten Limiter ("pdf_download:<host>"). Gedrosselte Anfragen
+    (z. B. HTTP 429/503) werden mit Backoff bzw. gemäß Retry-After wiederholt. Abgebrochene Downloads
+    werden beim nächsten Aufruf per HTTP-Range fortgesetzt. Antworten ohne PDF-Inhalt werden nach dem
+    ersten Block verworfen und im Negativ-Cache vermerkt.
+    
+    Args:
+        urls (List[str]): Eine Liste von URLs zu den PDF-Dateien.
+        titles (List[str]): Eine Liste von Dateinamen für die heruntergeladenen PDFs.
+        paper_ids (Optional[List[Optional[str]]]): Optionale paperIds zu den URLs.
+        store (Optional[PdfStore]): Der zu verwendende Speicher (Standard: pdf_manipulations/pdf_store).
+        max_workers (int): Anzahl gleichzeitiger Downloads.
+        revalidate (bool): Falls True, werden bekannte Dokumente per bedingter Anfrage (ETag/Last-Modified)
+            geprüft; unveränderte Dokumente kosten nur eine 304-Antwort.
+
+    Returns:
+        Dict[str, Any]: Anzahl heruntergeladener, fortgesetzter, revalidierter, aus dem Speicher übernommener,
+        abgelehnter und fehlgeschlagener PDFs, übertragene Bytes, Dauer in Sekunden und der Pfad der Lauf-Ansicht.
+    """
+    save_dir = create_run_folder()
 
-            headers = {
-                "Referer": referer
-            }
+    own_store = store is None
+    store = store or PdfStore()
+    paper_ids = paper_ids or [None] * len(urls)
+    session = create_session(max_workers)
 
-            response = session.get(url, headers=headers, stream=True)
-            if response.status_code == 200:
-                clean_title = sanitize_filename(title)
-                file_name = f"{clean_title}.pdf"
-                file_path = os.path.join(save_dir, file_name)
+    summary = {"downloaded": 0, "resumed": 0, "revalidated": 0, "cached": 0, "rejected": 0,
+               "failed": 0, "bytes": 0, "seconds": 0.0, "folder": save_dir}
+    started = time.time()
 
-                if os.path.exists(file_path):
-                    print(f"File {file_path} already exists. Skipping...")
-                    continue
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {
+            executor.submit(download_pdf, session, store, url,
+                            os.path.join(save_dir, f"{sanitize_filename(title)}.pdf"), paper_id, revalidate): url
+            for url, title, paper_id in zip(urls, titles, paper_ids)
+        }
+        for index, future in enumerate(as_completed(futures), start=1):
+            url = futures[future]
+            try:
+                status, size = future.result()
+            except Exception as e:
+                print(f"Error downloading {url}: {e}")
+                status, size = "failed", 0
+            summary[status] += 1
+            summary["bytes"] += size
 
-                with open(file_path, "wb") as file:
-                    for chunk in response.iter_content(chunk_size=1024):
-                        file.write(chunk)
+            elapsed = max(time.time() - started, 1e-6)
+            print(f"[{index}/{len(futures)}] {status}: {url} "
+                  f"({summary['bytes'] / 1024 / 1024:.1f} MB, {summary['bytes'] / 1024 / 1024 / elapsed:.2f} MB/s)")
 
-                print(f"Downloaded: {file_path}")
-            else:
-                print(f"Failed to download {url}. Status code: {response.status_code}")
+    summary["seconds"] = round(time.time() - started, 3)
+    print(f"PDF-Download abgeschlossen: {summary['downloaded']} heruntergeladen, {summary['resumed']} fortgesetzt, "
+          f"{summary['revalidated'] + summary['cached']} aus dem Speicher, {summary['rejected']} abgelehnt (kein PDF), "
+          f"{summary['failed']} fehlgeschlagen "
+          f"in {summary['seconds']:.1f} Sekunden.")
 
-        except Exception as e:
-            print(f"Error downloading {url}: {e}")
+    if own_store:
+        store.close()
+    return summary
 
 # Beispielhafte Liste von URLs und Titeln
 urls = [
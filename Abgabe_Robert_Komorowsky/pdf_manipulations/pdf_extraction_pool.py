@@ -0,0 +1,339 @@
+import multiprocessing
+import os
+import time
+import zlib
+from collections import deque
+from multiprocessing.connection import wait
+from pathlib import Path
+from typing import Callable, Iterator, List, Dict, Any, Optional, Tuple, Union
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from pdf_manipulations.pdf_to_text import (extract_cleaned_text, extract_page_range, count_pages, clean_text, iter_pages,
+                                           PAGE_SEPARATOR)
+from pdf_manipulations.text_cache import TextCache
+
+EXTRACT_TIMEOUT = 120
+EXTRACT_MEMORY_LIMIT = 2 * 1024 ** 3
+MIN_PAGES_PER_TASK = 8
+# Kein "fork": der Elternprozess hat bereits Threads (Pipeline, Downloads, torch), deren gehaltene Locks
+# ein geforktes Kind erben und daran hängen bleiben könnte. Der Forkserver ist ein frischer, einthreadiger
+# Prozess, der nur die leichten Extraktionsmodule vorab lädt.
+START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+FORKSERVER_PRELOAD = ["pdf_manipulations.pdf_extraction_pool"]
+
+class ExtractionError(Exception):
+    """Die isolierte Extraktion eines Dokuments ist fehlgeschlagen (Absturz, Zeit- oder Speicherlimit, Fehler)."""
+
+def _get_context() -> multiprocessing.context.BaseContext:
+    """Liefert den Multiprocessing-Kontext für die Kindprozesse (siehe START_METHOD)."""
+    context = multiprocessing.get_context(START_METHOD)
+    if START_METHOD == "forkserver":
+        context.set_forkserver_preload(FORKSERVER_PRELOAD)
+    return context
+
+def _limit_memory(memory_limit: Optional[int]) -> None:
+    """Begrenzt den Adressraum des aktuellen Prozesses auf den bereits belegten Speicher plus 'memory_limit' Bytes."""
+    if resource is None or not memory_limit:
+        return
+    try:
+        with open("/proc/self/statm", "r") as file:
+            used = int(file.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        used = 0
+    try:
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        limit = used + memory_limit
+        if hard != resource.RLIM_INFINITY:
+            limit = min(limit, hard)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+    except (ValueError, OSError):
+        pass
+
+def _isolated_worker(function: Callable[..., Any], args: Tuple, memory_limit: Optional[int], connection) -> None:
+    """Führt eine Funktion im Kindprozess aus und sendet (Ergebnis, Fehler) über die Pipe zurück."""
+    _limit_memory(memory_limit)
+    try:
+        connection.send((function(*args), None))
+    except Exception as e:
+        connection.send((None, _describe_error(e, memory_limit)))
+    finally:
+        connection.close()
+
+def _page_worker(path: str, memory_limit: Optional[int], connection) -> None:
+    """Sendet im Kindprozess die bereinigten Seiten einzeln über die Pipe und zuletzt (None, Fehler oder None)."""
+    _limit_memory(memory_limit)
+    try:
+        for page in iter_pages(path):
+            connection.send(page)
+        connection.send((None, None))
+    except Exception as e:
+        connection.send((None, _describe_error(e, memory_limit)))
+    finally:
+        connection.close()
+
+def _describe_error(error: Exception, memory_limit: Optional[int]) -> str:
+    if isinstance(error, MemoryError):
+        return f"Speicherlimit von {(memory_limit or 0) // 1024 ** 2} MB überschritten"
+    return f"{type(error).__name__}: {error}"
+
+def run_isolated(tasks: List[Tuple[Callable[..., Any], Tuple]],
+                 max_workers: Optional[int] = None,
+                 timeout: Optional[float] = EXTRACT_TIMEOUT,
+                 memory_limit: Optional[int] = EXTRACT_MEMORY_LIMIT) -> List[Dict[str, Any]]:
+    """
+    Führt Aufgaben parallel in je einem eigenen Kindprozess aus.
+
+    Höchstens 'max_workers' Prozesse laufen gleichzeitig. Ein Kindprozess, der die Zeitbegrenzung
+    überschreitet, wird beendet; überschreitet er das Speicherlimit oder stürzt er ab, betrifft das nur
+    diese Aufgabe. Die Kindprozesse werden nicht aus dem (mehrthreadigen) Aufrufer geforkt (siehe
+    START_METHOD); Funktionen und Argumente müssen daher picklebar sein, d. h. auf Modulebene definiert,
+    und Pfade sollten absolut sein.
+
+    Args:
+        tasks (List[Tuple[Callable[..., Any], Tuple]]): Je Aufgabe die Funktion und ihre Argumente.
+        max_workers (Optional[int]): Anzahl gleichzeitiger Prozesse (Standard: Anzahl der CPU-Kerne).
+        timeout (Optional[float]): Maximale Laufzeit je Aufgabe in Sekunden (None: unbegrenzt).
+        memory_limit (Optional[int]): Zusätzlicher Speicher je Aufgabe in Bytes (nur Unix; None: unbegrenzt).
+
+    Returns:
+        List[Dict[str, Any]]: Je Aufgabe (in der Reihenfolge der Eingabe) ein Dictionary mit "result",
+        "error" (None bei Erfolg) und "seconds".
+    """
+    context = _get_context()
+    workers = max(1, min(max_workers or os.cpu_count() or 1, len(tasks) or 1))
+    results: List[Optional[Dict[str, Any]]] = [None] * len(tasks)
+    pending = deque(enumerate(tasks))
+    running: Dict[int, Dict[str, Any]] = {}
+
+    while pending or running:
+        while pending and len(running) < workers:
+            index, (function, args) = pending.popleft()
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(target=_isolated_worker, args=(function, args, memory_limit, sender),
+                                      daemon=True)
+            process.start()
+            sender.close()
+            running[index] = {"process": process, "receiver": receiver, "started": time.time()}
+
+        remaining = None
+        if timeout is not None:
+            remaining = max(0.0, min(job["started"] for job in running.values()) + timeout - time.time())
+        wait([job["receiver"] for job in running.values()] + [job["process"].sentinel for job in running.values()],
+             timeout=remaining)
+
+        now = time.time()
+        for index, job in list(running.items()):
+            process, receiver = job["process"], job["receiver"]
+            result, error = None, None
+            if receiver.poll():
+                try:
+                    result, error = receiver.recv()
+                except EOFError:
+                    error = ""
+            elif not process.is_alive():
+                error = ""
+            elif timeout is not None and now - job["started"] >= timeout:
+                process.kill()
+                error = f"Zeitüberschreitung nach {timeout} Sekunden"
+            else:
+                continue
+
+            process.join()
+            receiver.close()
+            if error == "":
+                error = f"Prozess ohne Ergebnis beendet (Exitcode {process.exitcode})"
+            results[index] = {"result": result, "error": error, "seconds": round(now - job["started"], 3)}
+            del running[index]
+
+    return results
+
+def extract_texts(paths: List[Union[str, Path]],
+                  max_workers: Optional[int] = None,
+                  timeout: Optional[float] = EXTRACT_TIMEOUT,
+                  memory_limit: Optional[int] = EXTRACT_MEMORY_LIMIT,
+                  extract: Callable[[str], str] = extract_cleaned_text,
+                  cache: Optional[TextCache] = None) -> List[Dict[str, Any]]:
+    """
+    Extrahiert den Text mehrerer PDFs parallel in eigenen Prozessen.
+
+    pdfminer ist reines Python und CPU-gebunden; Threads helfen wegen des GIL nicht. Jedes Dokument wird
+    daher in einem eigenen Kindprozess verarbeitet (siehe run_isolated), sodass ein abstürzendes, hängendes
+    oder zu speicherhungriges PDF den Lauf nicht abbricht. Bei nur einem Dokument werden stattdessen
+    dessen Seiten auf die Prozesse verteilt (siehe extract_text_parallel).
+
+    Mit einem TextCache werden bereits bekannte (byte-identische) PDFs ohne pdfminer aus dem Cache
+    übernommen und neu extrahierte Texte dort abgelegt.
+
+    Args:
+        paths (List[Union[str, Path]]): Die Pfade der PDF-Dateien.
+        max_workers (Optional[int]): Anzahl gleichzeitiger Prozesse (Standard: Anzahl der CPU-Kerne).
+        timeout (Optional[float]): Maximale Laufzeit je Dokument in Sekunden (None: unbegrenzt).
+        memory_limit (Optional[int]): Zusätzlicher Speicher je Dokument in Bytes (nur Unix; None: unbegrenzt).
+        extract (Callable[[str], str]): Die Extraktionsfunktion (Standard: extract_cleaned_text).
+        cache (Optional[TextCache]): Optionaler Textcache.
+
+    Returns:
+        List[Dict[str, Any]]: Je Pfad (in der Reihenfolge der Eingabe) ein Dictionary mit "path", "text",
+        "error" (None bei Erfolg), "seconds" und "cached".
+    """
+    workers = max_workers or os.cpu_count() or 1
+    results: List[Optional[Dict[str, Any]]] = [None] * len(paths)
+    keys: List[Optional[str]] = [None] * len(paths)
+    if cache is not None:
+        for index, path in enumerate(paths):
+            keys[index] = cache.make_key(path)
+            text = cache.lookup(keys[index]) if keys[index] else None
+            if text is not None:
+                results[index] = {"path": str(path), "text": text, "error": None, "seconds": 0.0, "cached": True}
+
+    missing = [index for index, result in enumerate(results) if result is None]
+    if len(missing) == 1 and workers > 1 and extract is extract_cleaned_text:
+        extracted = [extract_text_parallel(paths[missing[0]], workers, timeout, memory_limit)]
+    else:
+        extracted = run_isolated([(extract, (os.path.abspath(paths[index]),)) for index in missing], workers, timeout,
+                                 memory_limit)
+    for index, result in zip(missing, extracted):
+        text = result["text"] if "text" in result else result["result"]
+        results[index] = {"path": str(paths[index]), "text": text, "error": result["error"],
+                          "seconds": result["seconds"], "cached": False}
+        if cache is not None and keys[index] and not result["error"]:
+            cache.store(keys[index], text)
+
+    return results
+
+def stream_pages(path: Union[str, Path],
+                 timeout: Optional[float] = EXTRACT_TIMEOUT,
+                 memory_limit: Optional[int] = EXTRACT_MEMORY_LIMIT,
+                 cache: Optional[TextCache] = None,
+                 key: Optional[str] = None) -> Iterator[Tuple[int, str]]:
+    """
+    Liefert die bereinigten Seiten eines PDFs, während ein eigener Kindprozess sie extrahiert.
+
+    Der Kindprozess (siehe run_isolated) sendet jede Seite, sobald iter_pages sie liefert; der Aufrufer kann
+    sie daher chunken und kodieren, während die übrigen Seiten noch extrahiert werden, und hält nie den
+    ganzen Text des Dokuments. Die Zeitbegrenzung gilt für die Wartezeit auf den Kindprozess, nicht für
+    die Verarbeitung der gelieferten Seiten durch den Aufrufer.
+
+    Mit einem TextCache werden die Seiten eines bekannten PDFs aus dem Cache gelesen, ohne einen Prozess
+    zu starten. Sonst werden sie beim Durchreichen komprimiert und nach der letzten Seite im Cache abgelegt;
+    wird der Iterator vorher verworfen oder schlägt die Extraktion fehl, wird nichts gespeichert.
+
+    Args:
+        path (Union[str, Path]): Der Pfad der PDF-Datei.
+        timeout (Optional[float]): Maximale Wartezeit auf den Kindprozess in Sekunden (None: unbegrenzt).
+        memory_limit (Optional[int]): Zusätzlicher Speicher des Kindprozesses in Bytes (nur Unix; None: unbegrenzt).
+        cache (Optional[TextCache]): Optionaler Textcache.
+        key (Optional[str]): Optional der bereits berechnete Cache-Schlüssel (siehe TextCache.make_key).
+
+    Yields:
+        Tuple[int, str]: Seitennummer (ab 1) und bereinigter Text der Seite.
+
+    Raises:
+        ExtractionError: Wenn der Kindprozess abstürzt, ein Limit überschreitet oder einen Fehler meldet.
+    """
+    if cache is not None:
+        key = key or cache.make_key(path)
+        cached = cache.lookup_pages(key) if key else None
+        if cached is not None:
+            yield from cached
+            return
+    compressor = zlib.compressobj(6) if cache is not None and key else None
+    body: List[bytes] = []
+
+    context = _get_context()
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_page_worker, args=(os.path.abspath(path), memory_limit, sender), daemon=True)
+    process.start()
+    sender.close()
+    waited = 0.0
+    try:
+        while True:
+            begin = time.time()
+            ready = receiver.poll(None if timeout is None else max(0.0, timeout - waited))
+            waited += time.time() - begin
+            if not ready:
+                raise ExtractionError(f"Zeitüberschreitung nach {timeout} Sekunden")
+            try:
+                page_number, text = receiver.recv()
+            except EOFError:
+                process.join()
+                raise ExtractionError(f"Prozess ohne Ergebnis beendet (Exitcode {process.exitcode})")
+            if page_number is None:
+                if text:
+                    raise ExtractionError(text)
+                break
+            if compressor is not None:
+                body.append(compressor.compress(((PAGE_SEPARATOR if page_number > 1 else "") + text).encode("utf-8")))
+            yield page_number, text
+    finally:
+        if process.is_alive():
+            process.kill()
+        process.join()
+        receiver.close()
+
+    if compressor is not None:
+        body.append(compressor.flush())
+        cache.store_compressed(key, b"".join(body))
+
+def split_pages(page_count: int, parts: int, min_pages: int = MIN_PAGES_PER_TASK) -> List[Tuple[int, int]]:
+    """
+    Teilt die Seiten eines Dokuments in höchstens 'parts' zusammenhängende, etwa gleich große Bereiche.
+
+    Args:
+        page_count (int): Anzahl der Seiten.
+        parts (int): Gewünschte Anzahl der Bereiche.
+        min_pages (int): Mindestanzahl Seiten je Bereich.
+
+    Returns:
+        List[Tuple[int, int]]: Die Bereiche als (erste Seite, Seite nach dem Bereich), nullbasiert.
+    """
+    parts = max(1, min(parts, page_count // max(1, min_pages)))
+    bounds = [page_count * part // parts for part in range(parts + 1)]
+    return [(bounds[part], bounds[part + 1]) for part in range(parts) if bounds[part] < bounds[part + 1]]
+
+def extract_text_parallel(path: Union[str, Path],
+                          max_workers: Optional[int] = None,
+                          timeout: Optional[float] = EXTRACT_TIMEOUT,
+                          memory_limit: Optional[int] = EXTRACT_MEMORY_LIMIT) -> Dict[str, Any]:
+    """
+    Extrahiert den Text eines einzelnen (großen) PDFs, indem seine Seiten auf mehrere Prozesse verteilt werden.
+
+    Jeder Prozess öffnet die Datei selbst und verarbeitet nur seinen Seitenbereich (siehe
+    extract_page_range); die Teiltexte werden in Seitenreihenfolge zusammengesetzt und anschließend wie
+    bei extract_cleaned_text bereinigt. Dokumente mit weniger als 2 * MIN_PAGES_PER_TASK Seiten werden in
+    einem einzigen Prozess verarbeitet. Auch das Zählen der Seiten läuft isoliert.
+
+    Args:
+        path (Union[str, Path]): Der Pfad der PDF-Datei.
+        max_workers (Optional[int]): Anzahl gleichzeitiger Prozesse (Standard: Anzahl der CPU-Kerne).
+        timeout (Optional[float]): Maximale Laufzeit je Seitenbereich in Sekunden (None: unbegrenzt).
+        memory_limit (Optional[int]): Zusätzlicher Speicher je Prozess in Bytes (nur Unix; None: unbegrenzt).
+
+    Returns:
+        Dict[str, Any]: Ein Dictionary mit "path", "text", "error" (None bei Erfolg), "seconds" und "pages".
+    """
+    started = time.time()
+    path = str(path)
+    source = os.path.abspath(path)
+    counted = run_isolated([(count_pages, (source,))], 1, timeout, memory_limit)[0]
+    if counted["error"]:
+        return {"path": path, "text": None, "error": counted["error"], "seconds": counted["seconds"], "pages": None}
+
+    ranges = split_pages(counted["result"], max_workers or os.cpu_count() or 1)
+    if len(ranges) <= 1:
+        result = run_isolated([(extract_cleaned_text, (source,))], 1, timeout, memory_limit)[0]
+        text, error = result["result"], result["error"]
+    else:
+        results = run_isolated([(extract_page_range, (source, first, last)) for first, last in ranges],
+                               max_workers, timeout, memory_limit)
+        errors = [f"Seiten {first + 1}-{last}: {result['error']}"
+                  for (first, last), result in zip(ranges, results) if result["error"]]
+        text = None if errors else clean_text("".join(result["result"] for result in results))
+        error = "; ".join(errors) or None
+
+    return {"path": path, "text": text, "error": error, "seconds": round(time.time() - started, 3),
+            "pages": counted["result"]}
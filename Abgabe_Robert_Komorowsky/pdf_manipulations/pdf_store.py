@@ -0,0 +1,243 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from typing import Optional, Dict, Any
+
+STORE_DIR = os.path.join("pdf_manipulations", "pdf_store")
+REJECTION_TTL = 30 * 24 * 3600
+VERIFY_INTERVAL = 7 * 24 * 3600
+
+def file_sha256(path: str) -> str:
+    """Berechnet den SHA-256-Hash einer Datei blockweise."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class PdfStore:
+    """Inhaltsadressierter Speicher für PDFs mit SHA-256 als Schlüssel.
+
+    Jedes Dokument liegt genau einmal unter 'objects/<aa>/<sha256>.pdf'. Eine SQLite-Datei
+    ('index.sqlite3') ordnet URLs und paperIds dem Hash zu, sodass bekannte Dokumente ohne
+    Netzwerkzugriff gefunden werden. Die Zeitstempel-Ordner eines Laufs werden als Ansichten
+    mit Hardlinks (bzw. Kopien, falls das Dateisystem keine Hardlinks unterstützt) angelegt.
+
+    Zu jedem vollständig übernommenen Dokument wird ein Abschlussvermerk (Hash, Größe und die vom Server
+    angekündigte Content-Length) gespeichert; nur Dokumente mit passendem Vermerk gelten als vorhanden.
+    Ist die letzte Prüfung älter als 'verify_interval' Sekunden, wird der Inhalt bei 'lookup' erneut gehasht;
+    beschädigte Dokumente werden verworfen und neu geladen. Unterbrochene Downloads bleiben als
+    'tmp/<hash der URL>.part' samt Validatoren (ETag/Last-Modified) erhalten und können fortgesetzt werden.
+
+    URLs, die kein PDF liefern (z. B. HTML-Landingpages oder Captchas), werden mit Grund in einem
+    Negativ-Cache vermerkt und für 'rejection_ttl' Sekunden ohne Netzwerkzugriff übersprungen.
+
+    Args:
+        root (str): Basisverzeichnis des Speichers.
+        rejection_ttl (int): Gültigkeitsdauer eines Negativ-Eintrags in Sekunden (Standard: 30 Tage).
+        verify_interval (int): Abstand in Sekunden, nach dem ein Dokument erneut gehasht wird (Standard: 7 Tage).
+    """
+    def __init__(self, root: str = STORE_DIR, rejection_ttl: int = REJECTION_TTL,
+                 verify_interval: int = VERIFY_INTERVAL):
+        self.root = root
+        self.rejection_ttl = rejection_ttl
+        self.verify_interval = verify_interval
+        self.lock = threading.Lock()
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        os.makedirs(os.path.join(root, "tmp"), exist_ok=True)
+
+        self.connection = sqlite3.connect(os.path.join(root, "index.sqlite3"), check_same_thread=False)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, sha256 TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS papers (paper_id TEXT PRIMARY KEY, sha256 TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS objects (sha256 TEXT PRIMARY KEY, size INTEGER NOT NULL, verified_at REAL NOT NULL,
+                                                content_length INTEGER);
+            CREATE TABLE IF NOT EXISTS validators (url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT);
+            CREATE TABLE IF NOT EXISTS rejected (url TEXT PRIMARY KEY, reason TEXT NOT NULL, rejected_at REAL NOT NULL);
+        """)
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(objects)")]
+        if "content_length" not in columns:
+            # Speicher älterer Versionen enthalten noch keine Content-Length im Abschlussvermerk.
+            self.connection.execute("ALTER TABLE objects ADD COLUMN content_length INTEGER")
+        self.connection.commit()
+
+    def object_path(self, sha256: str) -> str:
+        """Liefert den Speicherort eines Dokuments zu seinem Hash."""
+        return os.path.join(self.root, "objects", sha256[:2], f"{sha256}.pdf")
+
+    def lookup(self, url: Optional[str] = None, paper_id: Optional[str] = None) -> Optional[str]:
+        """Sucht ein bereits gespeichertes Dokument über paperId oder URL.
+
+        Args:
+            url (Optional[str]): Die Download-URL.
+            paper_id (Optional[str]): Die paperId von Semantic Scholar.
+
+        Returns:
+            Optional[str]: Der SHA-256-Hash oder None, falls das Dokument unbekannt bzw. nicht mehr vorhanden ist.
+        """
+        with self.lock:
+            row = None
+            if paper_id:
+                row = self.connection.execute("SELECT sha256 FROM papers WHERE paper_id = ?", (paper_id,)).fetchone()
+            if row is None and url:
+                row = self.connection.execute("SELECT sha256 FROM urls WHERE url = ?", (url,)).fetchone()
+            if row is None:
+                return None
+            marker = self.connection.execute("SELECT size, content_length, verified_at FROM objects WHERE sha256 = ?",
+                                             (row[0],)).fetchone()
+
+        sha256, path = row[0], self.object_path(row[0])
+        if not marker or not os.path.exists(path):
+            return None
+        size, content_length, verified_at = marker
+        if os.path.getsize(path) != size or (content_length is not None and size != content_length):
+            return None
+        if time.time() - verified_at >= self.verify_interval:
+            if file_sha256(path) != sha256:
+                print(f"Dokument {sha256} ist beschädigt und wird neu geladen.")
+                self._discard_object(sha256)
+                return None
+            with self.lock:
+                self.connection.execute("UPDATE objects SET verified_at = ? WHERE sha256 = ?", (time.time(), sha256))
+                self.connection.commit()
+        return sha256
+
+    def _discard_object(self, sha256: str) -> None:
+        """Entfernt ein beschädigtes Dokument samt Abschlussvermerk."""
+        with self.lock:
+            self.connection.execute("DELETE FROM objects WHERE sha256 = ?", (sha256,))
+            self.connection.commit()
+            if os.path.exists(self.object_path(sha256)):
+                os.remove(self.object_path(sha256))
+
+    def validators(self, url: str) -> Dict[str, str]:
+        """Liefert die Header für eine bedingte Anfrage (If-None-Match / If-Modified-Since) zu einer URL."""
+        with self.lock:
+            row = self.connection.execute("SELECT etag, last_modified FROM validators WHERE url = ?", (url,)).fetchone()
+        headers = {}
+        if row and row[0]:
+            headers["If-None-Match"] = row[0]
+        if row and row[1]:
+            headers["If-Modified-Since"] = row[1]
+        return headers
+
+    def rejection(self, url: str) -> Optional[str]:
+        """Liefert den Grund, aus dem eine URL abgelehnt wurde, oder None, falls sie (noch) geladen werden darf."""
+        with self.lock:
+            row = self.connection.execute("SELECT reason, rejected_at FROM rejected WHERE url = ?", (url,)).fetchone()
+        if row and time.time() - row[1] < self.rejection_ttl:
+            return row[0]
+        return None
+
+    def reject(self, url: str, reason: str) -> None:
+        """Vermerkt eine URL mit Grund im Negativ-Cache."""
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO rejected (url, reason, rejected_at) VALUES (?, ?, ?)",
+                                    (url, reason, time.time()))
+            self.connection.commit()
+
+    def partial_path(self, url: str) -> str:
+        """Liefert den Pfad des (ggf. unvollständigen) Downloads einer URL."""
+        return os.path.join(self.root, "tmp", hashlib.sha256(url.encode("utf-8")).hexdigest() + ".part")
+
+    def partial_info(self, url: str) -> Optional[Dict[str, Any]]:
+        """Liefert die Validatoren eines unterbrochenen Downloads oder None, falls keiner fortgesetzt werden kann."""
+        path = self.partial_path(url)
+        if not os.path.exists(path) or not os.path.exists(path + ".json"):
+            return None
+        with open(path + ".json", "r", encoding="utf-8") as file:
+            info = json.load(file)
+        info["offset"] = os.path.getsize(path)
+        return info
+
+    def save_partial_info(self, url: str, etag: Optional[str], last_modified: Optional[str],
+                          total_size: Optional[int]) -> None:
+        """Speichert die Validatoren eines begonnenen Downloads für eine spätere Fortsetzung."""
+        with open(self.partial_path(url) + ".json", "w", encoding="utf-8") as file:
+            json.dump({"url": url, "etag": etag, "last_modified": last_modified, "total_size": total_size}, file)
+
+    def discard_partial(self, url: str) -> None:
+        """Entfernt einen unvollständigen Download samt Validatoren."""
+        for path in (self.partial_path(url), self.partial_path(url) + ".json"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def add_file(self, path: str, url: Optional[str] = None, paper_id: Optional[str] = None,
+                 sha256: Optional[str] = None, etag: Optional[str] = None,
+                 last_modified: Optional[str] = None, content_length: Optional[int] = None) -> str:
+        """Übernimmt eine Datei in den Speicher, registriert URL und paperId und setzt den Abschlussvermerk.
+
+        Die Datei wird verschoben; existiert der Inhalt bereits, wird sie verworfen, sofern das vorhandene
+        Dokument noch zu seinem Hash passt (sonst ersetzt die neue Datei das beschädigte Dokument). Eine
+        zugehörige Validator-Datei ('<path>.json') eines fortgesetzten Downloads wird entfernt.
+
+        Args:
+            path (str): Pfad der (temporären) Datei.
+            url (Optional[str]): Die Download-URL.
+            paper_id (Optional[str]): Die paperId von Semantic Scholar.
+            sha256 (Optional[str]): Bereits beim Download berechneter Hash (sonst wird er berechnet).
+            etag (Optional[str]): ETag der Antwort für spätere Revalidierungen.
+            last_modified (Optional[str]): Last-Modified der Antwort für spätere Revalidierungen.
+            content_length (Optional[int]): Vom Server angekündigte Gesamtgröße des Dokuments.
+
+        Returns:
+            str: Der SHA-256-Hash des Inhalts.
+
+        Raises:
+            ValueError: Wenn die Größe der Datei nicht der angekündigten Content-Length entspricht.
+        """
+        if content_length is not None and os.path.getsize(path) != content_length:
+            raise ValueError(f"{path} hat {os.path.getsize(path)} statt {content_length} Bytes.")
+        if sha256 is None:
+            sha256 = file_sha256(path)
+
+        target = self.object_path(sha256)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with self.lock:
+            if os.path.exists(target) and file_sha256(target) == sha256:
+                os.remove(path)
+            else:
+                os.replace(path, target)
+            if os.path.exists(path + ".json"):
+                os.remove(path + ".json")
+            self.connection.execute("INSERT OR REPLACE INTO objects (sha256, size, verified_at, content_length) "
+                                    "VALUES (?, ?, ?, ?)", (sha256, os.path.getsize(target), time.time(), content_length))
+            if url and (etag or last_modified):
+                self.connection.execute("INSERT OR REPLACE INTO validators (url, etag, last_modified) VALUES (?, ?, ?)",
+                                        (url, etag, last_modified))
+            self.connection.commit()
+
+        self.register(sha256, url, paper_id)
+        return sha256
+
+    def register(self, sha256: str, url: Optional[str] = None, paper_id: Optional[str] = None) -> None:
+        """Ordnet URL und paperId einem gespeicherten Dokument zu."""
+        with self.lock:
+            if url:
+                self.connection.execute("INSERT OR REPLACE INTO urls (url, sha256) VALUES (?, ?)", (url, sha256))
+            if paper_id:
+                self.connection.execute("INSERT OR REPLACE INTO papers (paper_id, sha256) VALUES (?, ?)",
+                                        (paper_id, sha256))
+            self.connection.commit()
+
+    def link(self, sha256: str, destination: str) -> None:
+        """Legt ein gespeichertes Dokument in einer Lauf-Ansicht ab (Hardlink, ersatzweise Kopie).
+
+        Args:
+            sha256 (str): Der Hash des Dokuments.
+            destination (str): Zielpfad, z. B. 'pdf_manipulations/pdf_db/<zeitstempel>/<titel>.pdf'.
+        """
+        if os.path.exists(destination):
+            os.remove(destination)
+        try:
+            os.link(self.object_path(sha256), destination)
+        except OSError:
+            shutil.copyfile(self.object_path(sha256), destination)
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
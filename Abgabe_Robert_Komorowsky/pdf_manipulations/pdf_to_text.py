@@ -1,71 +1,272 @@
 from pdf_manipulations.pdfminer.high_level import extract_text
-from typing import Union
+from pdf_manipulations.pdfminer.converter import TextConverter
+from pdf_manipulations.pdfminer.layout import LAParams
+from pdf_manipulations.pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
+from pdf_manipulations.pdfminer.pdfpage import PDFPage
+from typing import Iterator, List, Optional, Tuple, Union
 from pathlib import Path
+from io import StringIO
 import re
 
+# Bei jeder Änderung an Extraktion oder Bereinigung erhöhen, damit der Textcache (siehe text_cache) neu befüllt wird.
+EXTRACTOR_VERSION = "3"
+LAPARAMS = LAParams()
+
+CLEANING_PATTERNS = [
+    r'\b\d+/\d+\b',  
+    r'\b[A-Za-z]+\(\d+\)',  
+    r'\b\d+\^\d+\b',  
+    r'=\s*[+-]?(\d+(\.\d*)?|\.\d+)',  
+    r'[α-ωΑ-Ω]+',  
+    r'[≈≥≤±]+',  
+    r'∑|∫|∂',  
+    r'\b[A-Za-z]{1,2}_?\d*[\^_]?\d+\b',  
+    r'\bwhere\b',  
+    r'\bFig\.\s*\d+|\bTable\s*\d+|\[\d+(-\d+)?\]',  
+    r'\b[NnCcFf]\s?=\s?[A-Za-z0-9\-\+\*/\^]+',  
+    r'\b\d+\s?[\+\-\*/\^]\s?\d+',  
+    r'\([A-Za-z0-9\+\-\*/\^\s]+\)',  
+    r'\[[A-Za-z0-9\+\-\*/\^\s]+\]',  
+    r'\{[A-Za-z0-9\+\-\*/\^\s]+\}',  
+    r'\b[A-Za-z]+[\_\/\^\(][A-Za-z0-9\+\-\*]+',  
+    r'≈|≥|≤|±|\∑|\∫|\∂',  
+    r'\balpha\b|\bbeta\b|\bgamma\b|\bdelta\b',  
+    r'[α-ωΑ-Ω]',  
+    r'\d+[.,]?\d*\s*(×\s*10\^\s*[\-\+]?\d+)?',  
+    r'\b(?:sin|cos|tan|log|ln|exp)\b',  
+    r'[A-Za-z]\s?\([\w\s,]*\)\s?=',  
+    r'[A-Za-z]\s?[_\^]\s?[A-Za-z0-9]+',  
+    r'\b[A-Za-z]{1,3}\b[\s-]*[\+\-\*/^]=',  
+    r'\([^\)]+\)',  
+    r'\b\d+\.?\d*\s*[\+\-\*/^]\s*\d+\.?\d*\b',  
+    r'[A-Za-z]+[\d\+\-\*/^]+',  
+    r'\b(?:sin|cos|tan|log|exp|ln)\([^\)]+\)',  
+    r'\b[A-Za-z]+[_\^][A-Za-z0-9]+\b',  
+    r'\b\w+\s*\=\s*[^\;]+\;',  
+    r'\b\d+\s*[\+\-\*/\^]\s*\d+',  
+    r'[α-ωΑ-Ω]',  
+    r'\b(?:sin|cos|tan|log|ln|exp)\b\([^\)]*\)',  
+    r'\b[A-Za-z]{1,2}\d*\s?[\+\-\*/\^]=\s?[A-Za-z]{1,2}\d*',  
+    r'n\s?X',  
+    r'[A-Za-z]+\s?\-\s?[A-Za-z]+',  
+    r'\bCF\s?=\s?[^\;]+\;',  
+    r'∑|∫|∂',  
+    r'\([^)]+\)',  
+    r'\b[A-Za-z]+\s?\*?\s?\([^\)]+\)\s?=',  
+    r'A[^\s,]+,\s*QT\s*,\s*y,\s*Ω\*?\)\s*=',  
+    r'\bS\s*\n[^\n]+n\s*o\s*,',  
+    r'\bFi,\s*\b',  
+    r'\bFg,\s*\b',  
+    r'F[ig],\s*\+?\s*F[ig],\+?',  
+    r'\bXi=[^\n]+\.\.\.,',  
+    r'⊗',  
+    r'f[¯]?[^\s]+\s*[⊗]',  
+    r'µF\s*/\s*Q',  
+    r'[PF]\'?[ig],\+?',  
+]
+
+WHITESPACE_REGEX = re.compile(r'\s+')
+PAGE_SEPARATOR = "\f"
+
+def iter_pages(path_to_pdf: Union[str, Path]) -> Iterator[Tuple[int, str]]:
+    """
+    Extrahiert und bereinigt den Text einer PDF-Datei Seite für Seite.
+
+    Jede Seite wird geliefert, sobald pdfminer sie verarbeitet hat; es liegt nie mehr als eine Seite
+    unbereinigten Textes im Speicher, und nachfolgende Schritte (z. B. das Chunking) können beginnen,
+    bevor die letzte Seite gelesen ist.
+
+    Args:
+        path_to_pdf (Union[str, Path]): Der Pfad zur PDF-Datei als Zeichenkette oder Path-Objekt.
+
+    Yields:
+        Tuple[int, str]: Seitennummer (ab 1) und bereinigter Text der Seite (ggf. leer).
+    """
+    with open(path_to_pdf, "rb") as file, StringIO() as output:
+        resource_manager = PDFResourceManager()
+        device = TextConverter(resource_manager, output, laparams=LAPARAMS)
+        interpreter = PDFPageInterpreter(resource_manager, device)
+        for page_number, page in enumerate(PDFPage.get_pages(file), start=1):
+            interpreter.process_page(page)
+            yield page_number, clean_page(output.getvalue())
+            output.seek(0)
+            output.truncate(0)
+
 def extract_cleaned_text(path_to_pdf: Union[str, Path]) -> str:
     """
     Extrahiert und bereinigt den Text aus einer PDF-Datei, indem unerwünschte Muster entfernt werden.
 
+    Die Seiten werden durch Seitenvorschübe (PAGE_SEPARATOR) getrennt, sodass sich die Seitennummern
+    später mit split_cleaned_pages wiederherstellen lassen.
+
     Args:
         path_to_pdf (Union[str, Path]): Der Pfad zur PDF-Datei als Zeichenkette oder Path-Objekt.
 
     Returns:
         str: Der bereinigte Text aus der PDF-Datei.
     """
-    text = extract_text(path_to_pdf)
-    patterns = [
-        r'\b\d+/\d+\b',  
-        r'\b[A-Za-z]+\(\d+\)',  
-        r'\b\d+\^\d+\b',  
-        r'=\s*[+-]?(\d+(\.\d*)?|\.\d+)',  
-        r'[α-ωΑ-Ω]+',  
-        r'[≈≥≤±]+',  
-        r'∑|∫|∂',  
-        r'\b[A-Za-z]{1,2}_?\d*[\^_]?\d+\b',  
-        r'\bwhere\b',  
-        r'\bFig\.\s*\d+|\bTable\s*\d+|\[\d+(-\d+)?\]',  
-        r'\b[NnCcFf]\s?=\s?[A-Za-z0-9\-\+\*/\^]+',  
-        r'\b\d+\s?[\+\-\*/\^]\s?\d+',  
-        r'\([A-Za-z0-9\+\-\*/\^\s]+\)',  
-        r'\[[A-Za-z0-9\+\-\*/\^\s]+\]',  
-        r'\{[A-Za-z0-9\+\-\*/\^\s]+\}',  
-        r'\b[A-Za-z]+[\_\/\^\(][A-Za-z0-9\+\-\*]+',  
-        r'≈|≥|≤|±|\∑|\∫|\∂',  
-        r'\balpha\b|\bbeta\b|\bgamma\b|\bdelta\b',  
-        r'[α-ωΑ-Ω]',  
-        r'\d+[.,]?\d*\s*(×\s*10\^\s*[\-\+]?\d+)?',  
-        r'\b(?:sin|cos|tan|log|ln|exp)\b',  
-        r'[A-Za-z]\s?\([\w\s,]*\)\s?=',  
-        r'[A-Za-z]\s?[_\^]\s?[A-Za-z0-9]+',  
-        r'\b[A-Za-z]{1,3}\b[\s-]*[\+\-\*/^]=',  
-        r'\([^\)]+\)',  
-        r'\b\d+\.?\d*\s*[\+\-\*/^]\s*\d+\.?\d*\b',  
-        r'[A-Za-z]+[\d\+\-\*/^]+',  
-        r'\b(?:sin|cos|tan|log|exp|ln)\([^\)]+\)',  
-        r'\b[A-Za-z]+[_\^][A-Za-z0-9]+\b',  
-        r'\b\w+\s*\=\s*[^\;]+\;',  
-        r'\b\d+\s*[\+\-\*/\^]\s*\d+',  
-        r'[α-ωΑ-Ω]',  
-        r'\b(?:sin|cos|tan|log|ln|exp)\b\([^\)]*\)',  
-        r'\b[A-Za-z]{1,2}\d*\s?[\+\-\*/\^]=\s?[A-Za-z]{1,2}\d*',  
-        r'n\s?X',  
-        r'[A-Za-z]+\s?\-\s?[A-Za-z]+',  
-        r'\bCF\s?=\s?[^\;]+\;',  
-        r'∑|∫|∂',  
-        r'\([^)]+\)',  
-        r'\b[A-Za-z]+\s?\*?\s?\([^\)]+\)\s?=',  
-        r'A[^\s,]+,\s*QT\s*,\s*y,\s*Ω\*?\)\s*=',  
-        r'\bS\s*\n[^\n]+n\s*o\s*,',  
-        r'\bFi,\s*\b',  
-        r'\bFg,\s*\b',  
-        r'F[ig],\s*\+?\s*F[ig],\+?',  
-        r'\bXi=[^\n]+\.\.\.,',  
-        r'⊗',  
-        r'f[¯]?[^\s]+\s*[⊗]',  
-        r'µF\s*/\s*Q',  
-        r'[PF]\'?[ig],\+?',  
-    ]
-    text = re.sub(r'\s+', ' ', text).strip()  
-    return text
+    return PAGE_SEPARATOR.join(text for _, text in iter_pages(path_to_pdf))
+
+def split_cleaned_pages(text: str) -> List[Tuple[int, str]]:
+    """
+    Zerlegt einen bereinigten Text (siehe extract_cleaned_text) wieder in seine Seiten.
+
+    Args:
+        text (str): Der bereinigte Text mit Seitenvorschüben.
+
+    Returns:
+        List[Tuple[int, str]]: Seitennummer (ab 1) und Text je Seite.
+    """
+    return list(enumerate(text.split(PAGE_SEPARATOR), start=1))
+
+def extract_page_range(path_to_pdf: Union[str, Path], first_page: int, last_page: int) -> str:
+    """
+    Extrahiert den unbereinigten Text der Seiten 'first_page' (inklusive) bis 'last_page' (exklusive).
+
+    Args:
+        path_to_pdf (Union[str, Path]): Der Pfad zur PDF-Datei.
+        first_page (int): Erste Seite (nullbasiert).
+        last_page (int): Seite, vor der die Extraktion endet (nullbasiert).
+
+    Returns:
+        str: Der Text der Seiten; wie bei extract_text endet jede Seite mit einem Seitenvorschub.
+    """
+    return extract_text(path_to_pdf, page_numbers=range(first_page, last_page), maxpages=last_page,
+                        laparams=LAPARAMS)
+
+def count_pages(path_to_pdf: Union[str, Path]) -> int:
+    """
+    Zählt die Seiten einer PDF-Datei, ohne deren Inhalt zu interpretieren.
+
+    Args:
+        path_to_pdf (Union[str, Path]): Der Pfad zur PDF-Datei.
+
+    Returns:
+        int: Die Anzahl der Seiten.
+    """
+    with open(path_to_pdf, "rb") as file:
+        return sum(1 for _ in PDFPage.get_pages(file))
+
+def _split_alternatives(pattern: str) -> List[str]:
+    """Zerlegt ein Muster an den '|' der obersten Ebene (außerhalb von Gruppen und Zeichenklassen)."""
+    parts, current, depth, escaped, in_class = [], "", 0, False, False
+    for char in pattern:
+        if escaped:
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif in_class:
+            in_class = char != "]"
+        elif char == "[":
+            in_class = True
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "|" and depth == 0:
+            parts.append(current)
+            current = ""
+            continue
+        current += char
+    parts.append(current)
+    return parts
+
+def _first_class(alternative: str) -> Optional[str]:
+    """Liefert den Inhalt einer Zeichenklasse für das erste Zeichen eines Treffers oder None, falls unbekannt."""
+    if alternative.startswith("\\") and len(alternative) > 1 and not alternative[1].isalnum():
+        first, end = re.escape(alternative[1]), 2
+    elif alternative.startswith("[") and not alternative.startswith("[^") and "]" in alternative[2:]:
+        end = alternative.index("]", 2) + 1
+        first = alternative[1:end - 1]
+    elif alternative and alternative[0] not in ".^$*+?{}()|\\[":
+        first, end = re.escape(alternative[0]), 1
+    else:
+        return None
+    # Ein optionales erstes Zeichen (?, *, {0,…}) legt den Anfang des Treffers nicht fest.
+    return None if alternative[end:end + 1] in ("?", "*", "{") else first
+
+def compile_cleaning_regex(patterns: List[str]) -> "re.Pattern[str]":
+    """
+    Übersetzt die Bereinigungsmuster einmalig in einen einzigen regulären Ausdruck.
+
+    Eine einfache Alternation aller Muster ist in Pythons re kaum schneller als eine Schleife über die
+    Muster, weil an jeder Textstelle jede Alternative versucht wird. Die Alternativen werden daher nach
+    ihrem Anfang gruppiert, sodass mitten in einem Wort meist nur wenige billige Prüfungen scheitern:
+
+    - Alternativen mit führendem \\b teilen sich eine einzige Wortgrenzen-Prüfung.
+    - Alternativen, die mit [A-Za-z]+ bzw. \\d+ beginnen, werden nur am Anfang einer Buchstaben- bzw.
+      Ziffernfolge versucht. Das ändert ihre Treffer nicht: Ein Treffer innerhalb der Folge lässt sich
+      immer zu einem Treffer ab deren Anfang verlängern.
+    - Alternativen mit bekanntem erstem Zeichen (ohne ASCII-Buchstaben) stehen hinter einem gemeinsamen
+      Lookahead auf die Vereinigung dieser Zeichen.
+
+    Innerhalb einer Gruppe bleibt die Reihenfolge der Liste erhalten; doppelte Alternativen entfallen.
+
+    Args:
+        patterns (List[str]): Die Muster (siehe CLEANING_PATTERNS).
+
+    Returns:
+        re.Pattern[str]: Der kompilierte Ausdruck.
+    """
+    word, letters, digits, symbols, others = [], [], [], [], []
+    for alternative in dict.fromkeys(part for pattern in patterns for part in _split_alternatives(pattern)):
+        first = _first_class(alternative)
+        if alternative.startswith(r"\b"):
+            word.append(alternative[2:])
+        elif alternative.startswith("[A-Za-z]+"):
+            letters.append(alternative)
+        elif alternative.startswith(r"\d+"):
+            digits.append(alternative)
+        elif first is not None and not re.search("[A-Za-z]", first.replace("\\", "")):
+            symbols.append((first, alternative))
+        else:
+            others.append(alternative)
+
+    def join(alternatives: List[str]) -> str:
+        return "|".join(f"(?:{alternative})" for alternative in alternatives)
+
+    groups = []
+    if word:
+        groups.append(rf"\b(?:{join(word)})")
+    if letters:
+        groups.append(rf"(?<![A-Za-z])(?:{join(letters)})")
+    if digits:
+        groups.append(rf"(?<!\d)(?:{join(digits)})")
+    if symbols:
+        first_chars = "".join(dict.fromkeys(first for first, _ in symbols))
+        groups.append(rf"(?=[{first_chars}])(?:{join([alternative for _, alternative in symbols])})")
+    if others:
+        groups.append(join(others))
+    return re.compile("|".join(groups))
 
+CLEANING_REGEX = compile_cleaning_regex(CLEANING_PATTERNS)
+
+def clean_page(text: str) -> str:
+    """
+    Bereinigt den Text einer einzelnen Seite in einem Durchlauf über alle Muster (siehe CLEANING_REGEX).
+
+    Args:
+        text (str): Der unbereinigte Text der Seite.
+
+    Returns:
+        str: Der bereinigte Text mit zusammengefassten Leerzeichen.
+    """
+    return WHITESPACE_REGEX.sub(' ', CLEANING_REGEX.sub(' ', text)).strip()
+
+def clean_text(text: str) -> str:
+    """
+    Bereinigt einen mit pdfminer extrahierten Text seitenweise.
+
+    Der Text wird an den Seitenvorschüben getrennt, die pdfminer nach jeder Seite einfügt, sodass kein Muster
+    über eine Seitengrenze hinweg sucht und der Aufwand je Durchlauf auf eine Seite begrenzt bleibt. Das
+    Ergebnis entspricht dem von extract_cleaned_text (Seiten durch PAGE_SEPARATOR getrennt).
+
+    Args:
+        text (str): Der unbereinigte Text.
+
+    Returns:
+        str: Der bereinigte Text.
+    """
+    if text.endswith(PAGE_SEPARATOR):
+        text = text[:-len(PAGE_SEPARATOR)]
+    return PAGE_SEPARATOR.join(clean_page(page) for page in text.split(PAGE_SEPARATOR))
@@ -1,17 +1,35 @@
 from sentence_transformers import SentenceTransformer
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from typing import Dict, Optional
+from typing import Dict, List, Any, Optional, Iterable, Iterator, Set, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import islice
+import numpy as np
 import pandas as pd
 import os
 import json
-from pdf_manipulations.pdf_to_text import extract_cleaned_text
+import threading
+from pdf_manipulations.pdf_extraction_pool import stream_pages, ExtractionError
+from pdf_manipulations.text_cache import TextCache
+from pdf_manipulations.embedding_store import EmbeddingStore, EMBEDDING_STORE_PATH
 import re
 
-model = SentenceTransformer('multi-qa-MiniLM-L6-cos-v1')
+MODEL_NAME = 'multi-qa-MiniLM-L6-cos-v1'
+model = SentenceTransformer(MODEL_NAME)
+
+ENCODE_BATCH_SIZE = 64
+EMBED_BUFFER_SIZE = 4 * ENCODE_BATCH_SIZE
+VECTORISE_WORKERS = os.cpu_count() or 1
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 20
+CHUNKER_CONFIG = f"recursive:{CHUNK_SIZE}:{CHUNK_OVERLAP}"
+COMPACT_THRESHOLD = 0.25
+
+# Das Modell nutzt bereits alle Kerne; parallele Aufrufe aus mehreren Threads würden sich nur verdrängen.
+encode_lock = threading.Lock()
 
 text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=500,
-    chunk_overlap=20,
+    chunk_size=CHUNK_SIZE,
+    chunk_overlap=CHUNK_OVERLAP,
     length_function=len
 )
 
@@ -51,16 +69,195 @@ def load_metadata(json_path: str) -> Dict[str, Dict]:
     
     return metadata_dict
 
-def vectorising_pdfs() -> Optional[pd.DataFrame]:
+def chunk_text(text: str) -> List[str]:
+    """
+    Teilt einen Text in Absätze (Chunks) für die Vektorisierung auf.
+    """
+    chunks = text_splitter.create_documents([text])
+    return [str(chunk) for chunk in chunks]
+
+def chunk_pages(pages: Iterable[Tuple[Optional[int], str]]) -> Iterator[Tuple[Optional[int], str]]:
+    """
+    Teilt die Seiten eines PDFs in Absätze (Chunks) auf, ohne Seitengrenzen zu überschreiten.
+
+    :param pages: Seitennummer (oder None, falls unbekannt) und Text je Seite, z. B. aus iter_pages oder
+                  split_cleaned_pages.
+    :return: Iterator über (Seitennummer, Absatz); die Seiten werden erst beim Iterieren gelesen.
+    """
+    for page, text in pages:
+        if text.strip():
+            for chunk in chunk_text(text):
+                yield page, chunk
+
+def encode_texts(texts: List[str], batch_size: int = ENCODE_BATCH_SIZE) -> np.ndarray:
+    """
+    Erstellt die Embeddings vieler Absätze in Batches.
+
+    Die Texte werden absteigend nach Länge sortiert, damit jeder Batch ähnlich lange Texte enthält und
+    kaum Padding anfällt, und in einem einzigen Aufruf des Modells kodiert. Die normierten float32-Vektoren
+    werden anschließend in die ursprüngliche Reihenfolge einer zusammenhängenden Matrix zurücksortiert.
+
+    :param texts: Die Absätze.
+    :param batch_size: Anzahl der Absätze je Batch des Modells.
+    :return: Matrix der Form (Anzahl Absätze, Dimension) vom Typ float32.
+    """
+    dimension = model.get_sentence_embedding_dimension()
+    matrix = np.empty((len(texts), dimension), dtype=np.float32)
+    if not texts:
+        return matrix
+
+    order = sorted(range(len(texts)), key=lambda index: len(texts[index]), reverse=True)
+    with encode_lock:
+        encoded = model.encode([texts[index] for index in order], batch_size=batch_size, convert_to_numpy=True,
+                               normalize_embeddings=True, show_progress_bar=False)
+    matrix[order] = np.asarray(encoded, dtype=np.float32)
+    return matrix
+
+def embed_chunks(pdf_id: str, title: str, chunk_texts: List[str],
+                 pages: Optional[List[Optional[int]]] = None,
+                 embeddings: Optional[np.ndarray] = None,
+                 offset: int = 0) -> List[Dict[str, Any]]:
     """
-    Vektorisiert alle PDFs im neuesten Zeitstempel-Ordner.
+    Erstellt die Embeddings für die Absätze eines PDFs.
+
+    :param pdf_id: Dateiname des PDFs ohne Endung.
+    :param title: Titel der Publikation.
+    :param chunk_texts: Die Absätze des PDFs.
+    :param pages: Optional die Seitennummer je Absatz (siehe chunk_pages).
+    :param embeddings: Optional bereits berechnete Embeddings der Absätze (sonst per encode_texts).
+    :param offset: Position des ersten Absatzes im PDF (für 'pdf_id_order', siehe embed_pages).
+    :return: Liste der Absatz-Einträge mit 'pdf_id_order', 'pdf_id', 'title', 'page', 'paragraph_text' und 'embedding'.
+    """
+    pages = pages or [None] * len(chunk_texts)
+    if embeddings is None:
+        embeddings = encode_texts(chunk_texts)
+    return [{
+        "pdf_id_order": f"{pdf_id}_{offset + j}",
+        "pdf_id": pdf_id,
+        "title": title,
+        "page": page,
+        "paragraph_text": chunk,
+        "embedding": embedding
+    } for j, (chunk, page, embedding) in enumerate(zip(chunk_texts, pages, embeddings))]
+
+def embed_pages(pdf_id: str, title: str, pages: Iterable[Tuple[Optional[int], str]],
+                buffer_size: int = EMBED_BUFFER_SIZE) -> List[Dict[str, Any]]:
+    """
+    Teilt die Seiten eines PDFs in Absätze auf und erstellt deren Embeddings mit Seitenangabe.
+
+    Die Seiten werden erst beim Kodieren gelesen (z. B. aus stream_pages): Je 'buffer_size' Absätze werden
+    gesammelt und gemeinsam kodiert, sodass die Extraktion der folgenden Seiten und das Kodieren überlappen
+    und nie der ganze Text des PDFs im Speicher liegt.
+
+    :param pdf_id: Dateiname des PDFs ohne Endung.
+    :param title: Titel der Publikation.
+    :param pages: Seitennummer und Text je Seite, eine Liste oder ein Iterator.
+    :param buffer_size: Anzahl der Absätze, die gemeinsam kodiert werden.
+    :return: Liste der Absatz-Einträge (siehe embed_chunks).
+    """
+    chunks = chunk_pages(pages)
+    rows: List[Dict[str, Any]] = []
+    while True:
+        batch = list(islice(chunks, buffer_size))
+        if not batch:
+            return rows
+        rows.extend(embed_chunks(pdf_id, title, [chunk for _, chunk in batch], [page for page, _ in batch],
+                                 offset=len(rows)))
+
+def vectorise_pdf(pdf_id: str, title: str, path: str, text_cache: Optional[TextCache] = None,
+                  text_key: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Extrahiert, chunkt und kodiert ein PDF seitenweise (stream_pages → chunk_pages → embed_pages).
+
+    Die Extraktion läuft in einem eigenen Kindprozess; schlägt sie fehl, besteht das Ergebnis aus einem
+    einzelnen Hinweis-Absatz.
+
+    :param pdf_id: Dateiname des PDFs ohne Endung.
+    :param title: Titel der Publikation.
+    :param path: Pfad der PDF-Datei.
+    :param text_cache: Optionaler Textcache (siehe stream_pages).
+    :param text_key: Optional der bereits berechnete Textcache-Schlüssel des PDFs.
+    :return: Die Absatz-Einträge (siehe embed_chunks) und die Fehlermeldung (None bei Erfolg).
+    """
+    try:
+        return embed_pages(pdf_id, title, stream_pages(path, cache=text_cache, key=text_key)), None
+    except ExtractionError as e:
+        return embed_pages(pdf_id, title, [(None, f"Paper '{title}' konnte nicht verarbeitet werden.")]), str(e)
+
+def document_key(path: str, text_key: Optional[str] = None) -> Optional[str]:
+    """
+    Erzeugt den Schlüssel, unter dem die Absätze eines PDFs im EmbeddingStore abgelegt werden.
+
+    Er setzt sich aus dem Textcache-Schlüssel (SHA-256 des PDFs und Extraktor-Version), der Konfiguration der
+    Textaufteilung und dem Namen des Modells zusammen. Ändert sich eines davon, wird das PDF neu vektorisiert.
+
+    :param path: Pfad der PDF-Datei.
+    :param text_key: Optional der bereits berechnete Textcache-Schlüssel (sonst wird die Datei gehasht).
+    :return: Der Schlüssel oder None, falls die Datei nicht gelesen werden kann.
+    """
+    text_key = text_key or TextCache.make_key(path)
+    return f"{text_key}:{CHUNKER_CONFIG}:{MODEL_NAME}" if text_key else None
+
+def available_pdf_ids(pdf_base_path: Optional[str] = None) -> Set[str]:
+    """
+    Sammelt die IDs (Dateinamen ohne Endung) aller PDFs in sämtlichen Zeitstempel-Ordnern.
+
+    :param pdf_base_path: Optionaler Basispfad zu den PDF-Verzeichnissen.
+    :return: Die Menge der PDF-IDs, die noch auf der Festplatte liegen.
+    """
+    if pdf_base_path is None:
+        pdf_base_path = os.path.join("pdf_manipulations", "pdf_db")
+    if not os.path.isdir(pdf_base_path):
+        return set()
+    return {os.path.splitext(name)[0]
+            for folder in os.listdir(pdf_base_path) if os.path.isdir(os.path.join(pdf_base_path, folder))
+            for name in os.listdir(os.path.join(pdf_base_path, folder)) if name.endswith(".pdf")}
+
+def index_documents(store: EmbeddingStore, documents: Dict[str, Tuple[Optional[str], List[Dict[str, Any]]]],
+                    available: Optional[Iterable[str]] = None) -> Dict[str, int]:
+    """
+    Übernimmt neu vektorisierte PDFs in den EmbeddingStore.
+
+    Die bisherigen Absätze eines ersetzten PDFs werden als gelöscht markiert. Mit 'available' werden außerdem
+    gespeicherte PDFs entfernt, deren Datei nicht mehr vorhanden ist. PDFs, die lediglich in diesem Lauf nicht
+    vorkommen (z. B. bei inkrementellen Läufen, die nur neue Papers liefern), bleiben erhalten. Übersteigt der
+    Anteil gelöschter Zeilen COMPACT_THRESHOLD, wird der Speicher kompaktiert.
+
+    :param store: Der EmbeddingStore.
+    :param documents: Je PDF-ID der Dokumentschlüssel (siehe document_key) und die Absatz-Einträge.
+    :param available: Optional die IDs aller PDFs, die noch auf der Festplatte liegen (siehe available_pdf_ids).
+    :return: Anzahl ersetzter und entfernter PDFs sowie der bei der Kompaktierung entfernten Zeilen.
+    """
+    for pdf_id, (doc_key, paragraphs) in documents.items():
+        store.replace_document(pdf_id, doc_key, paragraphs)
+
+    removed = []
+    if available is not None:
+        removed = sorted(set(store.document_keys()) - set(documents) - set(available))
+        store.remove_documents(removed)
+
+    stats = store.stats()
+    compacted = 0
+    if stats["tombstones"] > COMPACT_THRESHOLD * (stats["rows"] + stats["tombstones"]):
+        compacted = store.compact()
+    return {"indexed": len(documents), "removed": len(removed), "compacted": compacted}
+
+def vectorising_pdfs(store_path: str = EMBEDDING_STORE_PATH) -> Optional[pd.DataFrame]:
+    """
+    Vektorisiert alle PDFs im neuesten Zeitstempel-Ordner inkrementell.
     
-    - Extrahiert Text aus PDFs
-    - Teilt den Text in Absätze auf
-    - Erstellt Embeddings für jeden Absatz
-    - Speichert die Embeddings in einer Pickle-Datei
+    - Bestimmt je PDF den Dokumentschlüssel (siehe document_key); PDFs, die mit demselben Schlüssel bereits
+      im EmbeddingStore liegen, werden übersprungen
+    - Extrahiert die übrigen PDFs parallel in eigenen Prozessen und reicht ihre Seiten einzeln weiter
+      (siehe vectorise_pdf); bereits bekannte PDFs werden seitenweise aus dem Textcache gelesen
+    - Teilt die Seiten in Absätze auf und kodiert diese in längensortierten Batches (mit Seitenangabe),
+      während die folgenden Seiten noch extrahiert werden
+    - Ersetzt die Absätze jedes geänderten PDFs im EmbeddingStore, sobald es fertig ist, markiert die
+      Absätze von PDFs, die in keinem Zeitstempel-Ordner mehr liegen, als gelöscht und kompaktiert den
+      Speicher bei Bedarf (siehe index_documents)
     
-    :return: Ein DataFrame mit Absätzen und ihren Embeddings oder None bei Fehlern.
+    :param store_path: Verzeichnis des EmbeddingStore.
+    :return: Ein DataFrame mit allen gespeicherten Absätzen und ihren Embeddings oder None bei Fehlern.
     """
     pdf_folder = get_latest_pdf_folder()  
     
@@ -70,7 +267,6 @@ def vectorising_pdfs() -> Optional[pd.DataFrame]:
     
     metadata_path = os.path.join("pdf_manipulations", "metadata.json")
     metadata_dict = load_metadata(metadata_path)
-    paragraphs_info = []
 
     if not metadata_dict:
         print(f"Keine Metadaten in {metadata_path} gefunden. Abbruch!")
@@ -81,51 +277,56 @@ def vectorising_pdfs() -> Optional[pd.DataFrame]:
     if not pdf_files:
         print("Keine PDFs im neuesten Ordner gefunden. Abbruch!")
         return
-    
-    output_path = os.path.join("pdf_manipulations", "pdf_paragraphs_embeddings.pkl")
-    
-    if os.path.exists(output_path):
-        os.remove(output_path)
-
-    for pdf_file in pdf_files:
-        pdf_path = os.path.join(pdf_folder, pdf_file)
-        
-        pdf_id = os.path.splitext(pdf_file)[0]  
-        title = metadata_dict.get(pdf_id, {}).get("Title", pdf_id) 
-
-        print(f'Vektorisiere PDF {pdf_id} - {title}...')
-        
-        try:
-            text = extract_cleaned_text(pdf_path)
-        except Exception as e:
-            print(f'Fehler beim Extrahieren von Text aus {pdf_file}: {e}')
-            text = f"Paper '{title}' konnte nicht verarbeitet werden."
-
-        chunks = text_splitter.create_documents([text])
-        chunk_texts = [str(chunk) for chunk in chunks]
-        
-        for j, chunk in enumerate(chunk_texts):
-            encode_chunk = model.encode(chunk, convert_to_tensor=True)
-
-            paragraphs_info.append({
-                "pdf_id_order": f"{pdf_id}_{j}",
-                "pdf_id": pdf_id,
-                "title": title,
-                "paragraph_text": chunk,
-                "embedding": encode_chunk.cpu().numpy()
-            })
-
-    if not paragraphs_info:
+
+    store = EmbeddingStore(store_path)
+    indexed = store.document_keys()
+    pdf_ids = {pdf_file: os.path.splitext(pdf_file)[0] for pdf_file in pdf_files}
+    # Jedes PDF wird nur einmal gehasht; derselbe Schlüssel dient Dokumentschlüssel und Textcache.
+    text_keys = {pdf_ids[pdf_file]: TextCache.make_key(os.path.join(pdf_folder, pdf_file)) for pdf_file in pdf_files}
+    keys = {pdf_id: document_key(os.path.join(pdf_folder, f"{pdf_id}.pdf"), text_key) if text_key else None
+            for pdf_id, text_key in text_keys.items()}
+    changed = [pdf_file for pdf_file in pdf_files
+               if keys[pdf_ids[pdf_file]] is None or indexed.get(pdf_ids[pdf_file]) != keys[pdf_ids[pdf_file]]]
+    print(f"{len(pdf_files) - len(changed)} PDFs unverändert, {len(changed)} neu oder geändert.")
+
+    text_cache = TextCache() if changed else None
+    new_paragraphs = 0
+    with ThreadPoolExecutor(max_workers=max(1, min(VECTORISE_WORKERS, len(changed) or 1))) as executor:
+        futures = {}
+        for pdf_file in changed:
+            pdf_id = pdf_ids[pdf_file]
+            title = metadata_dict.get(pdf_id, {}).get("Title", pdf_id)
+            print(f'Vektorisiere PDF {pdf_id} - {title}...')
+            future = executor.submit(vectorise_pdf, pdf_id, title, os.path.join(pdf_folder, pdf_file), text_cache,
+                                     text_keys[pdf_id])
+            futures[future] = pdf_id
+
+        # Jedes PDF wird übernommen, sobald es fertig ist; es liegen nie die Absätze aller PDFs gleichzeitig vor.
+        for future in as_completed(futures):
+            pdf_id = futures.pop(future)
+            paragraphs, error = future.result()
+            if error:
+                print(f'Fehler beim Extrahieren von Text aus {pdf_id}.pdf: {error}')
+                # Ohne Schlüssel wird das PDF beim nächsten Lauf erneut versucht.
+                keys[pdf_id] = None
+            index_documents(store, {pdf_id: (keys[pdf_id], paragraphs)})
+            new_paragraphs += len(paragraphs)
+    if text_cache is not None:
+        print("Textcache:", text_cache.stats())
+        text_cache.close()
+
+    summary = index_documents(store, {}, available=available_pdf_ids(os.path.dirname(pdf_folder)))
+    print("EmbeddingStore:", {**summary, "indexed": len(changed)}, store.stats())
+
+    stored = store.load()
+    store.close()
+    if not stored["row"]:
         print("Keine Absätze zum Vektorisieren gefunden. Abbruch!")
         return None
-    
-    df_paragraphs = pd.DataFrame(paragraphs_info)
-    os.makedirs(os.path.dirname(output_path), exist_ok=True) 
-    df_paragraphs.to_pickle(output_path)
-    print(f"Embeddings gespeichert unter: {output_path}")
 
-    print(f"{len(paragraphs_info)} Absätze erfolgreich vektorisiert und gespeichert.")
-    return df_paragraphs
+    print(f"{new_paragraphs} Absätze neu vektorisiert, "
+          f"{len(stored['row'])} Absätze gespeichert unter: {store_path}")
+    return pd.DataFrame({**stored, "embedding": list(stored["embedding"])})
 
 # PDFs vektorisieren
 #vectorising_pdfs()
@@ -0,0 +1,142 @@
+import codecs
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, Any, Iterator, Optional, Tuple, Union
+
+from pdf_manipulations.pdfminer import __version__ as PDFMINER_VERSION
+from pdf_manipulations.pdf_to_text import EXTRACTOR_VERSION, LAPARAMS, PAGE_SEPARATOR
+
+TEXT_CACHE_PATH = os.path.join("pdf_manipulations", "text_cache.sqlite3")
+TEXT_CACHE_MAX_BYTES = 500 * 1024 * 1024
+DECOMPRESS_BLOCK_SIZE = 64 * 1024
+
+class TextCache:
+    """Persistenter Cache für extrahierte PDF-Texte in einer SQLite-Datei.
+
+    Schlüssel ist der SHA-256-Hash des PDF-Inhalts zusammen mit EXTRACTOR_VERSION, der pdfminer-Version und
+    den LAParams. Byte-identische PDFs werden so unabhängig von Dateiname und Ordner wiedererkannt; eine
+    Änderung an Extraktion oder Bereinigung macht alte Einträge automatisch ungültig. Die Texte werden mit
+    zlib komprimiert gespeichert. Übersteigt die Gesamtgröße 'max_bytes', werden die am längsten nicht
+    genutzten Einträge (LRU) entfernt.
+
+    Args:
+        path (str): Pfad der SQLite-Datei.
+        max_bytes (int): Maximale Gesamtgröße der komprimierten Texte in Bytes.
+    """
+    def __init__(self, path: str = TEXT_CACHE_PATH, max_bytes: int = TEXT_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self.last_access = 0.0
+        self.lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS texts (
+                key TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                accessed_at REAL NOT NULL,
+                size INTEGER NOT NULL
+            )
+        """)
+        self.connection.commit()
+
+    @staticmethod
+    def make_key(path: Union[str, Path]) -> Optional[str]:
+        """Erzeugt den Schlüssel zu einer PDF-Datei oder None, falls sie nicht gelesen werden kann."""
+        digest = hashlib.sha256()
+        try:
+            with open(path, "rb") as file:
+                for block in iter(lambda: file.read(1024 * 1024), b""):
+                    digest.update(block)
+        except OSError:
+            return None
+        laparams = ",".join(f"{name}={value}" for name, value in sorted(vars(LAPARAMS).items()))
+        return f"{digest.hexdigest()}:{EXTRACTOR_VERSION}:{PDFMINER_VERSION}:{laparams}"
+
+    def lookup(self, key: str) -> Optional[str]:
+        """Liefert den gespeicherten Text zu einem Schlüssel (oder None) und zählt Treffer bzw. Fehlzugriffe."""
+        body = self._lookup_body(key)
+        return zlib.decompress(body).decode("utf-8") if body is not None else None
+
+    def lookup_pages(self, key: str) -> Optional[Iterator[Tuple[int, str]]]:
+        """Wie lookup, liefert den Text aber seitenweise, ohne ihn vollständig zu entpacken (oder None)."""
+        body = self._lookup_body(key)
+        return self._iter_pages(body) if body is not None else None
+
+    def _lookup_body(self, key: str) -> Optional[bytes]:
+        with self.lock:
+            row = self.connection.execute("SELECT body FROM texts WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.connection.execute("UPDATE texts SET accessed_at = ? WHERE key = ?", (self._access_time(), key))
+            self.connection.commit()
+        return row[0]
+
+    @staticmethod
+    def _iter_pages(body: bytes) -> Iterator[Tuple[int, str]]:
+        decompressor = zlib.decompressobj()
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        page_number, rest = 1, ""
+        for offset in range(0, len(body) + 1, DECOMPRESS_BLOCK_SIZE):
+            block = body[offset:offset + DECOMPRESS_BLOCK_SIZE]
+            final = offset + DECOMPRESS_BLOCK_SIZE > len(body)
+            data = decompressor.decompress(block) + (decompressor.flush() if final else b"")
+            *pages, rest = (rest + decoder.decode(data, final=final)).split(PAGE_SEPARATOR)
+            for text in pages:
+                yield page_number, text
+                page_number += 1
+        yield page_number, rest
+
+    def store(self, key: str, text: str) -> None:
+        """Speichert einen Text komprimiert und entfernt bei Bedarf die am längsten nicht genutzten Einträge."""
+        self.store_compressed(key, zlib.compress(text.encode("utf-8"), 6))
+
+    def store_compressed(self, key: str, body: bytes) -> None:
+        """Wie store, für einen bereits mit zlib komprimierten Text (z. B. seitenweise per zlib.compressobj)."""
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO texts (key, body, accessed_at, size) VALUES (?, ?, ?, ?)",
+                                    (key, body, self._access_time(), len(body)))
+            self._evict()
+            self.connection.commit()
+
+    def _access_time(self) -> float:
+        # Streng monoton steigend, damit die LRU-Reihenfolge auch bei grober Uhrauflösung eindeutig ist.
+        self.last_access = max(time.time(), self.last_access + 1e-6)
+        return self.last_access
+
+    def _evict(self) -> None:
+        total = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM texts").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self.connection.execute("SELECT key, size FROM texts ORDER BY accessed_at ASC").fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self.connection.execute("DELETE FROM texts WHERE key = ?", (key,))
+            self.evicted += 1
+            total -= size
+
+    def stats(self) -> Dict[str, Any]:
+        """Liefert Treffer, Fehlzugriffe, Trefferquote und Verdrängungen seit dem Öffnen sowie Umfang des Caches."""
+        with self.lock:
+            entries, size = self.connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM texts").fetchone()
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses,
+                    "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                    "evicted": self.evicted, "entries": entries, "bytes": size}
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,114 @@
+from typing import List, Dict, Any, Callable, Iterable, Optional, Tuple
+from queue import Queue
+import threading
+import time
+
+QUEUE_SIZE = 8
+
+_DONE = object()
+
+class Stage:
+    """
+    Eine Stufe der Verarbeitungskette mit eigenem Worker-Pool.
+
+    :param name: Name der Stufe (für Statistik und Ausgaben).
+    :param func: Funktion, die ein Element verarbeitet und das (ggf. veränderte) Element zurückgibt.
+    :param workers: Anzahl paralleler Worker-Threads dieser Stufe.
+    """
+    def __init__(self, name: str, func: Callable[[Any], Any], workers: int = 1):
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+
+def run_pipeline(items: Iterable[Any],
+                 stages: List[Stage],
+                 queue_size: int = QUEUE_SIZE,
+                 stats: Optional[Dict[str, Any]] = None) -> List[Any]:
+    """
+    Führt Elemente durch eine Kette von Stufen, die über begrenzte Warteschlangen verbunden sind.
+
+    Jede Stufe arbeitet mit ihrem eigenen Worker-Pool, sobald das erste Element bei ihr ankommt; Netzwerk-,
+    CPU- und LLM-Stufen überlappen sich daher, und die Gesamtlaufzeit nähert sich der langsamsten Stufe statt
+    der Summe aller Stufen. Die begrenzten Warteschlangen bremsen schnelle Stufen, sodass nie mehr als
+    'queue_size' Elemente zwischen zwei Stufen im Speicher liegen.
+
+    Löst eine Stufe für ein Element eine Ausnahme aus, wird diese ausgegeben und das Element unverändert an
+    die nächste Stufe weitergereicht. 'items' wird erst beim Einspeisen konsumiert (z. B. ein Generator);
+    eine Ausnahme des Iterators wird nach Abschluss der bereits eingespeisten Elemente erneut ausgelöst.
+
+    :param items: Die zu verarbeitenden Elemente.
+    :param stages: Die Stufen in Verarbeitungsreihenfolge.
+    :param queue_size: Maximale Anzahl wartender Elemente zwischen zwei Stufen.
+    :param stats: Optionales Dictionary, das mit Laufzeit sowie Anzahl und Arbeitszeit je Stufe befüllt wird.
+    :return: Die Ergebnisse der letzten Stufe in der Reihenfolge der Eingabe.
+    """
+    queues: List[Queue] = [Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+    busy = {stage.name: {"items": 0, "seconds": 0.0, "errors": 0} for stage in stages}
+    lock = threading.Lock()
+    started = time.time()
+    failures: List[BaseException] = []
+
+    def feed() -> None:
+        try:
+            for index, item in enumerate(items):
+                queues[0].put((index, item))
+        except BaseException as e:
+            failures.append(e)
+        finally:
+            for _ in range(stages[0].workers):
+                queues[0].put(_DONE)
+
+    def work(position: int, stage: Stage, remaining: List[int]) -> None:
+        inbox, outbox = queues[position], queues[position + 1]
+        while True:
+            entry = inbox.get()
+            if entry is _DONE:
+                break
+            index, item = entry
+            begin = time.time()
+            try:
+                item = stage.func(item)
+                failed = False
+            except Exception as e:
+                print(f"Fehler in Stufe '{stage.name}': {e}")
+                failed = True
+            with lock:
+                busy[stage.name]["items"] += 1
+                busy[stage.name]["seconds"] += time.time() - begin
+                busy[stage.name]["errors"] += failed
+            outbox.put((index, item))
+
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            following = stages[position + 1].workers if position + 1 < len(stages) else 1
+            for _ in range(following):
+                outbox.put(_DONE)
+
+    threads = [threading.Thread(target=feed, daemon=True)]
+    for position, stage in enumerate(stages):
+        remaining = [stage.workers]
+        threads.extend(threading.Thread(target=work, args=(position, stage, remaining), daemon=True)
+                       for _ in range(stage.workers))
+    for thread in threads:
+        thread.start()
+
+    results: List[Tuple[int, Any]] = []
+    while True:
+        entry = queues[-1].get()
+        if entry is _DONE:
+            break
+        results.append(entry)
+    for thread in threads:
+        thread.join()
+    if failures:
+        raise failures[0]
+
+    if stats is not None:
+        stats.update({
+            "seconds": round(time.time() - started, 3),
+            "stages": {name: {**values, "seconds": round(values["seconds"], 3)} for name, values in busy.items()}
+        })
+
+    return [item for _, item in sorted(results, key=lambda entry: entry[0])]
@@ -0,0 +1,405 @@
+from typing import List, Dict, Any, Union, Optional, Callable, Tuple, FrozenSet
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import hashlib
+import re
+
+MAX_SUBQUERIES = 16
+
+@dataclass(frozen=True)
+class Term:
+    text: str
+
+@dataclass(frozen=True)
+class Not:
+    child: "Node"
+
+@dataclass(frozen=True)
+class And:
+    children: Tuple["Node", ...]
+
+@dataclass(frozen=True)
+class Or:
+    children: Tuple["Node", ...]
+
+Node = Union[Term, Not, And, Or]
+
+_TOKEN_PATTERN = re.compile(r'\s*(?:(")((?:[^"\\]|\\.)*)"|(\()|(\))|(\|)|(\+)|(-)(?=\S)|([^\s()"|+]+))')
+
+def _tokenize(query: str) -> List[Tuple[str, str]]:
+    tokens = []
+    position = 0
+    query = query.strip()
+    while position < len(query):
+        match = _TOKEN_PATTERN.match(query, position)
+        if not match or match.end() == position:
+            raise ValueError(f"Ungültiges Zeichen in der Suchanfrage an Position {position}: {query[position:]!r}")
+        position = match.end()
+        quote, phrase, lpar, rpar, pipe, plus, minus, word = match.groups()
+        if quote:
+            tokens.append(("TERM", phrase.replace('\\"', '"')))
+        elif lpar:
+            tokens.append(("(", lpar))
+        elif rpar:
+            tokens.append((")", rpar))
+        elif pipe:
+            tokens.append(("OR", pipe))
+        elif plus:
+            tokens.append(("AND", plus))
+        elif minus:
+            tokens.append(("NOT", minus))
+        elif word in ("AND", "OR", "NOT"):
+            tokens.append((word, word))
+        else:
+            tokens.append(("TERM", word))
+    return tokens
+
+class _Parser:
+    """
+    Rekursiver Abstiegsparser mit den Prioritäten NOT > AND > OR.
+    Benachbarte Operanden ohne Operator werden als AND verknüpft; "a NOT b" bedeutet "a AND NOT b".
+    """
+    def __init__(self, tokens: List[Tuple[str, str]]):
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self) -> Optional[str]:
+        return self.tokens[self.position][0] if self.position < len(self.tokens) else None
+
+    def take(self, kind: str) -> str:
+        if self.peek() != kind:
+            raise ValueError(f"Erwartet '{kind}' an Position {self.position}, gefunden '{self.peek()}'.")
+        value = self.tokens[self.position][1]
+        self.position += 1
+        return value
+
+    def parse(self) -> "Node":
+        node = self.parse_or()
+        if self.peek() is not None:
+            raise ValueError(f"Unerwartetes Token '{self.peek()}' an Position {self.position}.")
+        return node
+
+    def parse_or(self) -> "Node":
+        children = [self.parse_and()]
+        while self.peek() == "OR":
+            self.take("OR")
+            children.append(self.parse_and())
+        return children[0] if len(children) == 1 else Or(tuple(children))
+
+    def parse_and(self) -> "Node":
+        children = [self.parse_not()]
+        while self.peek() in ("AND", "NOT", "TERM", "("):
+            if self.peek() == "AND":
+                self.take("AND")
+            children.append(self.parse_not())
+        return children[0] if len(children) == 1 else And(tuple(children))
+
+    def parse_not(self) -> "Node":
+        if self.peek() == "NOT":
+            self.take("NOT")
+            return Not(self.parse_not())
+        if self.peek() == "(":
+            self.take("(")
+            node = self.parse_or()
+            self.take(")")
+            return node
+        return Term(self.take("TERM"))
+
+def parse_query(query: str) -> Node:
+    """
+    Parst eine Suchanfrage in einen Syntaxbaum (AST).
+
+    Unterstützt werden Phrasen in Anführungszeichen, Klammern sowie die Operatoren AND/OR/NOT
+    und ihre Kurzformen aus der Bulk-Syntax ('+', '|', '-'). Es gilt NOT vor AND vor OR.
+
+    :param query: Die Suchanfrage, z. B. '("llm") AND ("education" OR "school") NOT ("survey")'.
+    :return: Der Wurzelknoten des Syntaxbaums.
+    """
+    tokens = _tokenize(query)
+    if not tokens:
+        raise ValueError("Leere Suchanfrage.")
+    return _Parser(tokens).parse()
+
+def from_terms(required_terms: Union[List[str], str],
+               or_terms: Optional[List[str]] = None,
+               not_terms: Optional[List[str]] = None) -> Node:
+    """
+    Erzeugt den Syntaxbaum zu den Suchparametern von main.main mit eindeutiger Semantik:
+    alle Pflichtbegriffe UND mindestens ein alternativer Begriff UND keiner der ausgeschlossenen Begriffe.
+    """
+    required = required_terms if isinstance(required_terms, list) else [required_terms]
+    children: List[Node] = [Term(term) for term in required if term]
+    if or_terms:
+        children.append(Or(tuple(Term(term) for term in or_terms)))
+    children.extend(Not(Term(term)) for term in not_terms or [])
+    if not children:
+        raise ValueError("Leere Suchanfrage.")
+    return normalize_query(children[0] if len(children) == 1 else And(tuple(children)))
+
+def _sort_key(node: Node) -> Tuple[int, str]:
+    return (2 if isinstance(node, Not) else 0 if isinstance(node, Term) else 1, compile_query(node))
+
+def normalize_query(node: Node) -> Node:
+    """
+    Bringt einen Syntaxbaum in eine kanonische Form, sodass äquivalente Anfragen identisch sind:
+    Begriffe werden in Kleinbuchstaben mit einfachen Leerzeichen geschrieben, doppelte Negationen
+    entfernt, verschachtelte AND/OR-Knoten abgeflacht, Duplikate entfernt und Operanden sortiert.
+    """
+    if isinstance(node, Term):
+        return Term(" ".join(node.text.lower().split()))
+    if isinstance(node, Not):
+        child = normalize_query(node.child)
+        return child.child if isinstance(child, Not) else Not(child)
+
+    children = []
+    for child in (normalize_query(child) for child in node.children):
+        children.extend(child.children if type(child) is type(node) else [child])
+    unique = sorted(set(children), key=_sort_key)
+    return unique[0] if len(unique) == 1 else type(node)(tuple(unique))
+
+def compile_query(node: Node, dialect: str = "search") -> str:
+    """
+    Übersetzt einen Syntaxbaum in einen Query-String.
+
+    :param dialect: "search" für die Schreibweise von build_query ('("a") AND ("b")') oder
+                    "bulk" für die Syntax des Bulk-Endpunkts ('"a" + "b"').
+    """
+    def wrap(child: Node) -> str:
+        text = compile_query(child, dialect)
+        return f"({text})" if isinstance(child, (And, Or)) else text
+
+    if isinstance(node, Term):
+        return f'("{node.text}")' if dialect == "search" else f'"{node.text}"'
+    if isinstance(node, Not):
+        return f"NOT {wrap(node.child)}" if dialect == "search" else f"-{wrap(node.child)}"
+    if isinstance(node, And):
+        return (" AND " if dialect == "search" else " + ").join(wrap(child) for child in node.children)
+    return (" OR " if dialect == "search" else " | ").join(wrap(child) for child in node.children)
+
+def query_hash(node: Node) -> str:
+    """
+    Liefert einen stabilen Hash der kanonischen Form, der für äquivalente Anfragen übereinstimmt.
+    """
+    return hashlib.sha256(compile_query(normalize_query(node)).encode("utf-8")).hexdigest()[:16]
+
+def to_dnf(node: Node) -> List[Tuple[FrozenSet[Node], FrozenSet[Node]]]:
+    """
+    Zerlegt einen Syntaxbaum in eine disjunktive Normalform.
+
+    :return: Liste von Konjunktionen als Paar (positive Operanden, negierte Operanden).
+    """
+    if isinstance(node, Not):
+        return [(frozenset(), frozenset([node.child]))]
+    if isinstance(node, Or):
+        return [conjunction for child in node.children for conjunction in to_dnf(child)]
+    if isinstance(node, And):
+        conjunctions = [(frozenset(), frozenset())]
+        for child in node.children:
+            conjunctions = [(positive | child_positive, negative | child_negative)
+                            for positive, negative in conjunctions
+                            for child_positive, child_negative in to_dnf(child)]
+            if len(conjunctions) > MAX_SUBQUERIES:
+                raise ValueError(f"Die Anfrage ergibt mehr als {MAX_SUBQUERIES} Teilanfragen.")
+        return conjunctions
+    return [(frozenset([node]), frozenset())]
+
+def union(*results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Vereinigung mehrerer Ergebnislisten anhand der paperId (Reihenfolge des ersten Auftretens).
+    """
+    seen = set()
+    merged = []
+    for papers in results:
+        for paper in papers:
+            if paper.get("paperId") not in seen:
+                seen.add(paper.get("paperId"))
+                merged.append(paper)
+    return merged
+
+def intersection(first: List[Dict[str, Any]], *others: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Schnittmenge mehrerer Ergebnislisten anhand der paperId (Reihenfolge der ersten Liste).
+    """
+    common = [{paper.get("paperId") for paper in papers} for papers in others]
+    return [paper for paper in union(first) if all(paper.get("paperId") in ids for ids in common)]
+
+def difference(first: List[Dict[str, Any]], *others: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Differenz: Publikationen aus 'first', deren paperId in keiner der weiteren Listen vorkommt.
+    """
+    excluded = {paper.get("paperId") for papers in others for paper in papers}
+    return [paper for paper in union(first) if paper.get("paperId") not in excluded]
+
+def _search_signature(search: Callable[..., List[Dict[str, Any]]]) -> Tuple[Any, ...]:
+    """
+    Beschreibt die an eine Suchfunktion gebundenen Parameter (Filter, Limit, Feldprofil, ...), damit
+    Teilergebnisse nur zwischen Suchen mit identischen Parametern wiederverwendet werden.
+    """
+    function = getattr(search, "func", search)
+    keywords = getattr(search, "keywords", None) or {}
+    bound = tuple(sorted((name, repr(value)) for name, value in keywords.items() if name not in ("cache", "stats")))
+    return (getattr(function, "__qualname__", repr(function)), repr(getattr(search, "args", ())), bound)
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+def _stem(word: str) -> str:
+    """
+    Reduziert englische Pluralformen auf den Singular (Regeln des EnglishMinimalStemmer von Lucene),
+    z. B. "models" -> "model", "studies" -> "study"; "class" und "corpus" bleiben unverändert.
+    """
+    if len(word) < 3 or word[-1] != "s" or word[-2] in "us":
+        return word
+    if word[-2] == "e":
+        if len(word) > 3 and word[-3] == "i" and word[-4] not in "ae":
+            return word[:-3] + "y"
+        if word[-3] in "iaoe":
+            return word
+    return word[:-1]
+
+def _normalize_text(text: str) -> str:
+    return " ".join(_stem(word) for word in _WORD_PATTERN.findall(text.lower()))
+
+def _paper_text(paper: Dict[str, Any]) -> str:
+    tldr = paper.get("tldr")
+    parts = [paper.get("title"), paper.get("abstract"), tldr.get("text") if isinstance(tldr, dict) else tldr]
+    return _normalize_text(" ".join(part for part in parts if isinstance(part, str)))
+
+def _evaluate(node: Node, text: str) -> bool:
+    if isinstance(node, Term):
+        phrase = _normalize_text(node.text)
+        return bool(phrase) and re.search(rf"(?<!\S){re.escape(phrase)}(?!\S)", text) is not None
+    if isinstance(node, Not):
+        return not _evaluate(node.child, text)
+    if isinstance(node, And):
+        return all(_evaluate(child, text) for child in node.children)
+    return any(_evaluate(child, text) for child in node.children)
+
+def matches(node: Node, paper: Dict[str, Any]) -> Optional[bool]:
+    """
+    Wertet einen Syntaxbaum lokal auf Titel, Abstract und TLDR einer Publikation aus.
+    Begriffe werden ohne Beachtung der Groß-/Kleinschreibung und Satzzeichen als ganze Wörter bzw. Phrasen
+    gesucht. Wie bei der Suche von Semantic Scholar werden Pluralformen auf beiden Seiten auf den Singular
+    zurückgeführt ("model" trifft auch "models"). Weitergehende Beugungen (z. B. "-ing", "-ed") werden nicht
+    reduziert; lokal und serverseitig ausgewertete Begriffe können sich daher in Einzelfällen unterscheiden.
+
+    :return: True/False oder None, falls keines der Textfelder vorliegt (z. B. im Feldprofil 'triage').
+    """
+    text = _paper_text(paper)
+    return _evaluate(node, text) if text else None
+
+def execute_query(node: Node,
+                  search: Callable[..., List[Dict[str, Any]]],
+                  max_workers: int = 4,
+                  split_conjunctions: bool = False,
+                  limit: Optional[int] = None,
+                  memo: Optional[Dict[Tuple[str, Tuple[Any, ...]], Tuple[List[Dict[str, Any]], bool]]] = None,
+                  stats: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    Führt eine boolesche Anfrage über Teilanfragen aus und kombiniert die Ergebnisse lokal.
+
+    Die normalisierte Anfrage wird in eine disjunktive Normalform zerlegt. Jede Konjunktion wird als
+    eine Teilanfrage aus ihren positiven Operanden gesendet (bzw. je Operand einzeln, falls
+    'split_conjunctions' gesetzt ist) und alle Konjunktionen werden vereinigt. Negierte Operanden und
+    einzeln angefragte Konjunktionen werden als lokales Prädikat auf Titel, Abstract und TLDR der
+    positiven Treffer ausgewertet (siehe matches), da die Ergebnislisten der Suche auf 'limit' gekürzt
+    sind und eine Mengendifferenz bzw. ein Schnitt darauf Treffer falsch behalten oder verwerfen würde.
+    Nur für Publikationen ohne Textfelder wird auf Mengenoperationen zurückgegriffen: negierte Operanden
+    werden dann nachträglich angefragt und nur abgezogen, wenn ihr Ergebnis vollständig ist
+    (stats['complete'] der Suchfunktion). Identische Teilanfragen werden nur einmal und parallel ausgeführt.
+
+    :param node: Syntaxbaum der Anfrage.
+    :param search: Suchfunktion, die mit einem Query-String und dem Schlüsselwort 'stats' aufgerufen
+                   wird, z. B. functools.partial(research.search_semantic_scholar, limit=50).
+    :param max_workers: Anzahl parallel ausgeführter Teilanfragen.
+    :param split_conjunctions: Falls True, wird jeder positive Operand einzeln angefragt und die Konjunktion
+                               lokal geprüft.
+    :param limit: Optionale Obergrenze für die Anzahl kombinierter Ergebnisse.
+    :param memo: Optionales Dictionary ((kanonischer Query-String, gebundene Suchparameter) -> (Ergebnisse,
+                 vollständig)), über das Teilergebnisse zwischen mehreren Ausführungen mit denselben Filtern,
+                 demselben Limit und demselben Feldprofil wiederverwendet werden.
+    :param stats: Optionales Dictionary, das mit Anzahl, Wiederverwendung und Statistiken der Teilanfragen
+                  sowie der Anzahl lokal verworfener ('filtered_locally') und nicht entscheidbarer
+                  ('undecided') Publikationen befüllt wird.
+    :return: Die kombinierten Publikationen.
+    """
+    node = normalize_query(node)
+    memo = memo if memo is not None else {}
+
+    def as_query(operands: List[Node]) -> str:
+        operand = normalize_query(operands[0] if len(operands) == 1 else And(tuple(operands)))
+        return compile_query(operand)
+
+    plans = []
+    for positive, negative in to_dnf(node):
+        if not positive:
+            print("Konjunktion ohne positive Begriffe wird übersprungen:", [compile_query(n) for n in negative])
+            continue
+        positive = sorted(positive, key=_sort_key)
+        negative = sorted(negative, key=_sort_key)
+        split = split_conjunctions and len(positive) > 1
+        positive_queries = [as_query([operand]) for operand in positive] if split else [as_query(positive)]
+        local = (positive if split else []) + [Not(operand) for operand in negative]
+        predicate = normalize_query(And(tuple(local))) if local else None
+        plans.append((positive_queries, [as_query([operand]) for operand in negative], predicate))
+
+    signature = _search_signature(search)
+    queries: List[str] = []
+    per_query: Dict[str, Dict[str, Any]] = {}
+
+    def run(batch: List[str]) -> None:
+        batch = [query for query in dict.fromkeys(batch) if query not in queries]
+        queries.extend(batch)
+        pending = [query for query in batch if (query, signature) not in memo]
+        per_query.update({query: {} for query in pending})
+        print(f"Führe {len(pending)} Teilanfragen aus ({len(batch) - len(pending)} wiederverwendet)...")
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            futures = {query: executor.submit(search, query, stats=per_query[query]) for query in pending}
+            for query, future in futures.items():
+                memo[(query, signature)] = (future.result(), bool(per_query[query].get("complete", False)))
+
+    run([query for plan in plans for query in plan[0]])
+
+    # Publikationen ohne Textfelder können nicht lokal geprüft werden; nur für sie werden negierte
+    # Operanden angefragt und per Mengenoperation behandelt.
+    verdicts = []
+    for positive_queries, negative_queries, predicate in plans:
+        candidates = union(*[memo[(query, signature)][0] for query in positive_queries])
+        verdicts.append([(paper, matches(predicate, paper) if predicate else True) for paper in candidates])
+    run([query for plan, checked in zip(plans, verdicts) if any(verdict is None for _, verdict in checked)
+         for query in plan[1]])
+
+    results, filtered, undecided = [], 0, 0
+    for (positive_queries, negative_queries, _), checked in zip(plans, verdicts):
+        for paper, verdict in checked:
+            if verdict is None:
+                paper_id = paper.get("paperId")
+                in_all = all(paper_id in {p.get("paperId") for p in memo[(query, signature)][0]}
+                             for query in positive_queries)
+                negative_sets = [memo[(query, signature)] for query in negative_queries]
+                excluded = any(paper_id in {p.get("paperId") for p in papers} for papers, _ in negative_sets)
+                if in_all and not excluded and not all(complete for _, complete in negative_sets):
+                    undecided += 1
+                verdict = in_all and not excluded
+            if verdict:
+                results.append(paper)
+            else:
+                filtered += 1
+    results = union(results)
+    if undecided:
+        print(f"{undecided} Ausschlüsse konnten mangels Textfeldern und vollständiger Ergebnislisten nicht geprüft werden.")
+
+    if stats is not None:
+        executed = [query for query in queries if query in per_query]
+        stats.update({
+            "query_hash": query_hash(node),
+            "subqueries": len(queries),
+            "executed": len(executed),
+            "reused": len(queries) - len(executed),
+            "filtered_locally": filtered,
+            "undecided": undecided,
+            "calls": sum(substats.get("calls", 0) for substats in per_query.values()),
+            "bytes": sum(substats.get("bytes", 0) for substats in per_query.values()),
+            "per_query": per_query
+        })
+
+    return results[:limit] if limit is not None else results
@@ -1,12 +1,16 @@
 from hnswlib import Index
-from typing import List, Tuple
+from typing import List, Tuple, Optional, Any, Dict, Sequence
 from sentence_transformers import SentenceTransformer
-import pickle
 import hnswlib
-import torch
+import json
+from collections import Counter
+import os
+import threading
+import numpy as np
 import warnings
 from urllib3.exceptions import InsecureRequestWarning
 from pathlib import Path
+from pdf_manipulations.embedding_store import EmbeddingStore
 
 
 warnings.filterwarnings("ignore", category=InsecureRequestWarning)
@@ -15,7 +19,173 @@ warnings.filterwarnings("ignore", category=UserWarning)
 
 model = SentenceTransformer('multi-qa-MiniLM-L6-cos-v1')
 
-def search_within_pdfs(query: str, selected_pdfs: List[str], k: int = 10) -> List[Tuple[str, float, str]]:
+EMBEDDING_STORE_DIR = Path(__file__).parent / "../pdf_manipulations/embedding_store"
+INDEX_FILE = "hnsw_index.bin"
+INDEX_STATE_FILE = "hnsw_index.json"
+INDEX_M = 16
+INDEX_EF_CONSTRUCTION = 200
+INDEX_EF_SEARCH = 50
+# Bis zu dieser Anzahl Absätze je PDF ist die exakte Suche schneller als der gefilterte HNSW-Index.
+# Die Kosten der gefilterten Suche hängen vom Anteil des PDFs am gesamten Speicher ab, nicht von seiner
+# Größe: laut benchmarks.benchmark_search (Dimension 384, k = 10) braucht die exakte Suche bei 1.000 / 2.000 /
+# 3.000 Absätzen 0,6 / 1,2 / 2,3 ms, der globale Index bei 10.000 Zeilen im Speicher 1,2 / 0,8 / 0,7 ms und bei
+# 50.000 Zeilen 12,0 / 6,4 / 3,6 ms. Der Schnittpunkt wächst also mit dem Speicher; eine kleinere Schwelle
+# würde typische Paper (einige hundert Absätze) verlangsamen. Der Index lohnt sich erst für sehr große Dokumente.
+EXACT_SEARCH_THRESHOLD = 2000
+
+def _as_matrix(embeddings: Any) -> np.ndarray:
+    """Wandelt Embeddings (Matrix, Liste oder Series einzelner Vektoren) in eine float32-Matrix um."""
+    if isinstance(embeddings, np.ndarray) and embeddings.dtype != object:
+        return np.asarray(embeddings, dtype=np.float32)
+    return np.asarray(np.stack(list(embeddings)), dtype=np.float32)
+
+def exact_top_k(embeddings: np.ndarray, query_embedding: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Bestimmt die k ähnlichsten Zeilen exakt per Matrix-Vektor-Produkt und argpartition.
+
+    Args:
+        embeddings (np.ndarray): Die Embeddings (z. B. der zusammenhängende Ausschnitt eines PDFs).
+        query_embedding (np.ndarray): Das Embedding der Suchanfrage.
+        k (int): Anzahl der Treffer.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Positionen in 'embeddings' und Cosinus-Distanzen der Treffer,
+        absteigend nach Ähnlichkeit sortiert.
+    """
+    query = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+    query = query / (np.linalg.norm(query) or 1.0)
+    norms = np.linalg.norm(embeddings, axis=1)
+    norms[norms == 0] = 1.0
+    scores = (embeddings @ query) / norms
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top], kind="stable")]
+    return top, 1 - scores[top]
+
+def _rows_of(positions: np.ndarray, embeddings: np.ndarray) -> np.ndarray:
+    """Liefert die Embeddings an den Positionen; zusammenhängende Positionen als Sicht ohne Kopie."""
+    if len(positions) and positions[-1] - positions[0] + 1 == len(positions):
+        return embeddings[positions[0]:positions[-1] + 1]
+    return embeddings[positions]
+
+class PersistentIndex:
+    """Globaler HNSW-Index über alle Zeilen eines EmbeddingStore.
+
+    Die Labels des Index sind die Zeilennummern des Speichers. Der Index wird beim ersten Zugriff von der
+    Platte geladen (oder aufgebaut), danach im Speicher gehalten und nur um neu angehängte Zeilen ergänzt
+    und wieder mit save_index gesichert. Hat sich die Nummerierung des Speichers geändert (siehe
+    EmbeddingStore.generation), wird er neu aufgebaut. Als gelöscht markierte Zeilen bleiben bis zur nächsten
+    Kompaktierung im Index, werden bei der Suche aber wie alle nicht ausgewählten Zeilen herausgefiltert.
+
+    Args:
+        store_dir (str): Verzeichnis des EmbeddingStore, in dem auch der Index gespeichert wird.
+    """
+    def __init__(self, store_dir: str):
+        self.index_path = os.path.join(store_dir, INDEX_FILE)
+        self.state_path = os.path.join(store_dir, INDEX_STATE_FILE)
+        self.index: Optional[Index] = None
+        self.generation: Optional[int] = None
+        self.lock = threading.Lock()
+
+    def _load(self, dimension: int) -> None:
+        if not (os.path.exists(self.index_path) and os.path.exists(self.state_path)):
+            return
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as file:
+                state = json.load(file)
+            if state.get("dimension") != dimension:
+                return
+            index = hnswlib.Index(space='cosine', dim=dimension)
+            index.load_index(self.index_path)
+        except (OSError, ValueError, RuntimeError) as e:
+            print(f"HNSW-Index konnte nicht geladen werden und wird neu aufgebaut: {e}")
+            return
+        self.index, self.generation = index, state.get("generation")
+
+    def _save(self) -> None:
+        self.index.save_index(self.index_path)
+        with open(self.state_path, "w", encoding="utf-8") as file:
+            json.dump({"generation": self.generation, "dimension": self.index.dim}, file)
+
+    def sync(self, store: EmbeddingStore) -> None:
+        """Bringt den Index auf den Stand des Speichers (lädt ihn beim ersten Aufruf von der Platte)."""
+        with self.lock:
+            # Ein einziger Lesezugriff: Matrix, Zeilenzahl, Dimension und Generation stammen aus demselben Stand.
+            matrix = store.embeddings()
+            if not store.rows:
+                return
+            if self.index is None:
+                self._load(store.dimension)
+            if self.index is not None and (self.generation != store.generation or self.index.dim != store.dimension
+                                           or self.index.get_current_count() > store.rows):
+                self.index = None
+            if self.index is None:
+                self.index = hnswlib.Index(space='cosine', dim=store.dimension)
+                self.index.init_index(max_elements=store.rows, ef_construction=INDEX_EF_CONSTRUCTION, M=INDEX_M)
+                self.generation = store.generation
+
+            count = self.index.get_current_count()
+            if count < store.rows:
+                if store.rows > self.index.get_max_elements():
+                    self.index.resize_index(max(store.rows, 2 * self.index.get_max_elements()))
+                self.index.add_items(np.asarray(matrix[count:store.rows], dtype=np.float32),
+                                     np.arange(count, store.rows))
+                self._save()
+
+    def query(self, query_embedding: np.ndarray, rows: Sequence[int], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Sucht die k nächsten Nachbarn unter den angegebenen Zeilen (ein einziger kNN-Aufruf mit Filter).
+
+        Args:
+            query_embedding (np.ndarray): Das Embedding der Suchanfrage (Form (1, Dimension)).
+            rows (Sequence[int]): Die zulässigen Zeilennummern, z. B. die Zeilen eines PDFs.
+            k (int): Anzahl der Treffer.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Zeilennummern und Cosinus-Distanzen der Treffer.
+        """
+        allowed = set(rows)
+        k = min(k, len(allowed))
+        with self.lock:
+            self.index.set_ef(max(INDEX_EF_SEARCH, k))
+            try:
+                labels, distances = self.index.knn_query(query_embedding, k=k, filter=allowed.__contains__)
+                return labels[0], distances[0]
+            except RuntimeError:
+                # Findet die gefilterte Suche nicht genug Treffer, werden alle zulässigen Kandidaten betrachtet.
+                self.index.set_ef(max(self.index.get_current_count(), k))
+                labels, distances = self.index.knn_query(query_embedding, k=k, filter=allowed.__contains__)
+                return labels[0], distances[0]
+
+_indexes: Dict[str, PersistentIndex] = {}
+_indexes_lock = threading.Lock()
+_stores: Dict[str, EmbeddingStore] = {}
+_stores_lock = threading.Lock()
+
+def get_store(store_dir: str) -> EmbeddingStore:
+    """Liefert den im Prozess geöffneten EmbeddingStore zu einem Verzeichnis (wird beim ersten Aufruf geöffnet).
+
+    Jeder Lesezugriff des Speichers liest den festgeschriebenen Stand neu ein, sodass die Verbindung über
+    mehrere Anfragen und neu indexierte PDFs hinweg offen bleiben kann.
+    """
+    key = os.path.abspath(store_dir)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = EmbeddingStore(key)
+        return _stores[key]
+
+def get_index(store_dir: str) -> PersistentIndex:
+    """Liefert den im Prozess gehaltenen HNSW-Index zu einem EmbeddingStore (wird beim ersten Aufruf angelegt)."""
+    key = os.path.abspath(store_dir)
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = PersistentIndex(key)
+        return _indexes[key]
+
+def search_within_pdfs(query: str, selected_pdfs: List[str], k: int = 10,
+                       stored_data: Optional[Any] = None) -> List[Tuple[str, float, str]]:
     """
     Durchsucht ausgewählte PDF-Dokumente nach Absätzen, die semantisch zur Suchanfrage passen.
 
@@ -23,57 +193,71 @@ def search_within_pdfs(query: str, selected_pdfs: List[str], k: int = 10) -> Lis
         query (str): Die Suchanfrage als Text.
         selected_pdfs (List[str]): Liste der zu durchsuchenden PDF-Dateien anhand ihrer IDs.
         k (int, optional): Anzahl der zurückzugebenden relevantesten Absätze. Standard ist 10.
+        stored_data (Optional[Any]): Bereits geladene Absätze (DataFrame oder Dictionary mit den Spalten
+            'pdf_id', 'embedding' und 'paragraph_text'). Standardmäßig werden die Absätze der ausgewählten
+            PDFs aus dem EmbeddingStore gelesen.
+
+    Der EmbeddingStore wird je Prozess nur einmal geöffnet (siehe get_store).
+    PDFs mit höchstens EXACT_SEARCH_THRESHOLD Absätzen werden exakt durchsucht (siehe exact_top_k). Größere
+    PDFs werden im globalen, dauerhaft gespeicherten HNSW-Index gesucht (siehe PersistentIndex), je PDF mit
+    einem einzigen gefilterten kNN-Aufruf; für übergebene Absätze wird dafür ein temporärer Index aufgebaut.
 
     Returns:
         List[Tuple[str, float, str]]: Eine Liste von Tupeln, die den gefundenen Absatztext,
         den Ähnlichkeitswert (zwischen 0 und 1) und die zugehörige PDF-ID enthalten.
     """
 
-    embedding_path = Path(__file__).parent / "../pdf_manipulations/pdf_paragraphs_embeddings.pkl"
-    
-    if not embedding_path.exists():
-        print("Die Embeddings-Datei wurde nicht gefunden! Stelle sicher, dass du die PDFs vektorisiert hast.")
-        return []
-    
-    with open(embedding_path, "rb") as fIn:
-        stored_data = pickle.load(fIn)
+    query_embedding = model.encode([query])
+
+    index = None
+    if stored_data is None:
+        if not (EMBEDDING_STORE_DIR / "metadata.sqlite3").exists():
+            print("Der Embedding-Speicher wurde nicht gefunden! Stelle sicher, dass du die PDFs vektorisiert hast.")
+            return []
 
-    available_pdfs = set(stored_data["pdf_id"])
+        store = get_store(str(EMBEDDING_STORE_DIR))
+        stored_data = store.load(selected_pdfs)
+        # Der globale Index wird nur geladen, wenn ein PDF die Schwelle für die exakte Suche überschreitet.
+        counts = Counter(stored_data["pdf_id"])
+        if any(counts[pdf_id] > EXACT_SEARCH_THRESHOLD for pdf_id in selected_pdfs):
+            index = get_index(str(EMBEDDING_STORE_DIR))
+            index.sync(store)
 
-    if selected_pdfs[0] not in available_pdfs:
+    stored_ids = np.asarray(stored_data["pdf_id"])
+    stored_embeddings = _as_matrix(stored_data["embedding"]) if len(stored_ids) else None
+    stored_texts = list(stored_data["paragraph_text"])
+    stored_rows = list(stored_data["row"]) if "row" in stored_data else None
+
+    if selected_pdfs[0] not in set(stored_data["pdf_id"]):
         print(f"Das ausgewählte PDF '{selected_pdfs[0]}' wurde nicht gefunden! Keine Embeddings erstellt.")
         return []
 
     returning_list = []
-    for i in range(len(selected_pdfs)):
-        next = selected_pdfs[i]
-        selected_ids = [next]
-        filtered_pdf_id_order = [uniq for id_, uniq in zip(stored_data["pdf_id"], stored_data["embedding"]) if id_ in selected_ids]
-        filtered_pdf_ids = [id_ for id_ in stored_data["pdf_id"] if id_ in selected_ids]
-        filtered_pdf_paragraph_embeddings = [embed for id_, embed in zip(stored_data["pdf_id"], stored_data["embedding"]) if id_ in selected_ids]
-        filtered_pdf_paragraph_text = [text for id_, text in zip(stored_data["pdf_id"], stored_data["paragraph_text"]) if id_ in selected_ids]
-        filtered_pdf_paragraph_embeddings = torch.tensor(filtered_pdf_paragraph_embeddings)
-        
-        if isinstance(filtered_pdf_paragraph_embeddings, torch.Tensor):
-            filtered_pdf_paragraph_embeddings = filtered_pdf_paragraph_embeddings.cpu().numpy()  
-
-        if len(filtered_pdf_paragraph_embeddings) == 0:
+    for selected_pdf in selected_pdfs:
+        selected_rows = np.flatnonzero(stored_ids == selected_pdf)
+
+        if len(selected_rows) == 0:
             print(f"Keine Embeddings für das ausgewählte PDF gefunden: {selected_pdfs}")
             return []
 
-        dimension = filtered_pdf_paragraph_embeddings.shape[1]
-        p = hnswlib.Index(space='cosine', dim=dimension)
-        p.init_index(max_elements=10000, ef_construction=200, M=16)
-        p.add_items(filtered_pdf_paragraph_embeddings)  
-        p.set_ef(50)  
+        if len(selected_rows) <= EXACT_SEARCH_THRESHOLD:
+            hits, distances = exact_top_k(_rows_of(selected_rows, stored_embeddings), query_embedding, k)
+            hits = selected_rows[hits]
+        elif index is not None:
+            positions = {stored_rows[row]: row for row in selected_rows}
+            labels, distances = index.query(query_embedding, list(positions), k)
+            hits = [positions[label] for label in labels]
+        else:
+            filtered_pdf_paragraph_embeddings = _rows_of(selected_rows, stored_embeddings)
+            dimension = filtered_pdf_paragraph_embeddings.shape[1]
+            p = hnswlib.Index(space='cosine', dim=dimension)
+            p.init_index(max_elements=len(filtered_pdf_paragraph_embeddings), ef_construction=INDEX_EF_CONSTRUCTION,
+                         M=INDEX_M)
+            p.add_items(filtered_pdf_paragraph_embeddings)
+            p.set_ef(max(INDEX_EF_SEARCH, k))
+            labels, distances = p.knn_query(query_embedding, k=min(k, len(filtered_pdf_paragraph_embeddings)))
+            hits, distances = selected_rows[labels[0]], distances[0]
 
-        query_embedding = model.encode([query])
-
-        labels, distances = p.knn_query(query_embedding, k=k)
-        similar_sentences_with_scores = [(filtered_pdf_paragraph_text[label], 1 - distance, str(filtered_pdf_ids[label])) for label, distance in zip(labels[0], distances[0])]
-        returning_list+=similar_sentences_with_scores
+        returning_list += [(stored_texts[hit], 1 - distance, selected_pdf) for hit, distance in zip(hits, distances)]
 
     return returning_list
-
-
-
@@ -0,0 +1,237 @@
+from typing import Dict, Optional, Union
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import random
+import sqlite3
+import threading
+import time
+
+DEFAULT_RATES = {
+    "semantic_scholar": 5.0,
+    "pdf_download": 4.0,
+    "cohere": 10 / 60
+}
+MAX_RETRIES = 5
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+BASE_DELAY = 1.0
+MAX_DELAY = 60.0
+
+_limiters: Dict[str, "RateLimiter"] = {}
+_state_path: Optional[str] = None
+_registry_lock = threading.Lock()
+
+def parse_retry_after(value: Optional[Union[str, int, float]]) -> Optional[float]:
+    """
+    Wertet einen Retry-After-Header aus (Sekunden oder HTTP-Datum).
+
+    :param value: Der Header-Wert oder None.
+    :return: Wartezeit in Sekunden oder None, falls der Wert fehlt bzw. ungültig ist.
+    """
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        retry_at = parsedate_to_datetime(str(value))
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+class RateLimiter:
+    """
+    Token-Bucket-Ratenbegrenzer mit adaptiver Rate, gejittertem exponentiellem Backoff und Retry-After-Unterstützung.
+
+    - acquire() reserviert ein Token und wartet, bis es verfügbar ist. Wartende Threads erhalten
+      nacheinander die nächsten freien Slots, sodass parallele Aufrufe das Budget gemeinsam einhalten.
+    - backoff() wird nach einer Drosselung (z. B. HTTP 429) aufgerufen. Es halbiert die aktuelle Rate,
+      pausiert den gesamten Bucket für die Dauer von Retry-After bzw. des Backoffs (höchstens 'max_delay')
+      und schläft entsprechend. Würde die Wartezeit eine übergebene Deadline überschreiten, wird abgebrochen.
+    - success() erhöht die Rate danach schrittweise wieder bis zur konfigurierten Obergrenze.
+
+    Ist 'state_path' gesetzt, wird der Bucket-Zustand in einer SQLite-Datei gehalten, sodass sich
+    mehrere Prozesse dasselbe Budget teilen.
+    """
+    def __init__(self,
+                 name: str,
+                 rate: float,
+                 capacity: float = 1.0,
+                 state_path: Optional[str] = None,
+                 max_retries: int = MAX_RETRIES,
+                 base_delay: float = BASE_DELAY,
+                 max_delay: float = MAX_DELAY):
+        self.name = name
+        self.max_rate = rate
+        self.rate = rate
+        self.capacity = capacity
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.tokens = capacity
+        self.updated = time.time()
+        self.blocked_until = 0.0
+        self.requests = 0
+        self.retries = 0
+        self.throttled_seconds = 0.0
+        self.backoff_seconds = 0.0
+        self.lock = threading.Lock()
+
+        self.connection = None
+        if state_path:
+            self.connection = sqlite3.connect(state_path, timeout=30, check_same_thread=False,
+                                              isolation_level=None)
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS buckets (
+                    name TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated REAL NOT NULL,
+                    blocked_until REAL NOT NULL
+                )
+            """)
+
+    def _reserve(self) -> float:
+        """
+        Entnimmt ein Token (ggf. als Vorgriff auf die Zukunft) und liefert die nötige Wartezeit.
+        """
+        now = time.time()
+        if self.connection is not None:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.connection.execute(
+                    "SELECT tokens, updated, blocked_until FROM buckets WHERE name = ?", (self.name,)
+                ).fetchone()
+                if row:
+                    self.tokens, self.updated, self.blocked_until = row
+                wait = self._take(now)
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO buckets (name, tokens, updated, blocked_until) VALUES (?, ?, ?, ?)",
+                    (self.name, self.tokens, self.updated, self.blocked_until)
+                )
+                self.connection.execute("COMMIT")
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+            return wait
+        return self._take(now)
+
+    def _take(self, now: float) -> float:
+        start = max(now, self.blocked_until)
+        if start > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (start - self.updated) * self.rate)
+            self.updated = start
+        self.tokens -= 1
+        if self.tokens >= 0 or self.rate <= 0:
+            return start - now
+        return start - now + (-self.tokens) / self.rate
+
+    def acquire(self) -> float:
+        """
+        Wartet, bis ein Token verfügbar ist.
+
+        :return: Die gewartete Zeit in Sekunden.
+        """
+        with self.lock:
+            wait = self._reserve()
+            self.requests += 1
+            self.throttled_seconds += wait
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def backoff(self,
+                attempt: int,
+                retry_after: Optional[Union[str, int, float]] = None,
+                deadline: Optional[float] = None) -> Optional[float]:
+        """
+        Reagiert auf eine Drosselung durch den Server.
+
+        :param attempt: Nummer des fehlgeschlagenen Versuchs (beginnend bei 0).
+        :param retry_after: Optionaler Retry-After-Header der Antwort (wird auf 'max_delay' begrenzt).
+        :param deadline: Optionaler Zeitpunkt (time.time()), bis zu dem der Aufrufer höchstens wartet.
+        :return: Die gewartete Zeit in Sekunden oder None, wenn 'max_retries' erreicht ist bzw.
+                 die Wartezeit die Deadline überschreiten würde.
+        """
+        if attempt >= self.max_retries:
+            return None
+
+        delay = parse_retry_after(retry_after)
+        if delay is None:
+            ceiling = min(self.max_delay, self.base_delay * 2 ** attempt)
+            delay = ceiling / 2 + random.uniform(0, ceiling / 2)
+        delay = min(delay, self.max_delay)
+        gives_up = deadline is not None and time.time() + delay > deadline
+
+        with self.lock:
+            self.rate = max(self.max_rate / 16, self.rate / 2)
+            self.blocked_until = max(self.blocked_until, time.time() + delay)
+            if self.connection is not None:
+                self.connection.execute(
+                    "UPDATE buckets SET blocked_until = MAX(blocked_until, ?) WHERE name = ?",
+                    (self.blocked_until, self.name)
+                )
+            if not gives_up:
+                self.retries += 1
+                self.backoff_seconds += delay
+
+        if gives_up:
+            print(f"[{self.name}] Gedrosselt. Wartezeit von {delay:.1f} Sekunden überschreitet die Deadline, Abbruch.")
+            return None
+
+        print(f"[{self.name}] Gedrosselt. Warte {delay:.1f} Sekunden (Versuch {attempt + 1}/{self.max_retries})...")
+        time.sleep(delay)
+        return delay
+
+    def success(self) -> None:
+        """
+        Meldet eine erfolgreiche Anfrage und erhöht eine zuvor reduzierte Rate schrittweise.
+        """
+        with self.lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+
+    def metrics(self) -> Dict[str, float]:
+        """
+        Liefert Kennzahlen zu Anfragen, Wiederholungen und der durch Drosselung verlorenen Zeit.
+        """
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "retries": self.retries,
+                "throttled_seconds": round(self.throttled_seconds, 3),
+                "backoff_seconds": round(self.backoff_seconds, 3),
+                "current_rate": self.rate
+            }
+
+def configure_rate_limits(state_path: Optional[str]) -> None:
+    """
+    Legt fest, ob die gemeinsam genutzten Limiter ihren Zustand prozessübergreifend in 'state_path' halten.
+    Muss vor dem ersten Aufruf von get_rate_limiter erfolgen; bereits erzeugte Limiter werden verworfen.
+    """
+    global _state_path
+    with _registry_lock:
+        _state_path = state_path
+        _limiters.clear()
+
+def get_rate_limiter(name: str, rate: Optional[float] = None) -> RateLimiter:
+    """
+    Liefert den gemeinsam genutzten Limiter für einen Dienst (z. B. "semantic_scholar", "pdf_download", "cohere").
+
+    :param name: Name des Dienstes.
+    :param rate: Anfragen pro Sekunde beim ersten Erzeugen (Standard: DEFAULT_RATES).
+    """
+    with _registry_lock:
+        if name not in _limiters:
+            _limiters[name] = RateLimiter(name, rate if rate is not None else DEFAULT_RATES.get(name, 1.0),
+                                          state_path=_state_path)
+        return _limiters[name]
+
+def rate_limiter_metrics() -> Dict[str, Dict[str, float]]:
+    """
+    Liefert die Kennzahlen aller gemeinsam genutzten Limiter.
+    """
+    with _registry_lock:
+        limiters = list(_limiters.values())
+    return {limiter.name: limiter.metrics() for limiter in limiters}
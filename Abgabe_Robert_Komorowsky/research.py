@@ -1,8 +1,32 @@
-from typing import List, Dict, Any, Union, Optional
+from typing import List, Dict, Any, Union, Optional, Set, Tuple, Iterator
 import requests
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import threading
 import time
 
+from rate_limiter import RateLimiter, get_rate_limiter, RETRYABLE_STATUS_CODES
+from response_cache import ResponseCache
+from query_compiler import parse_query, normalize_query, compile_query
+
+SEARCH_URL = "https://api.semanticscholar.org/graph/v1/paper/search"
+BULK_SEARCH_URL = "https://api.semanticscholar.org/graph/v1/paper/search/bulk"
+BATCH_URL = "https://api.semanticscholar.org/graph/v1/paper/batch"
+FIELDS = ("paperId,title,authors,year,publicationDate,abstract,url,externalIds,"
+          "citationCount,referenceCount,isOpenAccess,openAccessPdf,"
+          "publicationTypes,journal,tldr")
+FIELD_PROFILES = {
+    "triage": "paperId,year,publicationDate,isOpenAccess,openAccessPdf",
+    "metadata": ("paperId,title,authors,year,publicationDate,url,externalIds,citationCount,referenceCount,"
+                 "isOpenAccess,openAccessPdf,publicationTypes,journal"),
+    "full": FIELDS
+}
+MAX_PAGE_SIZE = 100
+MAX_BATCH_SIZE = 500
+MAX_WORKERS = 4
+REQUEST_TIMEOUT = 30
+SEARCH_TIMEOUT = 60
+
 def build_query(required_terms: Union[List[str], str],
                 or_terms: Optional[List[str]] = None,
                 not_terms: Optional[List[str]] = None) -> str:
@@ -24,13 +48,235 @@ def build_query(required_terms: Union[List[str], str],
     
     return query
 
+def to_bulk_query(query: str) -> str:
+    """
+    Übersetzt einen Query-String in die Syntax des Bulk-Endpunkts, der logische Operatoren als
+    '+' (AND), '|' (OR) und '-' (NOT) erwartet. Die Anfrage wird dazu geparst (NOT vor AND vor OR)
+    und mit expliziten Klammern ausgegeben, sodass die Operatorreihenfolge eindeutig ist.
+    """
+    return compile_query(normalize_query(parse_query(query)), dialect="bulk")
+
+def _search_limiter(requests_per_second: Optional[float]) -> RateLimiter:
+    """
+    Liefert den geteilten Limiter für Semantic Scholar oder einen eigenen Limiter mit abweichendem Budget.
+    """
+    if requests_per_second is None:
+        return get_rate_limiter("semantic_scholar")
+    return RateLimiter("semantic_scholar", requests_per_second)
+
+def _filter_papers(results: List[Dict[str, Any]],
+                   start_year: Optional[int],
+                   end_year: Optional[int],
+                   open_access_only: bool,
+                   pdf_available_only: bool) -> List[Dict[str, Any]]:
+    """
+    Wendet die clientseitigen Filter (Zeitraum, Open Access, PDF-Verfügbarkeit) auf eine Ergebnisseite an.
+    """
+    if start_year or end_year:
+        filtered_results = []
+        for paper in results:
+            year = paper.get('year')
+            if year:
+                if start_year and year < start_year:
+                    continue
+                if end_year and year > end_year:
+                    continue
+                filtered_results.append(paper)
+        results = filtered_results
+        print("Nach Zeitraum gefiltert. Verbleibende Publikationen:", len(results))
+
+    if open_access_only:
+        results = [paper for paper in results if paper.get('isOpenAccess', False)]
+        print("Nach Open-Access gefiltert. Verbleibende Publikationen:", len(results))
+
+    if pdf_available_only:
+        results = [paper for paper in results
+                   if paper.get('openAccessPdf') and paper.get('openAccessPdf').get('url')]
+        print("Nach PDF-Verfügbarkeit gefiltert. Verbleibende Publikationen:", len(results))
+
+    return results
+
+class _SearchStats:
+    """
+    Threadsicherer Zähler für API-Aufrufe und übertragene Bytes einer Suche.
+    """
+    def __init__(self):
+        self.calls = 0
+        self.bytes = 0
+        self.lock = threading.Lock()
+
+    def record(self, response: requests.Response) -> None:
+        with self.lock:
+            self.calls += 1
+            self.bytes += len(response.content)
+
+def _cache_counters(cache: Optional[ResponseCache], before: Optional[Dict[str, int]]) -> Dict[str, int]:
+    """
+    Berechnet die Cache-Zähler, die während einer einzelnen Suche angefallen sind.
+    """
+    if cache is None:
+        return {}
+    after = cache.stats()
+    return {f"cache_{name}": after[name] - before[name] for name in after}
+
+def plan_search(start_year: Optional[int] = None,
+                end_year: Optional[int] = None,
+                open_access_only: bool = False,
+                pdf_available_only: bool = False,
+                server_side_filters: bool = True,
+                since: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Übersetzt die Suchfilter in serverseitige Parameter der Semantic Scholar API.
+
+    - start_year/end_year werden zu 'year=2020-2024', 'year=2020-' bzw. 'year=-2024'.
+    - since (Datum 'YYYY-MM-DD') wird zu 'publicationDateOrYear=<since>:'.
+    - pdf_available_only wird zu 'openAccessPdf' (Parameter ohne Wert).
+    - open_access_only hat keine Entsprechung in der API und bleibt ein clientseitiger Filter.
+
+    Die clientseitigen Filter werden unabhängig vom Plan immer angewendet; sie sind für
+    bereits serverseitig gefilterte Seiten wirkungslos und dienen als Rückfallebene.
+
+    :param server_side_filters: Falls False, werden keine Filter an die API übergeben.
+    :return: Dictionary mit den zusätzlichen Anfrageparametern ('params') und den Namen
+             der serverseitig angewendeten Filter ('server_side').
+    """
+    params: Dict[str, Any] = {}
+    server_side: List[str] = []
+    if not server_side_filters:
+        return {"params": params, "server_side": server_side}
+
+    if start_year or end_year:
+        params["year"] = f"{start_year or ''}-{end_year or ''}"
+        server_side.append("year")
+
+    if pdf_available_only:
+        params["openAccessPdf"] = ""
+        server_side.append("openAccessPdf")
+
+    if since:
+        params["publicationDateOrYear"] = f"{since}:"
+        server_side.append("publicationDateOrYear")
+
+    return {"params": params, "server_side": server_side}
+
+def _fetch_page(url: str,
+                params: Dict[str, Any],
+                limiter: RateLimiter,
+                deadline: float,
+                stats: _SearchStats,
+                cache: Optional[ResponseCache] = None,
+                body: Optional[Dict[str, Any]] = None) -> Tuple[int, Any]:
+    """
+    Ruft eine einzelne Ergebnisseite ab. Bei HTTP 429 und vorübergehenden Serverfehlern wird die Anfrage
+    nach gejittertem exponentiellem Backoff bzw. nach der Vorgabe aus Retry-After wiederholt, bis
+    die maximale Anzahl an Versuchen oder die Deadline erreicht ist.
+
+    Ist ein Cache übergeben, werden frische Einträge ohne Netzwerkzugriff geliefert und
+    abgelaufene Einträge per If-None-Match/If-Modified-Since revalidiert.
+    Ist 'body' gesetzt, wird stattdessen ein POST mit JSON-Inhalt gesendet (z. B. für /paper/batch).
+
+    :return: Tupel aus HTTP-Statuscode und der JSON-Antwort der API (leer bei Fehlern).
+             Bei Zeitüberschreitung wird der Status 408 zurückgegeben.
+    """
+    entry = cache.lookup(url, params) if cache else None
+    if entry and entry["fresh"]:
+        cache.record(hit=True)
+        return 200, entry["payload"]
+
+    headers = cache.conditional_headers(entry) if cache else {}
+    attempt = 0
+    while time.time() < deadline:
+        limiter.acquire()
+        if body is None:
+            response = requests.get(url, params=params, headers=headers, timeout=REQUEST_TIMEOUT)
+        else:
+            response = requests.post(url, params=params, json=body, timeout=REQUEST_TIMEOUT)
+        stats.record(response)
+        if response.status_code not in RETRYABLE_STATUS_CODES:
+            limiter.success()
+        if response.status_code == 304 and entry:
+            cache.refresh(url, params)
+            cache.record(hit=True, revalidated=True)
+            return 200, entry["payload"]
+        if response.status_code == 200:
+            payload = response.json()
+            if cache:
+                cache.store(url, params, response.content,
+                            response.headers.get("ETag"), response.headers.get("Last-Modified"))
+                cache.record(miss=True)
+            if body is not None:
+                print("Erfolgreiche API-Antwort erhalten (Batch). Anzahl angefragter Publikationen:",
+                      len(body.get("ids", [])))
+            else:
+                position = f"Offset {params['offset']}" if "offset" in params else "Bulk"
+                print(f"Erfolgreiche API-Antwort erhalten ({position}). "
+                      f"Anzahl gefundener Publikationen:", len(payload.get('data', [])))
+            return 200, payload
+        elif response.status_code in RETRYABLE_STATUS_CODES:
+            print(f"Anfrage gedrosselt bzw. fehlgeschlagen ({response.status_code}).")
+            if limiter.backoff(attempt, response.headers.get("Retry-After"), deadline) is None:
+                return response.status_code, {}
+            attempt += 1
+        else:
+            print("Fehler bei der Anfrage:", response.status_code)
+            return response.status_code, {}
+    return 408, {}
+
+def _estimate_savings(query: str,
+                      base_url: str,
+                      plan: Dict[str, Any],
+                      filtered_total: Optional[int],
+                      papers_received: int,
+                      page_size: int,
+                      limiter: RateLimiter,
+                      deadline: float,
+                      stats: _SearchStats,
+                      cache: Optional[ResponseCache] = None) -> Dict[str, int]:
+    """
+    Schätzt, wie viele Aufrufe und Bytes die serverseitigen Filter gegenüber rein clientseitiger
+    Filterung eingespart haben. Dazu wird die ungefilterte Trefferzahl mit einer minimalen Anfrage
+    (limit=1, nur paperId) ermittelt und die Selektivität der Filter daraus abgeleitet. Die Anfrage
+    belastet das Anfragebudget, wird aber nicht in 'stats' der Suche gezählt ("probe_calls").
+    """
+    if not plan["server_side"] or not filtered_total or not papers_received or not stats.calls:
+        return {"calls": 0, "bytes": 0, "probe_calls": 0}
+
+    probe_stats = _SearchStats()
+    probe_params = {"query": query, "limit": 1, "offset": 0, "fields": "paperId"}
+    status, payload = _fetch_page(base_url, probe_params, limiter, deadline, probe_stats, cache)
+    unfiltered_total = payload.get('total')
+    if status != 200 or not unfiltered_total:
+        return {"calls": 0, "bytes": 0, "probe_calls": probe_stats.calls}
+
+    selectivity = min(1.0, filtered_total / unfiltered_total)
+    papers_without_plan = papers_received / selectivity
+    calls_without_plan = -(-int(papers_without_plan) // page_size)
+    bytes_without_plan = int(stats.bytes / papers_received * papers_without_plan)
+    return {
+        "calls": max(0, calls_without_plan - stats.calls),
+        "bytes": max(0, bytes_without_plan - stats.bytes),
+        "probe_calls": probe_stats.calls,
+    }
+
 def search_semantic_scholar(query: str,
                             start_year: Optional[int] = None,
                             end_year: Optional[int] = None,
                             last_n_years: Optional[int] = None,
                             limit: int = 10,
                             open_access_only: bool = False,
-                            pdf_available_only: bool = False) -> List[Dict[str, Any]]:
+                            pdf_available_only: bool = False,
+                            max_workers: int = MAX_WORKERS,
+                            requests_per_second: Optional[float] = None,
+                            base_url: str = SEARCH_URL,
+                            server_side_filters: bool = True,
+                            cache: Optional[ResponseCache] = None,
+                            profile: str = "full",
+                            two_phase: bool = False,
+                            batch_url: str = BATCH_URL,
+                            stats: Optional[Dict[str, Any]] = None,
+                            since: Optional[str] = None,
+                            estimate_savings: bool = False,
+                            exclude_ids: Optional[Set[str]] = None) -> List[Dict[str, Any]]:
     """
     Sucht Publikationen über die Semantic Scholar API und sammelt bis zu 'limit' eindeutige Ergebnisse.
     API-Dokumentation: https://api.semanticscholar.org/api-docs/
@@ -39,11 +285,37 @@ def search_semantic_scholar(query: str,
     Optionen:
       - start_year/end_year: Filtert Ergebnisse nach einem bestimmten Zeitraum.
       - last_n_years: Berechnet den Zeitraum basierend auf den letzten n Jahren.
-      - limit: Anzahl der angeforderten Publikationen pro API-Aufruf
+      - limit: Anzahl der angeforderten Publikationen pro API-Aufruf (maximal 100 pro Seite)
       - open_access_only: Falls True, werden nur Open-Access-Publikationen zurückgegeben.
       - pdf_available_only: Falls True, werden nur Publikationen zurückgegeben, bei denen
                             ein Open-Access-PDF verfügbar ist.
-    
+      - max_workers: Anzahl der Offset-Fenster, die gleichzeitig abgefragt werden.
+      - requests_per_second: Eigenes Anfragebudget für diese Suche. Standardmäßig (None) wird der
+                             prozessweit geteilte Limiter "semantic_scholar" verwendet (siehe rate_limiter).
+      - base_url: Endpunkt der Suche (z. B. für Tests gegen einen lokalen Server).
+      - server_side_filters: Falls True, werden Zeitraum und PDF-Verfügbarkeit als Parameter an die
+                             API übergeben (siehe plan_search). Lehnt die API diese mit HTTP 400 ab,
+                             wird automatisch auf rein clientseitige Filterung zurückgefallen.
+      - cache: Optionaler ResponseCache; bereits abgerufene Seiten werden ohne Netzwerkzugriff geliefert.
+      - profile: Name des Feldprofils aus FIELD_PROFILES ("triage", "metadata" oder "full").
+      - two_phase: Falls True, wird zunächst nur mit dem Profil "triage" gesucht und gefiltert;
+                   anschließend werden die Felder aus 'profile' nur für die verbleibenden Publikationen
+                   über den Batch-Endpunkt nachgeladen (siehe hydrate_papers).
+      - batch_url: Batch-Endpunkt für das Nachladen im Zwei-Phasen-Modus.
+      - stats: Optionales Dictionary, das mit Aufrufen, Bytes, serverseitigen Filtern, der
+               geschätzten Einsparung (saved_calls, saved_bytes; None ohne 'estimate_savings'), der Vollständigkeit des Ergebnisses
+               ('complete': alle Treffer der Anfrage wurden geliefert) und den Cache-Zählern befüllt wird.
+      - since: Optionales Datum 'YYYY-MM-DD'; es werden nur Publikationen ab diesem Datum angefragt
+               (serverseitig, z. B. für inkrementelle Läufe, siehe harvest_state).
+      - estimate_savings: Falls True, wird die Einsparung der serverseitigen Filter mit einer zusätzlichen
+                          ungefilterten Anfrage geschätzt (siehe _estimate_savings). Standardmäßig aus,
+                          da die Anfrage Teil des Anfragebudgets ist.
+      - exclude_ids: Optionale paperIds, die übersprungen werden, bevor das Limit greift (z. B. bereits
+                     verarbeitete Publikationen inkrementeller Läufe); es wird weiter geblättert, bis
+                     'limit' andere Publikationen gefunden sind.
+
+    Die Seiten eines Fensters werden parallel abgerufen, aber in Offset-Reihenfolge gefiltert,
+    dedupliziert und zusammengeführt, sodass das Ergebnis dem sequenziellen Abruf entspricht.
     Es wird innerhalb von 1 Minute gesucht, um die gewünschte Anzahl an eindeutigen Ergebnissen zu sammeln.
     """
     print("Starte Suche mit Query:", query)
@@ -52,70 +324,268 @@ def search_semantic_scholar(query: str,
         start_year = current_year - last_n_years
         end_year = current_year
 
-    base_url = "https://api.semanticscholar.org/graph/v1/paper/search"
+    plan = plan_search(start_year, end_year, open_access_only, pdf_available_only, server_side_filters, since)
+    if plan["server_side"]:
+        print("Serverseitige Filter:", ", ".join(plan["server_side"]))
+
+    fields = FIELD_PROFILES["triage" if two_phase else profile]
     accumulated_results: List[Dict[str, Any]] = []
-    seen_ids = set()
+    seen_ids = set(exclude_ids or ())
     offset = 0
-    start_time = time.time()
+    page_size = max(1, min(limit, MAX_PAGE_SIZE))
+    deadline = time.time() + SEARCH_TIMEOUT
+    limiter = _search_limiter(requests_per_second)
+    search_stats = _SearchStats()
+    cache_before = cache.stats() if cache else None
+    papers_received = 0
+    filtered_total = None
+    exhausted = False
+    reached_end = False
 
-    fields = ("paperId,title,authors,year,abstract,url,externalIds,"
-              "citationCount,referenceCount,isOpenAccess,openAccessPdf,"
-              "publicationTypes,journal,tldr")
-    
-    while len(accumulated_results) < limit and (time.time() - start_time < 60):
-        params = {
-            "query": query,
-            "limit": limit,
-            "offset": offset,
-            "fields": fields
-        }
-        response = requests.get(base_url, params=params)
-        if response.status_code == 200:
-            results = response.json().get('data', [])
-            print("Erfolgreiche API-Antwort erhalten. Anzahl gefundener Publikationen:", len(results))
-            if not results:
-                print("Keine weiteren Ergebnisse gefunden. Beende Suche.")
-                break
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        while not exhausted and len(accumulated_results) < limit and time.time() < deadline:
+            missing_pages = -(-(limit - len(accumulated_results)) // page_size)
+            window = min(max(1, max_workers), missing_pages)
+            futures = []
+            for page in range(window):
+                params = {
+                    "query": query,
+                    "limit": page_size,
+                    "offset": offset + page * page_size,
+                    "fields": fields,
+                    **plan["params"]
+                }
+                futures.append(executor.submit(_fetch_page, base_url, params, limiter, deadline,
+                                               search_stats, cache))
+            offset += window * page_size
 
-            if start_year or end_year:
-                filtered_results = []
+            restart = False
+            for future in futures:
+                status, payload = future.result()
+                results = payload.get('data', [])
+                if exhausted or restart:
+                    continue
+                if status == 400 and plan["server_side"]:
+                    print("Serverseitige Filter werden nicht unterstützt. Falle auf clientseitige Filterung zurück.")
+                    plan = plan_search(server_side_filters=False)
+                    offset = 0
+                    restart = True
+                    continue
+                if status != 200:
+                    exhausted = True
+                    continue
+                if not results:
+                    print("Keine weiteren Ergebnisse gefunden. Beende Suche.")
+                    exhausted = True
+                    reached_end = True
+                    continue
+
+                papers_received += len(results)
+                if filtered_total is None:
+                    filtered_total = payload.get('total')
+                results = _filter_papers(results, start_year, end_year, open_access_only, pdf_available_only)
+
+                unique_results = []
                 for paper in results:
-                    year = paper.get('year')
-                    if year:
-                        if start_year and year < start_year:
-                            continue
-                        if end_year and year > end_year:
-                            continue
-                        filtered_results.append(paper)
-                results = filtered_results
-                print("Nach Zeitraum gefiltert. Verbleibende Publikationen:", len(results))
-
-            if open_access_only:
-                results = [paper for paper in results if paper.get('isOpenAccess', False)]
-                print("Nach Open-Access gefiltert. Verbleibende Publikationen:", len(results))
-            
-            if pdf_available_only:
-                results = [paper for paper in results 
-                           if paper.get('openAccessPdf') and paper.get('openAccessPdf').get('url')]
-                print("Nach PDF-Verfügbarkeit gefiltert. Verbleibende Publikationen:", len(results))
-            
+                    uid = paper.get("paperId")
+                    if uid and uid not in seen_ids:
+                        seen_ids.add(uid)
+                        unique_results.append(paper)
+
+                accumulated_results.extend(unique_results)
+                print("Anzahl gespeicherter einzigartiger Publikationen:", len(accumulated_results))
+
+    saved = {"calls": None, "bytes": None, "probe_calls": 0}
+    if estimate_savings:
+        saved = _estimate_savings(query, base_url, plan, filtered_total, papers_received, page_size,
+                                  limiter, deadline, search_stats, cache)
+        if plan["server_side"]:
+            print(f"Durch serverseitige Filter eingespart (geschätzt): {saved['calls']} Aufrufe, {saved['bytes']} Bytes")
+
+    # Vollständig ist das Ergebnis nur, wenn alle Treffer abgerufen wurden und keiner dem Limit zum Opfer fiel.
+    complete = reached_end and len(accumulated_results) <= limit
+    accumulated_results = accumulated_results[:limit]
+    hydration_stats: Dict[str, Any] = {}
+    if two_phase and accumulated_results:
+        accumulated_results = hydrate_papers(accumulated_results, FIELD_PROFILES[profile], base_url=batch_url,
+                                             requests_per_second=requests_per_second, stats=hydration_stats)
+
+    if stats is not None:
+        stats.update({
+            "calls": search_stats.calls,
+            "bytes": search_stats.bytes,
+            "server_side_filters": plan["server_side"],
+            "saved_calls": saved["calls"],
+            "saved_bytes": saved["bytes"],
+            "probe_calls": saved["probe_calls"],
+            "complete": complete,
+            "profile": profile,
+            "two_phase": two_phase,
+            **{f"hydration_{name}": value for name, value in hydration_stats.items()},
+            **_cache_counters(cache, cache_before)
+        })
+
+    return accumulated_results
+
+def stream_semantic_scholar(query: str,
+                            start_year: Optional[int] = None,
+                            end_year: Optional[int] = None,
+                            last_n_years: Optional[int] = None,
+                            limit: Optional[int] = None,
+                            open_access_only: bool = False,
+                            pdf_available_only: bool = False,
+                            requests_per_second: Optional[float] = None,
+                            base_url: str = BULK_SEARCH_URL,
+                            server_side_filters: bool = True,
+                            timeout: Optional[float] = None,
+                            cache: Optional[ResponseCache] = None,
+                            profile: str = "full",
+                            two_phase: bool = False,
+                            batch_url: str = BATCH_URL,
+                            stats: Optional[Dict[str, Any]] = None,
+                            since: Optional[str] = None,
+                            exclude_ids: Optional[Set[str]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Liefert Publikationen über den Bulk-Suchendpunkt von Semantic Scholar als Generator.
+
+    Der Bulk-Endpunkt liefert bis zu 1000 Publikationen pro Aufruf und verweist über ein
+    Continuation-Token ('token') auf die nächste Seite. Im Gegensatz zu search_semantic_scholar
+    gibt es keine Offset-Obergrenze und keine überlappenden Fenster; der Speicherbedarf ist
+    proportional zu einer Seite (zuzüglich der Menge bereits gesehener paperIds).
+
+    Die Filter entsprechen denen von search_semantic_scholar. Der Query-String wird mit
+    to_bulk_query in die Bulk-Syntax übersetzt.
+
+    :param limit: Maximale Anzahl zu liefernder Publikationen (None = alle Treffer).
+    :param timeout: Maximale Laufzeit in Sekunden (None = unbegrenzt).
+    :param requests_per_second: Eigenes Anfragebudget (None = geteilter Limiter "semantic_scholar").
+    :param cache: Optionaler ResponseCache für die einzelnen Bulk-Seiten.
+    :param profile: Name des Feldprofils aus FIELD_PROFILES.
+    :param two_phase: Falls True, wird mit dem Profil "triage" gestreamt und jede Seite der verbleibenden
+                      Publikationen vor der Ausgabe mit den Feldern aus 'profile' angereichert.
+    :param batch_url: Batch-Endpunkt für das Nachladen im Zwei-Phasen-Modus.
+    :param stats: Optionales Dictionary, das nach Ende des Streams mit Aufrufen und Bytes befüllt wird.
+    :param since: Optionales Datum 'YYYY-MM-DD', ab dem Publikationen angefragt werden.
+    :param exclude_ids: Optionale paperIds, die übersprungen werden und nicht auf 'limit' angerechnet werden.
+    :return: Iterator über eindeutige, gefilterte Publikationen in der Reihenfolge der API.
+    """
+    print("Starte Bulk-Suche mit Query:", query)
+    if last_n_years is not None:
+        current_year = datetime.now().year
+        start_year = current_year - last_n_years
+        end_year = current_year
+
+    plan = plan_search(start_year, end_year, open_access_only, pdf_available_only, server_side_filters, since)
+    limiter = _search_limiter(requests_per_second)
+    search_stats = _SearchStats()
+    cache_before = cache.stats() if cache else None
+    deadline = time.time() + timeout if timeout is not None else float("inf")
+    fields = FIELD_PROFILES["triage" if two_phase else profile]
+    seen_ids = set(exclude_ids or ())
+    delivered = 0
+    token = None
+
+    try:
+        while limit is None or delivered < limit:
+            params = {"query": to_bulk_query(query), "fields": fields, **plan["params"]}
+            if token:
+                params["token"] = token
+            status, payload = _fetch_page(base_url, params, limiter, deadline, search_stats, cache)
+            if status == 400 and plan["server_side"] and token is None:
+                print("Serverseitige Filter werden nicht unterstützt. Falle auf clientseitige Filterung zurück.")
+                plan = plan_search(server_side_filters=False)
+                continue
+            if status != 200:
+                break
+
+            results = _filter_papers(payload.get('data', []), start_year, end_year,
+                                     open_access_only, pdf_available_only)
             unique_results = []
             for paper in results:
                 uid = paper.get("paperId")
-                if uid and uid not in seen_ids:
+                if uid and uid not in seen_ids and (limit is None or delivered + len(unique_results) < limit):
                     seen_ids.add(uid)
                     unique_results.append(paper)
-            
-            accumulated_results.extend(unique_results)
-            print("Anzahl gespeicherter einzigartiger Publikationen:", len(accumulated_results))
-
-            #offset += len(results)
-            offset += limit
-        elif response.status_code == 429:
-            print("Rate limit erreicht (429). Warte 10 Sekunden...")
-            time.sleep(10)
-        else:
-            print("Fehler bei der Anfrage:", response.status_code)
-            break
 
-    return accumulated_results[:limit]
+            if two_phase and unique_results:
+                unique_results = hydrate_papers(unique_results, FIELD_PROFILES[profile], base_url=batch_url,
+                                                requests_per_second=requests_per_second)
+            for paper in unique_results:
+                delivered += 1
+                yield paper
+
+            token = payload.get('token')
+            if not token:
+                print("Keine weiteren Ergebnisse gefunden. Beende Bulk-Suche.")
+                break
+    finally:
+        if stats is not None:
+            stats.update({
+                "calls": search_stats.calls,
+                "bytes": search_stats.bytes,
+                "server_side_filters": plan["server_side"],
+                "streamed_papers": delivered,
+                **_cache_counters(cache, cache_before)
+            })
+
+def fetch_paper_details(ids: List[str],
+                        fields: str = FIELDS,
+                        chunk_size: int = MAX_BATCH_SIZE,
+                        max_workers: int = MAX_WORKERS,
+                        requests_per_second: Optional[float] = None,
+                        base_url: str = BATCH_URL,
+                        stats: Optional[Dict[str, Any]] = None) -> List[Optional[Dict[str, Any]]]:
+    """
+    Ruft Details zu bekannten Publikationen über den Batch-Endpunkt von Semantic Scholar ab.
+
+    Die IDs werden in Blöcken von bis zu 'chunk_size' (maximal 500) Einträgen per POST angefragt;
+    höchstens 'max_workers' Blöcke laufen gleichzeitig und teilen sich das Anfragebudget.
+    Unterstützt werden alle ID-Formate der API, u. a. paperIds und DOIs mit Präfix ("DOI:10.1145/...").
+
+    :param ids: Liste der Paper-IDs.
+    :param fields: Kommaseparierte Liste der abzurufenden Felder.
+    :param requests_per_second: Eigenes Anfragebudget (None = geteilter Limiter "semantic_scholar").
+    :param stats: Optionales Dictionary, das mit Aufrufen, Bytes und der Anzahl gefundener Publikationen befüllt wird.
+    :return: Liste in der Reihenfolge von 'ids'; nicht gefundene oder fehlgeschlagene Einträge sind None.
+    """
+    chunk_size = max(1, min(chunk_size, MAX_BATCH_SIZE))
+    chunks = [ids[start:start + chunk_size] for start in range(0, len(ids), chunk_size)]
+    limiter = _search_limiter(requests_per_second)
+    search_stats = _SearchStats()
+    deadline = time.time() + SEARCH_TIMEOUT * max(1, len(chunks))
+    print(f"Rufe Details für {len(ids)} Publikationen in {len(chunks)} Batch-Anfragen ab...")
+
+    details: List[Optional[Dict[str, Any]]] = []
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = [executor.submit(_fetch_page, base_url, {"fields": fields}, limiter, deadline,
+                                   search_stats, None, {"ids": chunk})
+                   for chunk in chunks]
+        for chunk, future in zip(chunks, futures):
+            status, payload = future.result()
+            if status != 200 or not isinstance(payload, list):
+                details.extend([None] * len(chunk))
+                continue
+            details.extend(payload)
+
+    if stats is not None:
+        stats.update({
+            "calls": search_stats.calls,
+            "bytes": search_stats.bytes,
+            "found": sum(1 for paper in details if paper)
+        })
+    return details
+
+def hydrate_papers(papers: List[Dict[str, Any]],
+                   fields: str = FIELDS,
+                   **batch_options: Any) -> List[Dict[str, Any]]:
+    """
+    Ergänzt Publikationen aus einer Triage-Suche um weitere Felder über den Batch-Endpunkt.
+    Publikationen, die der Batch-Endpunkt nicht liefert, bleiben mit ihren bisherigen Feldern erhalten.
+
+    :param papers: Liste von Publikationen mit mindestens dem Feld 'paperId'.
+    :param fields: Kommaseparierte Liste der nachzuladenden Felder (z. B. FIELD_PROFILES["full"]).
+    :param batch_options: Weitere Optionen für fetch_paper_details.
+    :return: Die angereicherten Publikationen in unveränderter Reihenfolge.
+    """
+    details = fetch_paper_details([paper["paperId"] for paper in papers], fields=fields, **batch_options)
+    return [{**paper, **(detail or {})} for paper, detail in zip(papers, details)]
@@ -0,0 +1,152 @@
+from typing import Dict, Any, Optional
+import json
+import os
+import sqlite3
+import threading
+import time
+
+CACHE_PATH = os.path.join("data", "http_cache.sqlite3")
+CACHE_TTL = 24 * 60 * 60
+CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+class ResponseCache:
+    """
+    Persistenter Cache für JSON-Antworten der Semantic Scholar API in einer SQLite-Datei.
+
+    - Schlüssel ist die URL zusammen mit den sortierten Anfrageparametern
+      (u. a. query, fields, offset, limit bzw. token).
+    - Einträge jünger als 'ttl' Sekunden werden ohne Netzwerkzugriff ausgeliefert.
+    - Ältere Einträge werden mit ETag/Last-Modified revalidiert, sofern die API diese Header liefert.
+    - Übersteigt die Gesamtgröße 'max_bytes', werden die am längsten nicht genutzten Einträge (LRU) entfernt.
+
+    Der Cache ist threadsicher und kann von parallelen Seitenabrufen gemeinsam genutzt werden.
+    """
+    def __init__(self, path: str = CACHE_PATH, ttl: float = CACHE_TTL, max_bytes: int = CACHE_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.last_access = 0.0
+        self.lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                size INTEGER NOT NULL
+            )
+        """)
+        self.connection.commit()
+
+    @staticmethod
+    def make_key(url: str, params: Dict[str, Any]) -> str:
+        """
+        Erzeugt einen eindeutigen Schlüssel aus URL und Anfrageparametern.
+        """
+        return url + "?" + json.dumps(params, sort_keys=True, ensure_ascii=False)
+
+    def lookup(self, url: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Sucht einen Eintrag und aktualisiert dessen Zugriffszeitpunkt.
+
+        :return: Dictionary mit 'payload', 'fresh' (innerhalb der TTL), 'etag' und 'last_modified'
+                 oder None, falls kein Eintrag existiert.
+        """
+        key = self.make_key(url, params)
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT body, etag, last_modified, stored_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self.connection.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (self._access_time(), key))
+            self.connection.commit()
+
+        body, etag, last_modified, stored_at = row
+        return {
+            "payload": json.loads(body),
+            "fresh": time.time() - stored_at < self.ttl,
+            "etag": etag,
+            "last_modified": last_modified
+        }
+
+    def conditional_headers(self, entry: Optional[Dict[str, Any]]) -> Dict[str, str]:
+        """
+        Liefert die Header für eine bedingte Anfrage (If-None-Match / If-Modified-Since).
+        """
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def store(self, url: str, params: Dict[str, Any], body: bytes,
+              etag: Optional[str] = None, last_modified: Optional[str] = None) -> None:
+        """
+        Speichert eine Antwort und entfernt bei Bedarf die am längsten nicht genutzten Einträge.
+        """
+        key = self.make_key(url, params)
+        with self.lock:
+            now = self._access_time()
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses (key, body, etag, last_modified, stored_at, accessed_at, size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, body, etag, last_modified, now, now, len(body))
+            )
+            self._evict()
+            self.connection.commit()
+
+    def refresh(self, url: str, params: Dict[str, Any]) -> None:
+        """
+        Markiert einen Eintrag nach erfolgreicher Revalidierung (HTTP 304) wieder als frisch.
+        """
+        with self.lock:
+            now = self._access_time()
+            self.connection.execute(
+                "UPDATE responses SET stored_at = ?, accessed_at = ? WHERE key = ?",
+                (now, now, self.make_key(url, params))
+            )
+            self.connection.commit()
+
+    def _access_time(self) -> float:
+        # Streng monoton steigend, damit die LRU-Reihenfolge auch bei grober Uhrauflösung eindeutig ist.
+        self.last_access = max(time.time(), self.last_access + 1e-6)
+        return self.last_access
+
+    def _evict(self) -> None:
+        total = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self.connection.execute("SELECT key, size FROM responses ORDER BY accessed_at ASC").fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self.connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+
+    def record(self, hit: bool = False, miss: bool = False, revalidated: bool = False) -> None:
+        with self.lock:
+            self.hits += hit
+            self.misses += miss
+            self.revalidated += revalidated
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Liefert die Zähler für Treffer, Fehlzugriffe und Revalidierungen seit dem Öffnen des Caches.
+        """
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "revalidated": self.revalidated}
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
@@ -1,11 +1,151 @@
 import unittest
+import json
+import re
+import os
+import tempfile
+import threading
+import time
+import types
+import zlib
+import numpy as np
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
 from unittest.mock import patch
-from research import build_query, search_semantic_scholar
-from extraction import extract_metadata, process_papers
+from rate_limiter import RateLimiter, parse_retry_after
+from response_cache import ResponseCache
+from research import (build_query, search_semantic_scholar, stream_semantic_scholar, plan_search, to_bulk_query,
+                      fetch_paper_details, FIELD_PROFILES)
+from enrichment import refresh_records
+from harvest_state import HarvestState, state_key, merge_results, paper_id_from_result
+from batch_runner import load_specs, run_batch, SPEC_DEFAULTS
+from query_compiler import parse_query, normalize_query, compile_query, query_hash, from_terms, execute_query
+from extraction import extract_metadata, process_papers, process_pipelined
+from pipeline import Stage, run_pipeline
+from pdf_manipulations.pdf_store import PdfStore
+from pdf_manipulations.pdf_downloader import download_pdfs, MAX_DOWNLOADS_PER_HOST
+from pdf_manipulations.pdf_extraction_pool import (extract_texts, extract_text_parallel, split_pages, run_isolated,
+                                                   stream_pages, ExtractionError)
+import pdf_manipulations.pdf_extraction_pool as pdf_extraction_pool
+from pdf_manipulations.pdf_to_text import (extract_cleaned_text, clean_text, compile_cleaning_regex, iter_pages,
+                                           split_cleaned_pages, CLEANING_PATTERNS)
+from pdf_manipulations.pdf_vectorization import embed_pages, encode_texts, document_key, index_documents
+import pdf_manipulations.pdf_vectorization as pdf_vectorization
+from pdf_manipulations.text_cache import TextCache
+from pdf_manipulations.embedding_store import EmbeddingStore
+from rag.hnsw_cosine import search_within_pdfs, get_index
+import rag.hnsw_cosine as hnsw_cosine
 from analysis import total_publications, compute_publication_stats, compute_journal_stats
 
 dummy_qa_pipeline = lambda question, context: "dummy answer for " + question
 
+def write_test_pdf(path, page_texts):
+    """Schreibt ein minimales PDF mit einer Textzeile je Seite (Helvetica)."""
+    count = len(page_texts)
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>",
+               ("<< /Type /Pages /Kids [%s] /Count %d >>"
+                % (" ".join(f"{4 + 2 * i} 0 R" for i in range(count)), count)).encode(),
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    for i, text in enumerate(page_texts):
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode()
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {5 + 2 * i} 0 R "
+                       f"/Resources << /Font << /F1 3 0 R >> >> >>".encode())
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+    data, offsets = b"%PDF-1.4\n", []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(data))
+        data += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(data)
+    data += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    data += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    data += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as file:
+        file.write(data)
+
+class FakeEncoder:
+    """Deterministischer Ersatz für SentenceTransformer (Dimension 16), damit die Tests nicht vom Modell abhängen."""
+    dimension = 16
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+    def encode(self, sentences, normalize_embeddings=False, **kwargs):
+        vectors = np.stack([np.random.default_rng(zlib.crc32(text.encode("utf-8"))).standard_normal(self.dimension)
+                            for text in sentences]).astype(np.float32)
+        if normalize_embeddings:
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors
+
+MOCK_PAPERS = [{"paperId": f"p{i}", "title": f"Paper {i}", "year": 2015 + i % 10} for i in range(40)]
+MOCK_BULK_PAGE_SIZE = 15
+MOCK_ETAG = '"mock-v1"'
+
+class MockSemanticScholarHandler(BaseHTTPRequestHandler):
+    """
+    Minimaler lokaler Ersatz für den Suchendpunkt von Semantic Scholar, der MOCK_PAPERS seitenweise ausliefert.
+    """
+    requested_offsets = []
+    requested_params = []
+    reject_filters = False
+    throttled_responses = 0
+
+    def do_GET(self):
+        params = parse_qs(urlparse(self.path).query, keep_blank_values=True)
+        self.requested_params.append(params)
+        if MockSemanticScholarHandler.throttled_responses > 0:
+            MockSemanticScholarHandler.throttled_responses -= 1
+            self.send_response(429)
+            self.send_header("Retry-After", "0")
+            self.end_headers()
+            return
+        if self.reject_filters and "year" in params:
+            self.send_response(400)
+            self.end_headers()
+            return
+        papers = MOCK_PAPERS
+        if "year" in params:
+            start, end = params["year"][0].split("-")
+            papers = [paper for paper in papers
+                      if (not start or paper["year"] >= int(start)) and (not end or paper["year"] <= int(end))]
+        if urlparse(self.path).path.endswith("/bulk"):
+            offset = int(params.get("token", ["0"])[0])
+            limit = MOCK_BULK_PAGE_SIZE
+            next_token = str(offset + limit) if offset + limit < len(papers) else None
+            payload = {"total": len(papers), "token": next_token, "data": papers[offset:offset + limit]}
+        else:
+            offset = int(params["offset"][0])
+            limit = int(params["limit"][0])
+            payload = {"total": len(papers), "data": papers[offset:offset + limit]}
+        self.requested_offsets.append(offset)
+        if self.headers.get("If-None-Match") == MOCK_ETAG:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("ETag", MOCK_ETAG)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        params = parse_qs(urlparse(self.path).query, keep_blank_values=True)
+        ids = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["ids"]
+        self.requested_params.append({**params, "ids": ids})
+        papers = {paper["paperId"]: paper for paper in MOCK_PAPERS}
+        details = [{**papers[paper_id], "citationCount": int(paper_id[1:]) * 10} if paper_id in papers else None
+                   for paper_id in ids]
+        body = json.dumps(details).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
 class TestResearchModule(unittest.TestCase):
     def test_build_query(self):
         """
@@ -15,6 +155,13 @@ class TestResearchModule(unittest.TestCase):
         expected = '("term1") AND ("term2") OR ("term3") NOT ("term4")'
         self.assertEqual(query, expected)
 
+    def test_to_bulk_query(self):
+        """
+        Testet die Übersetzung der logischen Operatoren in die Syntax des Bulk-Endpunkts (NOT vor AND vor OR).
+        """
+        query = build_query(["term1", "term2"], or_terms=["term3"], not_terms=["term4"])
+        self.assertEqual(to_bulk_query(query), '("term1" + "term2") | ("term3" + -"term4")')
+
     @patch("research.requests.get")
     def test_search_semantic_scholar_empty(self, mock_get):
         """
@@ -24,6 +171,7 @@ class TestResearchModule(unittest.TestCase):
             def __init__(self, json_data, status_code):
                 self._json = json_data
                 self.status_code = status_code
+                self.content = json.dumps(json_data).encode("utf-8")
             def json(self):
                 return self._json
 
@@ -35,6 +183,1241 @@ class TestResearchModule(unittest.TestCase):
         self.assertIsInstance(results, list)
         self.assertEqual(len(results), 0)
 
+class TestSearchPlanning(unittest.TestCase):
+    def test_plan_search(self):
+        """
+        Testet die Übersetzung der Filter in serverseitige Parameter.
+        """
+        plan = plan_search(start_year=2020, end_year=None, open_access_only=True, pdf_available_only=True)
+        self.assertEqual(plan["params"], {"year": "2020-", "openAccessPdf": ""})
+        self.assertEqual(plan["server_side"], ["year", "openAccessPdf"])
+        self.assertEqual(plan_search(start_year=2020, server_side_filters=False)["params"], {})
+        self.assertEqual(plan_search(since="2024-05-01")["params"], {"publicationDateOrYear": "2024-05-01:"})
+
+class TestQueryCompiler(unittest.TestCase):
+    def test_normalization_and_hash(self):
+        """
+        Testet, dass äquivalente Schreibweisen dieselbe kanonische Form und denselben Hash ergeben.
+        """
+        first = parse_query('("LLM") AND ("school" OR "education") NOT ("survey")')
+        second = parse_query('-"survey" + ("Education" | school | school) + "llm"')
+        self.assertEqual(normalize_query(first), normalize_query(second))
+        self.assertEqual(query_hash(first), query_hash(second))
+        self.assertEqual(compile_query(normalize_query(first)),
+                         '("llm") AND (("education") OR ("school")) AND NOT ("survey")')
+        self.assertEqual(compile_query(normalize_query(first), dialect="bulk"),
+                         '"llm" + ("education" | "school") + -"survey"')
+        self.assertEqual(normalize_query(parse_query('NOT NOT "a"')), normalize_query(parse_query('"a"')))
+        with self.assertRaises(ValueError):
+            parse_query('("a" AND')
+
+    def test_execute_query_set_algebra(self):
+        """
+        Testet die Zerlegung in Teilanfragen, die Vereinigung anhand der paperId und den Rückgriff auf
+        die Mengendifferenz für Publikationen ohne Textfelder, sofern das Ergebnis vollständig ist.
+        """
+        corpus = {
+            '("llm") AND ("school")': [{"paperId": "a"}, {"paperId": "b"}],
+            '("education") AND ("llm")': [{"paperId": "b"}, {"paperId": "c"}],
+            '("survey")': [{"paperId": "c"}]
+        }
+        calls = []
+
+        def search(query, stats=None):
+            calls.append(query)
+            stats.update({"calls": 1, "complete": True})
+            return corpus.get(query, [])
+
+        node = from_terms(["llm"], or_terms=["school", "education"], not_terms=["survey"])
+        memo, stats = {}, {}
+        results = execute_query(node, search, memo=memo, stats=stats)
+        self.assertEqual([paper["paperId"] for paper in results], ["b", "a"])
+        self.assertEqual(sorted(calls), sorted(corpus))
+        self.assertEqual((stats["subqueries"], stats["executed"], stats["calls"]), (3, 3, 3))
+
+        execute_query(node, search, memo=memo, stats=stats)
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(stats["reused"], 3)
+
+    def test_execute_query_negation_is_local(self):
+        """
+        Testet, dass negierte Operanden auf den Textfeldern der positiven Treffer geprüft werden, statt
+        die (auf 'limit' gekürzte) Trefferliste des negierten Begriffs abzuziehen.
+        """
+        corpus = {
+            '("llm")': [
+                {"paperId": "a", "title": "LLM tutors", "abstract": "A survey of tutoring systems."},
+                {"paperId": "b", "title": "LLM grading", "abstract": None, "tldr": {"text": "Grading essays."}},
+                {"paperId": "c", "title": "Surveys of LLMs", "abstract": "Overview."}
+            ],
+            # Gekürzte Trefferliste: "a" fehlt, obwohl es den Begriff enthält.
+            '("survey")': [{"paperId": "b"}]
+        }
+        calls = []
+
+        def search(query, stats=None):
+            calls.append(query)
+            stats.update({"calls": 1, "complete": False})
+            return corpus.get(query, [])
+
+        stats = {}
+        results = execute_query(from_terms(["llm"], not_terms=["survey"]), search, stats=stats)
+        # "Surveys" wird wie bei der Suche von Semantic Scholar auf "survey" zurückgeführt.
+        self.assertEqual([paper["paperId"] for paper in results], ["b"])
+        self.assertEqual(calls, ['("llm")'])
+        self.assertEqual((stats["filtered_locally"], stats["undecided"]), (2, 0))
+
+        # Ohne Textfelder wird eine unvollständige Trefferliste nicht abgezogen.
+        corpus['("llm")'] = [{"paperId": "a"}, {"paperId": "b"}]
+        results = execute_query(from_terms(["llm"], not_terms=["survey"]), search, stats=stats)
+        self.assertEqual([paper["paperId"] for paper in results], ["a"])
+        self.assertEqual(stats["undecided"], 1)
+
+    def test_execute_query_split_conjunctions(self):
+        """
+        Testet, dass einzeln angefragte Operanden nicht geschnitten, sondern lokal geprüft werden.
+        """
+        corpus = {
+            '("llm")': [{"paperId": "a", "title": "LLM tutors at school"}, {"paperId": "b", "title": "LLM agents"}],
+            '("school")': [{"paperId": "c", "title": "School meals"}]
+        }
+
+        def search(query, stats=None):
+            return corpus.get(query, [])
+
+        results = execute_query(from_terms(["llm", "school"]), search, split_conjunctions=True)
+        self.assertEqual([paper["paperId"] for paper in results], ["a"])
+
+class TestConcurrentSearch(unittest.TestCase):
+    def setUp(self):
+        MockSemanticScholarHandler.requested_offsets = []
+        MockSemanticScholarHandler.requested_params = []
+        MockSemanticScholarHandler.reject_filters = False
+        MockSemanticScholarHandler.throttled_responses = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), MockSemanticScholarHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}/paper/search"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_throttled_page_is_retried_after_retry_after(self):
+        """
+        Testet, dass eine mit 429 abgelehnte Seite gemäß Retry-After erneut angefragt wird.
+        """
+        MockSemanticScholarHandler.throttled_responses = 1
+        results = search_semantic_scholar("mock", limit=5, requests_per_second=100, base_url=self.base_url)
+        self.assertEqual([paper["paperId"] for paper in results], ["p0", "p1", "p2", "p3", "p4"])
+        self.assertEqual(len(MockSemanticScholarHandler.requested_params), 2)
+
+    def test_concurrent_pages_are_merged_in_order(self):
+        """
+        Testet, dass parallel abgerufene Seiten gefiltert und in Offset-Reihenfolge zusammengeführt werden.
+        """
+        results = search_semantic_scholar("mock", start_year=2020, limit=10, max_workers=4,
+                                          requests_per_second=100, base_url=self.base_url,
+                                          server_side_filters=False)
+        expected = [paper["paperId"] for paper in MOCK_PAPERS if paper["year"] >= 2020][:10]
+        self.assertEqual([paper["paperId"] for paper in results], expected)
+        self.assertGreater(len(MockSemanticScholarHandler.requested_offsets), 1)
+
+    def test_excluded_ids_do_not_consume_limit(self):
+        """
+        Testet, dass ausgeschlossene paperIds (z. B. eines inkrementellen Laufs) vor dem Limit übersprungen
+        werden und weiter geblättert wird, bis 'limit' andere Publikationen gefunden sind.
+        """
+        results = search_semantic_scholar("mock", limit=5, max_workers=1, requests_per_second=100,
+                                          base_url=self.base_url, exclude_ids={"p0", "p1", "p2", "p3", "p4"})
+        self.assertEqual([paper["paperId"] for paper in results], ["p5", "p6", "p7", "p8", "p9"])
+
+    def test_concurrent_search_stops_at_end_of_results(self):
+        """
+        Testet, dass die Suche bei einer leeren Seite endet und keine Duplikate liefert.
+        """
+        results = search_semantic_scholar("mock", limit=100, max_workers=3,
+                                          requests_per_second=100, base_url=self.base_url)
+        self.assertEqual(len(results), len(MOCK_PAPERS))
+        self.assertEqual(len({paper["paperId"] for paper in results}), len(MOCK_PAPERS))
+
+    def test_year_filter_is_pushed_to_server(self):
+        """
+        Testet, dass der Zeitraum als 'year'-Parameter übertragen wird, ohne zusätzliche ungefilterte
+        Anfrage; die Einsparung wird nur auf Wunsch geschätzt und nicht als Suchaufruf gezählt.
+        """
+        stats = {}
+        results = search_semantic_scholar("mock", start_year=2022, end_year=2023, limit=5,
+                                          requests_per_second=100, base_url=self.base_url, stats=stats)
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(2022 <= paper["year"] <= 2023 for paper in results))
+        self.assertTrue(all("year" in params for params in MockSemanticScholarHandler.requested_params))
+        self.assertEqual(MockSemanticScholarHandler.requested_params[0]["year"], ["2022-2023"])
+        self.assertEqual(stats["server_side_filters"], ["year"])
+        self.assertEqual(stats["calls"], len(MockSemanticScholarHandler.requested_params))
+        self.assertIsNone(stats["saved_calls"])
+
+        MockSemanticScholarHandler.requested_params = []
+        stats = {}
+        search_semantic_scholar("mock", start_year=2022, end_year=2023, limit=5, requests_per_second=100,
+                                base_url=self.base_url, stats=stats, estimate_savings=True)
+        self.assertEqual(stats["probe_calls"], 1)
+        self.assertEqual(stats["calls"], len(MockSemanticScholarHandler.requested_params) - 1)
+        self.assertGreater(stats["saved_calls"], 0)
+        self.assertGreater(stats["saved_bytes"], 0)
+
+    def test_rejected_server_filters_fall_back_to_client(self):
+        """
+        Testet den Rückfall auf clientseitige Filterung, falls die API die Filterparameter ablehnt.
+        """
+        MockSemanticScholarHandler.reject_filters = True
+        stats = {}
+        results = search_semantic_scholar("mock", start_year=2022, end_year=2023, limit=5,
+                                          requests_per_second=100, base_url=self.base_url, stats=stats)
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(2022 <= paper["year"] <= 2023 for paper in results))
+        self.assertEqual(stats["server_side_filters"], [])
+
+    def test_two_phase_search_hydrates_survivors(self):
+        """
+        Testet, dass im Zwei-Phasen-Modus mit dem Triage-Profil gesucht und nur für die Treffer nachgeladen wird.
+        """
+        batch_url = self.base_url.replace("/paper/search", "/paper/batch")
+        results = search_semantic_scholar("mock", start_year=2024, limit=3, requests_per_second=100,
+                                          base_url=self.base_url, two_phase=True, batch_url=batch_url)
+        search_params = MockSemanticScholarHandler.requested_params[0]
+        batch_params = MockSemanticScholarHandler.requested_params[-1]
+        self.assertEqual(search_params["fields"], [FIELD_PROFILES["triage"]])
+        self.assertEqual(batch_params["fields"], [FIELD_PROFILES["full"]])
+        self.assertEqual(batch_params["ids"], [paper["paperId"] for paper in results])
+        self.assertEqual([paper["citationCount"] for paper in results], [90, 190, 290])
+
+    def test_bulk_stream_follows_continuation_token(self):
+        """
+        Testet, dass der Bulk-Stream ein Generator ist und allen Continuation-Tokens folgt.
+        """
+        stats = {}
+        stream = stream_semantic_scholar("mock", requests_per_second=100,
+                                         base_url=self.base_url + "/bulk", stats=stats)
+        self.assertIsInstance(stream, types.GeneratorType)
+        first = next(stream)
+        self.assertEqual(first["paperId"], "p0")
+        self.assertEqual(len(MockSemanticScholarHandler.requested_offsets), 1)
+        rest = list(stream)
+        self.assertEqual([first["paperId"]] + [paper["paperId"] for paper in rest],
+                         [paper["paperId"] for paper in MOCK_PAPERS])
+        self.assertEqual(MockSemanticScholarHandler.requested_offsets, [0, 15, 30])
+        self.assertEqual(stats["streamed_papers"], len(MOCK_PAPERS))
+
+    def test_bulk_stream_respects_limit_and_filters(self):
+        """
+        Testet, dass der Bulk-Stream nach 'limit' Treffern aufhört und den Zeitraum serverseitig filtert.
+        """
+        papers = list(stream_semantic_scholar("mock", start_year=2024, limit=3, requests_per_second=100,
+                                              base_url=self.base_url + "/bulk"))
+        self.assertEqual(len(papers), 3)
+        self.assertTrue(all(paper["year"] >= 2024 for paper in papers))
+        self.assertEqual(MockSemanticScholarHandler.requested_params[0]["year"], ["2024-"])
+
+class TestBatchEnrichment(unittest.TestCase):
+    def setUp(self):
+        MockSemanticScholarHandler.requested_params = []
+        MockSemanticScholarHandler.throttled_responses = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), MockSemanticScholarHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.batch_url = f"http://127.0.0.1:{self.server.server_address[1]}/paper/batch"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_fetch_paper_details_in_chunks(self):
+        """
+        Testet, dass IDs blockweise angefragt und die Ergebnisse in Eingabereihenfolge geliefert werden.
+        """
+        ids = ["p3", "unknown", "p1", "p7", "p5"]
+        details = fetch_paper_details(ids, fields="citationCount", chunk_size=2,
+                                      requests_per_second=100, base_url=self.batch_url)
+        self.assertEqual(len(MockSemanticScholarHandler.requested_params), 3)
+        self.assertEqual([paper["paperId"] if paper else None for paper in details],
+                         ["p3", None, "p1", "p7", "p5"])
+
+    def test_paper_id_from_result(self):
+        """
+        Testet die Ableitung der Batch-ID aus der Semantic-Scholar-URL bzw. dem DOI.
+        """
+        paper_id = "ba454ba8c594dfb86c25dff2e265c8a2686aa037"
+        self.assertEqual(paper_id_from_result({"URL": f"https://www.semanticscholar.org/paper/{paper_id}"}), paper_id)
+        self.assertEqual(paper_id_from_result({"URL": "N/A", "DOI": "10.1234/test"}), "DOI:10.1234/test")
+        self.assertIsNone(paper_id_from_result({"URL": "N/A", "DOI": "N/A"}))
+
+    def test_refresh_records_writes_only_changed_fields(self):
+        """
+        Testet, dass nur geänderte Felder überschrieben und die übrigen Werte beibehalten werden.
+        """
+        records = [
+            {"URL": "N/A", "DOI": "N/A", "Citation Count": 1},
+            {"URL": "https://www.semanticscholar.org/paper/" + "a" * 40, "Citation Count": 5,
+             "Year": 1999, "AI_analysis": {"Objective": "kept"}}
+        ]
+        with patch("enrichment.fetch_paper_details",
+                   return_value=[{"paperId": "a" * 40, "citationCount": 12, "year": 1999}]):
+            summary = refresh_records(records, fields="citationCount,year")
+        self.assertEqual(summary["requested"], 1)
+        self.assertEqual(summary["updated_papers"], 1)
+        self.assertEqual(summary["changed_fields"], {"Citation Count": 1})
+        self.assertEqual(records[1]["Citation Count"], 12)
+        self.assertEqual(records[1]["AI_analysis"], {"Objective": "kept"})
+        self.assertEqual(records[0]["Citation Count"], 1)
+
+class TestBatchRunner(unittest.TestCase):
+    def test_load_specs(self):
+        """
+        Testet das Zusammenführen gemeinsamer Parameter mit den einzelnen Suchaufträgen.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "queries.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"defaults": {"limit": 5}, "queries": [{"required_terms": ["llm"], "name": "llm search"},
+                                                                 {"required_terms": ["rag"], "limit": 7}]}, f)
+            specs = load_specs(path)
+        self.assertEqual([spec["name"] for spec in specs], ["llm_search", "query_2"])
+        self.assertEqual([spec["limit"] for spec in specs], [5, 7])
+        self.assertEqual(specs[0]["field_profile"], "full")
+
+    @patch("batch_runner.configure_rate_limits")
+    @patch("batch_runner.display_results")
+    @patch("batch_runner.save_results")
+    @patch("batch_runner.process_papers", side_effect=lambda papers: [{"Title": paper["title"]} for paper in papers])
+    @patch("batch_runner.run_search")
+    def test_run_batch_deduplicates(self, mock_search, mock_process, mock_save, *_):
+        """
+        Testet, dass Publikationen mehrerer Suchaufträge nur einmal verarbeitet, aber je Auftrag gespeichert werden.
+        """
+        mock_search.side_effect = [
+            ({"query": "a"}, [{"paperId": "p1", "title": "One"}, {"paperId": "p2", "title": "Two"}], {}),
+            ({"query": "b"}, [{"paperId": "p2", "title": "Two"}, {"paperId": "p3", "title": "Three"}], {})
+        ]
+        specs = [{"name": "a", "required_terms": ["a"]}, {"name": "b", "required_terms": ["b"]}]
+        specs = [{**SPEC_DEFAULTS, **spec} for spec in specs]
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ResponseCache(os.path.join(directory, "cache.sqlite3"))
+            summary = run_batch(specs, cache=cache)
+            cache.close()
+
+        self.assertEqual(len(mock_process.call_args[0][0]), 3)
+        self.assertEqual(summary["unique_papers"], 3)
+        self.assertEqual(summary["duplicates"], 1)
+        self.assertIs(mock_search.call_args_list[0].kwargs["memo"], mock_search.call_args_list[1].kwargs["memo"])
+        saved = {call.kwargs["name"]: [record["Title"] for record in call.args[0]] for call in mock_save.call_args_list}
+        self.assertEqual(saved, {"a": ["One", "Two"], "b": ["Two", "Three"]})
+
+    @patch("batch_runner.configure_rate_limits")
+    @patch("batch_runner.display_results")
+    @patch("batch_runner.save_results")
+    @patch("batch_runner.process_papers", side_effect=lambda papers: [{"Title": paper["title"]} for paper in papers])
+    @patch("main.search_semantic_scholar")
+    def test_run_batch_memo_respects_filters(self, mock_search, mock_process, mock_save, *_):
+        """
+        Testet, dass Suchaufträge mit denselben Begriffen, aber anderen Jahren nicht dieselben Teilergebnisse erhalten,
+        während identische Suchaufträge sie wiederverwenden.
+        """
+        mock_search.side_effect = lambda query, start_year=None, stats=None, **kwargs: [
+            {"paperId": f"p{start_year}", "title": f"Paper {start_year}"}]
+        specs = [{**SPEC_DEFAULTS, "name": name, "required_terms": ["llm"], "start_year": year}
+                 for name, year in (("alt", 2019), ("neu", 2023), ("neu_nochmal", 2023))]
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ResponseCache(os.path.join(directory, "cache.sqlite3"))
+            run_batch(specs, cache=cache)
+            cache.close()
+
+        self.assertEqual([call.kwargs["start_year"] for call in mock_search.call_args_list], [2019, 2023])
+        saved = {call.kwargs["name"]: [record["Title"] for record in call.args[0]] for call in mock_save.call_args_list}
+        self.assertEqual(saved, {"alt": ["Paper 2019"], "neu": ["Paper 2023"], "neu_nochmal": ["Paper 2023"]})
+
+class TestHarvestState(unittest.TestCase):
+    def test_watermark_and_seen_ids(self):
+        """
+        Testet Wasserzeichen (abzüglich Rückschau), bekannte paperIds und die Persistenz über Instanzen hinweg.
+        """
+        key = state_key({"query": '("llm")', "start_year": 2020, "limit": 10})
+        self.assertEqual(key, state_key({"query": '("llm")', "start_year": 2020, "limit": 50}))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "state.sqlite3")
+            state = HarvestState(path, lookback_days=10)
+            self.assertIsNone(state.since(key))
+            state.update(key, '("llm")', [{"paperId": "p1", "publicationDate": "2024-03-20"},
+                                          {"paperId": "p2", "publicationDate": None}], "first.json")
+            state.update(key, '("llm")', [{"paperId": "p3", "publicationDate": "2024-01-01"}], "second.json")
+            state.close()
+
+            state = HarvestState(path, lookback_days=10)
+            self.assertEqual(state.since(key), "2024-03-10")
+            self.assertEqual(state.seen_ids(key), {"p1", "p2", "p3"})
+            self.assertEqual(state.load(key)["results_path"], "second.json")
+            state.close()
+
+    def test_merge_results(self):
+        """
+        Testet das Zusammenführen neuer Ergebnisse mit der Ergebnisdatei des vorherigen Laufs.
+        """
+        old_url = "https://www.semanticscholar.org/paper/" + "a" * 40
+        new_url = "https://www.semanticscholar.org/paper/" + "b" * 40
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "previous.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump([{"Title": "Old", "URL": old_url}, {"Title": "Stale", "URL": new_url}], f)
+            merged = merge_results([{"Title": "New", "URL": new_url}], path)
+        self.assertEqual([record["Title"] for record in merged], ["New", "Old"])
+        self.assertEqual(merge_results([{"Title": "New"}], None), [{"Title": "New"}])
+
+class TestRateLimiter(unittest.TestCase):
+    def test_parse_retry_after(self):
+        """
+        Testet die Auswertung von Retry-After als Sekundenangabe und als HTTP-Datum.
+        """
+        self.assertEqual(parse_retry_after("7"), 7.0)
+        self.assertEqual(parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT"), 0.0)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after("invalid"))
+
+    def test_token_bucket_spaces_requests(self):
+        """
+        Testet, dass der Token-Bucket Anfragen gleichmäßig auf die Rate verteilt und die Wartezeit misst.
+        """
+        limiter = RateLimiter("test", rate=50)
+        started = time.time()
+        for _ in range(6):
+            limiter.acquire()
+        elapsed = time.time() - started
+        metrics = limiter.metrics()
+        self.assertEqual(metrics["requests"], 6)
+        # Fünf Token über die Kapazität hinaus brauchen 5 / 50 Sekunden; verschlafene Zeit füllt den
+        # Bucket auf und verkürzt die gemessenen Wartezeiten, nicht aber die Gesamtdauer.
+        self.assertGreaterEqual(elapsed, 0.099)
+        self.assertGreater(metrics["throttled_seconds"], 0.05)
+
+    def test_backoff_halves_rate_and_gives_up(self):
+        """
+        Testet, dass ein Backoff die Rate reduziert und nach max_retries abbricht.
+        """
+        limiter = RateLimiter("test", rate=10, max_retries=1)
+        self.assertEqual(limiter.backoff(0, retry_after="0"), 0.0)
+        self.assertEqual(limiter.metrics()["current_rate"], 5)
+        self.assertIsNone(limiter.backoff(1))
+        limiter.success()
+        self.assertEqual(limiter.metrics()["current_rate"], 6)
+
+    def test_backoff_respects_max_delay_and_deadline(self):
+        """
+        Testet, dass Retry-After auf max_delay begrenzt wird und ein Backoff über die Deadline hinaus abbricht.
+        """
+        limiter = RateLimiter("test", rate=10, max_delay=0.05)
+        self.assertEqual(limiter.backoff(0, retry_after="3600"), 0.05)
+        self.assertIsNone(limiter.backoff(1, retry_after="0.05", deadline=time.time() + 0.01))
+        self.assertEqual(limiter.metrics()["retries"], 1)
+
+    def test_shared_state_across_instances(self):
+        """
+        Testet, dass zwei Limiter mit gemeinsamer Zustandsdatei (wie zwei Prozesse) ein Budget teilen.
+        """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            state_path = os.path.join(tmpdir, "limits.sqlite3")
+            first = RateLimiter("shared", rate=20, state_path=state_path)
+            second = RateLimiter("shared", rate=20, state_path=state_path)
+            first.acquire()
+            self.assertGreater(second.acquire(), 0.01)
+            first.connection.close()
+            second.connection.close()
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        MockSemanticScholarHandler.requested_offsets = []
+        MockSemanticScholarHandler.requested_params = []
+        MockSemanticScholarHandler.reject_filters = False
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), MockSemanticScholarHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}/paper/search"
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache_path = os.path.join(self.tmpdir.name, "cache.sqlite3")
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmpdir.cleanup()
+
+    def test_cached_pages_are_served_without_network(self):
+        """
+        Testet, dass eine wiederholte Suche vollständig aus dem Cache beantwortet wird.
+        """
+        cache = ResponseCache(self.cache_path)
+        first = search_semantic_scholar("mock", limit=20, requests_per_second=100,
+                                        base_url=self.base_url, cache=cache)
+        requests_after_first = len(MockSemanticScholarHandler.requested_offsets)
+        stats = {}
+        second = search_semantic_scholar("mock", limit=20, requests_per_second=100,
+                                         base_url=self.base_url, cache=cache, stats=stats)
+        self.assertEqual(first, second)
+        self.assertEqual(len(MockSemanticScholarHandler.requested_offsets), requests_after_first)
+        self.assertEqual(stats["calls"], 0)
+        self.assertEqual(stats["cache_hits"], requests_after_first)
+        self.assertEqual(stats["cache_misses"], 0)
+        cache.close()
+
+    def test_expired_entries_are_revalidated_with_etag(self):
+        """
+        Testet, dass abgelaufene Einträge per If-None-Match revalidiert werden (HTTP 304).
+        """
+        cache = ResponseCache(self.cache_path, ttl=0)
+        first = search_semantic_scholar("mock", limit=5, requests_per_second=100,
+                                        base_url=self.base_url, cache=cache)
+        stats = {}
+        second = search_semantic_scholar("mock", limit=5, requests_per_second=100,
+                                         base_url=self.base_url, cache=cache, stats=stats)
+        self.assertEqual(first, second)
+        self.assertEqual(stats["cache_revalidated"], 1)
+        self.assertEqual(stats["cache_misses"], 0)
+        cache.close()
+
+    def test_lru_eviction_respects_size_limit(self):
+        """
+        Testet, dass bei Überschreitung der Maximalgröße der am längsten ungenutzte Eintrag entfernt wird.
+        """
+        cache = ResponseCache(self.cache_path, max_bytes=250)
+        cache.store("url", {"offset": 0}, b'{"data": []}' + b" " * 100)
+        cache.store("url", {"offset": 1}, b'{"data": []}' + b" " * 100)
+        self.assertIsNotNone(cache.lookup("url", {"offset": 0}))
+        cache.store("url", {"offset": 2}, b'{"data": []}' + b" " * 100)
+        self.assertIsNotNone(cache.lookup("url", {"offset": 0}))
+        self.assertIsNone(cache.lookup("url", {"offset": 1}))
+        self.assertIsNotNone(cache.lookup("url", {"offset": 2}))
+        cache.close()
+
+class TestPdfStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.previous_cwd = os.getcwd()
+        os.chdir(self.directory.name)
+
+    def tearDown(self):
+        os.chdir(self.previous_cwd)
+        self.directory.cleanup()
+
+    def test_add_and_lookup(self):
+        """
+        Testet, dass identische Inhalte nur einmal gespeichert und über URL bzw. paperId gefunden werden.
+        """
+        store = PdfStore("store")
+        hashes = []
+        for url in ("https://a.org/1.pdf", "https://b.org/1.pdf"):
+            path = store.partial_path(url)
+            with open(path, "wb") as f:
+                f.write(b"%PDF-1.4 same content")
+            hashes.append(store.add_file(path, url=url, paper_id="p1"))
+
+        self.assertEqual(hashes[0], hashes[1])
+        self.assertEqual(store.lookup(url="https://a.org/1.pdf"), hashes[0])
+        self.assertEqual(store.lookup(paper_id="p1"), hashes[0])
+        self.assertIsNone(store.lookup(url="https://c.org/1.pdf"))
+        self.assertEqual(os.listdir(os.path.join("store", "tmp")), [])
+
+        store.link(hashes[0], "view.pdf")
+        with open("view.pdf", "rb") as f:
+            self.assertEqual(f.read(), b"%PDF-1.4 same content")
+        store.close()
+
+    def test_lookup_verifies_content(self):
+        """
+        Testet, dass nur Dateien mit angekündigter Content-Length übernommen und gespeicherte Dokumente nach
+        Ablauf von 'verify_interval' erneut gehasht werden; beschädigte Dokumente gelten dann als unbekannt.
+        """
+        store = PdfStore("store", verify_interval=0)
+        url = "https://a.org/1.pdf"
+        path = store.partial_path(url)
+        with open(path, "wb") as f:
+            f.write(b"%PDF-1.4 content")
+        with self.assertRaises(ValueError):
+            store.add_file(path, url=url, content_length=100)
+
+        sha256 = store.add_file(path, url=url, content_length=16)
+        self.assertEqual(store.lookup(url=url), sha256)
+
+        with open(store.object_path(sha256), "wb") as f:
+            f.write(b"%PDF-1.4 damaged")
+        self.assertIsNone(store.lookup(url=url))
+        self.assertFalse(os.path.exists(store.object_path(sha256)))
+        store.close()
+
+    @patch("pdf_manipulations.pdf_downloader.requests.Session")
+    def test_download_skips_known_documents(self, mock_session):
+        """
+        Testet, dass ein bereits gespeichertes Dokument beim zweiten Lauf ohne Netzwerkzugriff verlinkt wird.
+        """
+        response = types.SimpleNamespace(status_code=200, headers={},
+                                         iter_content=lambda chunk_size: iter([b"%PDF-1.4 ", b"body"]))
+        mock_session.return_value.get.return_value = response
+        store = PdfStore("store")
+
+        download_pdfs(["https://arxiv.org/pdf/1"], ["Paper"], ["p1"], store=store)
+        download_pdfs(["https://arxiv.org/pdf/1"], ["Paper"], ["p1"], store=store)
+        store.close()
+
+        self.assertEqual(mock_session.return_value.get.call_count, 1)
+        folders = os.listdir(os.path.join("pdf_manipulations", "pdf_db"))
+        for folder in folders:
+            with open(os.path.join("pdf_manipulations", "pdf_db", folder, "Paper.pdf"), "rb") as f:
+                self.assertEqual(f.read(), b"%PDF-1.4 body")
+
+    @patch("pdf_manipulations.pdf_downloader.requests.Session")
+    def test_download_rejects_non_pdf(self, mock_session):
+        """
+        Testet, dass HTML-Antworten nach dem ersten Block verworfen und in späteren Läufen übersprungen werden.
+        """
+        chunks_read = []
+
+        def respond(url, headers, stream, timeout):
+            def iter_content(chunk_size):
+                for chunk in (b"<!DOCTYPE html><html>" + b" " * 2048, b"rest of the page"):
+                    chunks_read.append(url)
+                    yield chunk
+            content_type = "text/html; charset=utf-8" if "landing" in url else "application/octet-stream"
+            return types.SimpleNamespace(status_code=200, headers={"Content-Type": content_type},
+                                         iter_content=iter_content, close=lambda: None)
+
+        mock_session.return_value.get.side_effect = respond
+        store = PdfStore("store")
+        urls = ["https://a.org/landing", "https://b.org/captcha"]
+
+        summary = download_pdfs(urls, ["A", "B"], store=store)
+        self.assertEqual(summary["rejected"], 2)
+        self.assertEqual(len(chunks_read), 2)
+        self.assertEqual(store.rejection(urls[0]), "Content-Type text/html")
+        self.assertEqual(store.rejection(urls[1]), "keine PDF-Signatur")
+        self.assertEqual(os.listdir(os.path.join("store", "tmp")), [])
+        self.assertEqual(os.listdir(summary["folder"]), [])
+
+        summary = download_pdfs(urls, ["A", "B"], store=store)
+        store.close()
+        self.assertEqual(summary["rejected"], 2)
+        self.assertEqual(mock_session.return_value.get.call_count, 2)
+
+    @patch("pdf_manipulations.pdf_downloader.requests.Session")
+    def test_resume_and_revalidate(self, mock_session):
+        """
+        Testet die Fortsetzung eines abgebrochenen Downloads per Range sowie die Revalidierung per ETag (304).
+        """
+        content = b"%PDF-1.4 0123456789"
+        requests_seen = []
+
+        def interrupted(chunk_size):
+            yield content[:8]
+            raise ConnectionError("Verbindung abgebrochen")
+
+        responses = [
+            types.SimpleNamespace(status_code=200, iter_content=interrupted,
+                                  headers={"Content-Length": str(len(content)), "ETag": '"v1"'}),
+            types.SimpleNamespace(status_code=206, iter_content=lambda chunk_size: iter([content[8:]]),
+                                  headers={"Content-Range": f"bytes 8-{len(content) - 1}/{len(content)}"}),
+            types.SimpleNamespace(status_code=304, headers={})
+        ]
+
+        def get(url, headers, **kwargs):
+            requests_seen.append(dict(headers))
+            return responses[len(requests_seen) - 1]
+
+        mock_session.return_value.get.side_effect = get
+        store = PdfStore("store")
+        url = "https://arxiv.org/pdf/2"
+
+        self.assertEqual(download_pdfs([url], ["Paper"], store=store)["failed"], 1)
+        self.assertIsNone(store.lookup(url=url))
+
+        summary = download_pdfs([url], ["Paper"], store=store)
+        self.assertEqual(summary["resumed"], 1)
+        self.assertEqual(requests_seen[1]["Range"], "bytes=8-")
+        self.assertEqual(requests_seen[1]["If-Range"], '"v1"')
+        with open(os.path.join(summary["folder"], "Paper.pdf"), "rb") as f:
+            self.assertEqual(f.read(), content)
+
+        self.assertEqual(download_pdfs([url], ["Paper"], store=store, revalidate=True)["revalidated"], 1)
+        self.assertEqual(requests_seen[2]["If-None-Match"], '"v1"')
+        store.close()
+
+    @patch("pdf_manipulations.pdf_downloader.requests.Session")
+    def test_parallel_download_limits_hosts(self, mock_session):
+        """
+        Testet die parallelen Downloads mit höchstens MAX_DOWNLOADS_PER_HOST gleichzeitigen Verbindungen pro Host.
+        """
+        lock = threading.Lock()
+        active, peak = {}, {}
+
+        def get(url, **kwargs):
+            host = urlparse(url).netloc
+            with lock:
+                active[host] = active.get(host, 0) + 1
+                peak[host] = max(peak.get(host, 0), active[host])
+
+            def iter_content(chunk_size):
+                time.sleep(0.05)
+                with lock:
+                    active[host] -= 1
+                yield f"%PDF-1.4 {url}".encode()
+
+            return types.SimpleNamespace(status_code=200, headers={}, iter_content=iter_content)
+
+        mock_session.return_value.get.side_effect = get
+        urls = [f"https://host{i % 2}.org/{i}.pdf" for i in range(8)]
+        store = PdfStore("store")
+        summary = download_pdfs(urls, [f"Paper {i}" for i in range(8)], store=store, max_workers=8)
+        store.close()
+
+        self.assertEqual(summary["downloaded"], 8)
+        self.assertEqual(len(os.listdir(summary["folder"])), 8)
+        self.assertLessEqual(max(peak.values()), MAX_DOWNLOADS_PER_HOST)
+
+    @patch("pdf_manipulations.pdf_downloader.requests.Session")
+    def test_same_url_is_downloaded_once(self, mock_session):
+        """
+        Testet, dass gleichzeitige Downloads derselben URL nicht in dieselbe Teildatei schreiben: die URL wird
+        einmal geladen, das zweite Paper übernimmt das Dokument aus dem Speicher.
+        """
+        def get(url, **kwargs):
+            def iter_content(chunk_size):
+                yield b"%PDF-1.4 "
+                time.sleep(0.05)
+                yield b"body"
+            return types.SimpleNamespace(status_code=200, headers={}, iter_content=iter_content)
+
+        mock_session.return_value.get.side_effect = get
+        store = PdfStore("store")
+        url = "https://arxiv.org/pdf/3"
+        summary = download_pdfs([url, url], ["Paper A", "Paper B"], store=store, max_workers=2)
+        store.close()
+
+        self.assertEqual((summary["downloaded"], summary["cached"]), (1, 1))
+        self.assertEqual(mock_session.return_value.get.call_count, 1)
+        self.assertEqual(os.listdir(os.path.join("store", "tmp")), [])
+        for title in ("Paper A", "Paper B"):
+            with open(os.path.join(summary["folder"], f"{title}.pdf"), "rb") as f:
+                self.assertEqual(f.read(), b"%PDF-1.4 body")
+
+class TestExtractionPool(unittest.TestCase):
+    def test_results_in_order_with_isolated_failures(self):
+        """
+        Testet, dass Absturz, Zeitüberschreitung und Fehler einer Aufgabe die übrigen nicht beeinträchtigen.
+        Die Kindprozesse werden nicht geforkt, daher werden picklebare Funktionen der Standardbibliothek verwendet.
+        """
+        tasks = [(str.upper, ("a",)), (os._exit, (3,)), (str.upper, ("b",)), (time.sleep, (30,)),
+                 (int, ("kein PDF",)), (str.upper, ("c",))]
+        started = time.time()
+        results = run_isolated(tasks, max_workers=3, timeout=1)
+
+        self.assertLess(time.time() - started, 10)
+        self.assertEqual([results[index]["result"] for index in (0, 2, 5)], ["A", "B", "C"])
+        self.assertTrue(all(results[index]["error"] is None for index in (0, 2, 5)))
+        self.assertIn("Exitcode 3", results[1]["error"])
+        self.assertIn("Zeitüberschreitung", results[3]["error"])
+        self.assertTrue(results[4]["error"].startswith("ValueError: invalid literal"))
+
+    def test_children_are_not_forked_from_threads(self):
+        """
+        Testet, dass die Kindprozesse über den Forkserver (bzw. spawn) statt per fork gestartet werden.
+        """
+        self.assertNotEqual(pdf_extraction_pool.START_METHOD, "fork")
+        result = run_isolated([(os.getppid, ())])[0]
+        self.assertIsNone(result["error"])
+        if pdf_extraction_pool.START_METHOD == "forkserver":
+            self.assertNotEqual(result["result"], os.getpid())
+
+    def test_split_pages(self):
+        """
+        Testet die Aufteilung der Seiten in zusammenhängende Bereiche mit Mindestgröße.
+        """
+        self.assertEqual(split_pages(300, 4), [(0, 75), (75, 150), (150, 225), (225, 300)])
+        self.assertEqual(split_pages(20, 16, min_pages=8), [(0, 10), (10, 20)])
+        self.assertEqual(split_pages(5, 16), [(0, 5)])
+
+    def test_page_parallel_extraction(self):
+        """
+        Testet, dass die seitenparallele Extraktion denselben Text in Seitenreihenfolge liefert.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "thesis.pdf")
+            write_test_pdf(path, ["Seite " + "x" * (page + 1) for page in range(40)])
+            result = extract_text_parallel(path, max_workers=4)
+            self.assertIsNone(result["error"])
+            self.assertEqual(result["pages"], 40)
+            self.assertEqual(result["text"], extract_cleaned_text(path))
+            self.assertTrue(result["text"].startswith("Seite x\fSeite xx\fSeite xxx\f"))
+
+            broken = os.path.join(directory, "broken.pdf")
+            with open(broken, "wb") as f:
+                f.write(b"<html></html>")
+            self.assertIsNotNone(extract_texts([broken], max_workers=4)[0]["error"])
+
+    def test_stream_pages(self):
+        """
+        Testet, dass die Seiten aus dem Kindprozess einzeln ankommen, beim ersten Durchlauf im Cache landen,
+        beim zweiten ohne Kindprozess aus dem Cache kommen und Fehler als ExtractionError gemeldet werden.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "paper.pdf")
+            write_test_pdf(path, ["Einleitung", "", "Methodik"])
+            cache = TextCache(os.path.join(directory, "texts.sqlite3"))
+
+            pages = stream_pages(path, cache=cache)
+            self.assertEqual(next(pages), (1, "Einleitung"))
+            self.assertEqual(cache.stats()["entries"], 0)
+            self.assertEqual(list(pages), [(2, ""), (3, "Methodik")])
+            self.assertEqual(cache.lookup(cache.make_key(path)), "Einleitung\f\fMethodik")
+
+            with patch.object(pdf_extraction_pool, "_get_context", side_effect=AssertionError("Prozess gestartet")):
+                self.assertEqual(list(stream_pages(path, cache=cache)), [(1, "Einleitung"), (2, ""), (3, "Methodik")])
+
+            broken = os.path.join(directory, "broken.pdf")
+            with open(broken, "wb") as f:
+                f.write(b"<html></html>")
+            with self.assertRaises(ExtractionError):
+                list(stream_pages(broken, cache=cache))
+            self.assertIsNone(cache.lookup(cache.make_key(broken)))
+            cache.close()
+
+class TestTextCleaning(unittest.TestCase):
+    SAMPLE = ("As shown in Fig. 3 and Table 2 [12], the score rose from 61.5 to 74.2 where n = 124 (pre-test). "
+              "The loss L(x) = sum_i w_i * f(x_i) + λ; with α = 0.05, β ≈ 0.8 and CF = 1.2 * 10^3; see [4-7].\n"
+              "Students asked well-structured questions about sin(x) ≤ 1 and Fi, Fg, x^2 {a + b}.")
+
+    def test_combined_regex_matches_each_pattern(self):
+        """
+        Testet, dass die Gruppierung im kombinierten Ausdruck die Treffer jedes einzelnen Musters nicht verändert.
+        """
+        for pattern in CLEANING_PATTERNS:
+            self.assertEqual(compile_cleaning_regex([pattern]).sub(" ", self.SAMPLE),
+                             re.sub(pattern, " ", self.SAMPLE), pattern)
+
+    def test_clean_text(self):
+        """
+        Testet, dass Formeln, Verweise und Zahlen entfernt und Seiten getrennt bereinigt werden.
+        """
+        cleaned = clean_text(self.SAMPLE + "\f" + "Second page (appendix)\f")
+        self.assertEqual(len(cleaned.split("\f")), 2)
+        for removed in ("Fig.", "[12]", "61.5", "λ", "α", "≈", "sin(x)", "where", "(appendix)"):
+            self.assertNotIn(removed, cleaned)
+        self.assertIn("Students asked", cleaned)
+        self.assertTrue(cleaned.endswith("Second page"))
+        self.assertNotIn("  ", cleaned)
+
+    def test_iter_pages_with_provenance(self):
+        """
+        Testet die seitenweise Extraktion und die Seitenangabe der daraus erzeugten Absätze.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "paper.pdf")
+            write_test_pdf(path, ["Einleitung", "", "Methodik und Ergebnisse"])
+            pages = iter_pages(path)
+            self.assertEqual(next(pages), (1, "Einleitung"))
+            self.assertEqual(list(pages), [(2, ""), (3, "Methodik und Ergebnisse")])
+
+            text = extract_cleaned_text(path)
+            self.assertEqual(split_cleaned_pages(text), [(1, "Einleitung"), (2, ""), (3, "Methodik und Ergebnisse")])
+            rows = embed_pages("paper", "Paper", split_cleaned_pages(text))
+            self.assertEqual([row["page"] for row in rows], [1, 3])
+            self.assertIn("Methodik", rows[1]["paragraph_text"])
+
+            rows = embed_pages("paper", "Paper", iter([(1, "Eins"), (2, "Zwei"), (3, "Drei")]), buffer_size=2)
+            self.assertEqual([row["pdf_id_order"] for row in rows], ["paper_0", "paper_1", "paper_2"])
+            self.assertEqual([row["page"] for row in rows], [1, 2, 3])
+
+class TestVectorization(unittest.TestCase):
+    def test_encode_texts_batched(self):
+        """
+        Testet, dass alle Absätze in einem längensortierten Aufruf kodiert und in Eingabereihenfolge
+        als normierte, zusammenhängende float32-Matrix zurückgegeben werden.
+        """
+        texts = ["kurz", "ein deutlich längerer Absatz", "mittellang"]
+        calls = []
+        original = pdf_vectorization.model.encode
+
+        def encode(sentences, **kwargs):
+            calls.append(list(sentences))
+            return original(sentences, **kwargs)
+
+        with patch.object(pdf_vectorization.model, "encode", side_effect=encode):
+            matrix = encode_texts(texts, batch_size=2)
+
+        self.assertEqual(calls, [["ein deutlich längerer Absatz", "mittellang", "kurz"]])
+        self.assertEqual(matrix.dtype, np.float32)
+        self.assertTrue(matrix.flags["C_CONTIGUOUS"])
+        np.testing.assert_allclose(np.linalg.norm(matrix, axis=1), 1.0, rtol=1e-5)
+        expected = original(["mittellang"], normalize_embeddings=True, convert_to_numpy=True)[0]
+        np.testing.assert_allclose(matrix[2], expected, rtol=1e-5)
+        self.assertEqual(encode_texts([]).shape[0], 0)
+
+class TestTextCache(unittest.TestCase):
+    def test_extraction_uses_cache(self):
+        """
+        Testet, dass byte-identische PDFs beim zweiten Lauf ohne Extraktion aus dem Cache kommen.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            paths = [os.path.join(directory, name) for name in ("a.pdf", "copy_of_a.pdf", "b.pdf")]
+            for path, text in zip(paths, ("Inhalt A", "Inhalt A", "Inhalt B")):
+                write_test_pdf(path, [text])
+            cache = TextCache(os.path.join(directory, "texts.sqlite3"))
+
+            first = extract_texts(paths, max_workers=2, cache=cache)
+            self.assertEqual([result["text"] for result in first], ["Inhalt A", "Inhalt A", "Inhalt B"])
+            self.assertEqual(cache.stats()["entries"], 2)
+
+            second = extract_texts(paths, max_workers=2, extract=os.path.basename, cache=cache)
+            self.assertEqual([result["text"] for result in second], ["Inhalt A", "Inhalt A", "Inhalt B"])
+            self.assertTrue(all(result["cached"] for result in second))
+            self.assertEqual(cache.stats()["hits"], 3)
+            self.assertEqual(cache.stats()["misses"], 3)
+            self.assertEqual(cache.stats()["hit_rate"], 0.5)
+            cache.close()
+
+    def test_eviction(self):
+        """
+        Testet, dass bei Überschreitung der Maximalgröße die am längsten nicht genutzten Texte entfernt werden.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            entry_size = len(zlib.compress("Text 1".encode("utf-8"), 6))
+            cache = TextCache(os.path.join(directory, "texts.sqlite3"), max_bytes=2 * entry_size)
+            cache.store("k1", "Text 1")
+            cache.store("k2", "Text 2")
+            self.assertEqual(cache.lookup("k1"), "Text 1")
+            cache.store("k3", "Text 3")
+            self.assertIsNone(cache.lookup("k2"))
+            self.assertEqual(cache.lookup("k1"), "Text 1")
+            self.assertEqual(cache.lookup("k3"), "Text 3")
+            self.assertEqual(cache.stats()["evicted"], 1)
+            cache.close()
+
+@patch.object(pdf_vectorization, "model", FakeEncoder())
+@patch.object(hnsw_cosine, "model", FakeEncoder())
+class TestEmbeddingStore(unittest.TestCase):
+    def test_append_and_mmap(self):
+        """
+        Testet, dass angehängte Absätze nach erneutem Öffnen als eine per mmap lesbare Matrix vorliegen und
+        nach PDF gefiltert geladen werden können.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            store = EmbeddingStore(directory)
+            first = embed_pages("a", "Titel A", [(1, "Erster Absatz"), (2, "Zweiter Absatz")])
+            second = embed_pages("b", "Titel B", [(1, "Dritter Absatz über Größe")])
+            self.assertEqual(store.append(first), range(0, 2))
+            self.assertEqual(store.append(second), range(2, 3))
+            store.close()
+
+            store = EmbeddingStore(directory)
+            matrix = np.load(os.path.join(directory, "embeddings.npy"), mmap_mode="r")
+            self.assertIsInstance(matrix, np.memmap)
+            self.assertEqual((matrix.shape, matrix.dtype), ((3, FakeEncoder.dimension), np.float32))
+            np.testing.assert_allclose(matrix[2], second[0]["embedding"], rtol=1e-6)
+
+            loaded = store.load(["b"])
+            self.assertEqual(loaded["paragraph_text"], [second[0]["paragraph_text"]])
+            self.assertEqual((loaded["row"], loaded["page"], loaded["title"]), ([2], [1], ["Titel B"]))
+            self.assertEqual(store.load()["pdf_id"], ["a", "a", "b"])
+            self.assertEqual(store.pdf_ids(), ["a", "b"])
+
+            results = search_within_pdfs("Absatz", ["a"], k=2, stored_data=store.load(["a"]))
+            self.assertEqual(sorted(text for text, _, _ in results), sorted(row["paragraph_text"] for row in first))
+            self.assertEqual({pdf_id for _, _, pdf_id in results}, {"a"})
+            store.close()
+
+    def test_float16(self):
+        """
+        Testet, dass ein Speicher auch als float16-Matrix angelegt werden kann und den Datentyp behält.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            store = EmbeddingStore(directory, dtype=np.float16)
+            store.append(embed_pages("a", "Titel A", [(1, "Absatz")]))
+            store.close()
+            store = EmbeddingStore(directory)
+            self.assertEqual(store.embeddings().dtype, np.float16)
+            store.clear()
+            self.assertEqual(len(store), 0)
+            store.close()
+
+    def test_incremental_index(self):
+        """
+        Testet, dass ersetzte und entfernte PDFs als gelöscht markiert und beim Kompaktieren entfernt werden,
+        während unveränderte PDFs erhalten bleiben.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "a.pdf")
+            write_test_pdf(path, ["Inhalt"])
+            self.assertNotEqual(document_key(path), TextCache.make_key(path))
+            self.assertIsNone(document_key(os.path.join(directory, "fehlt.pdf")))
+
+            store = EmbeddingStore(os.path.join(directory, "store"))
+            pages = {pdf_id: [(1, f"Absatz von {pdf_id}"), (2, f"Noch ein Absatz von {pdf_id}")] for pdf_id in "abcd"}
+            index_documents(store, {pdf_id: (f"key-{pdf_id}", embed_pages(pdf_id, pdf_id, pages[pdf_id]))
+                                    for pdf_id in "abcd"})
+            kept = store.load(["a"])
+
+            summary = index_documents(store, {"b": ("key-b2", embed_pages("b", "b", [(1, "Neuer Absatz")]))},
+                                      available=["a", "c"])
+            self.assertEqual((summary["indexed"], summary["removed"]), (1, 1))
+            self.assertEqual(store.document_keys(), {"a": "key-a", "b": "key-b2", "c": "key-c"})
+            self.assertEqual(store.pdf_ids(), ["a", "b", "c"])
+            # 4 von 9 Zeilen waren als gelöscht markiert, daher wurde kompaktiert.
+            self.assertEqual(summary["compacted"], 4)
+            self.assertEqual(store.stats()["tombstones"], 0)
+            self.assertEqual(store.embeddings().shape, (5, FakeEncoder.dimension))
+            store.close()
+
+            store = EmbeddingStore(os.path.join(directory, "store"))
+            loaded = store.load(["a", "b"])
+            self.assertEqual(loaded["row"], [0, 1, 4])
+            self.assertEqual(loaded["paragraph_text"][:2], kept["paragraph_text"])
+            np.testing.assert_array_equal(loaded["embedding"][:2], kept["embedding"])
+            self.assertEqual(sorted(os.listdir(os.path.join(directory, "store"))),
+                             ["embeddings.g1.npy", "metadata.sqlite3", "texts.g1.bin"])
+            store.close()
+
+    def test_interrupted_compact_keeps_store(self):
+        """
+        Testet, dass ein vor dem Commit der Metadaten abgebrochenes compact die bisherige Generation
+        unverändert lesbar lässt und die halb geschriebenen Dateien entfernt werden.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            store = EmbeddingStore(directory)
+            store.replace_document("a", "key-a", embed_pages("a", "a", [(1, "Alt")]))
+            store.replace_document("a", "key-a2", embed_pages("a", "a", [(1, "Neu"), (2, "Neu 2")]))
+            before = store.load()
+
+            with patch.object(store, "_next_generation", side_effect=OSError("Abbruch")):
+                with self.assertRaises(OSError):
+                    store.compact()
+            self.assertEqual(store.generation, 0)
+            store.close()
+
+            store = EmbeddingStore(directory)
+            self.assertEqual(sorted(os.listdir(directory)), ["embeddings.npy", "metadata.sqlite3", "texts.bin"])
+            loaded = store.load()
+            self.assertEqual((loaded["row"], loaded["paragraph_text"]), (before["row"], before["paragraph_text"]))
+            self.assertEqual(store.compact(), 1)
+            self.assertEqual(store.load()["paragraph_text"], before["paragraph_text"])
+            store.close()
+
+    def test_readers_leave_uncommitted_rows_alone(self):
+        """
+        Testet, dass Öffnen und Lesen die Zeilen eines noch nicht festgeschriebenen Schreibvorgangs weder
+        sehen noch abschneiden; erst der nächste Schreiber entfernt sie unter der Schreibsperre.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            first, second = embed_pages("a", "a", [(1, "Absatz")]), embed_pages("b", "b", [(1, "Zweiter")])
+            writer = EmbeddingStore(directory)
+            writer.append(first)
+            sizes = {name: os.path.getsize(os.path.join(directory, name)) for name in ("embeddings.npy", "texts.bin")}
+            # Ein laufender Schreiber hat Matrix und Texte bereits verlängert, die Metadaten aber noch nicht.
+            with open(os.path.join(directory, "embeddings.npy"), "ab") as file:
+                file.write(np.zeros(FakeEncoder.dimension, dtype=np.float32).tobytes())
+            with open(os.path.join(directory, "texts.bin"), "ab") as file:
+                file.write("Unfertig".encode("utf-8"))
+
+            reader = EmbeddingStore(directory)
+            self.assertEqual(reader.load()["paragraph_text"], [first[0]["paragraph_text"]])
+            self.assertEqual(reader.embeddings().shape, (1, FakeEncoder.dimension))
+            self.assertEqual(os.path.getsize(os.path.join(directory, "texts.bin")), sizes["texts.bin"] + 8)
+            self.assertEqual(os.path.getsize(os.path.join(directory, "embeddings.npy")),
+                             sizes["embeddings.npy"] + 4 * FakeEncoder.dimension)
+            reader.close()
+
+            writer.append(second)
+            self.assertEqual(os.path.getsize(os.path.join(directory, "texts.bin")),
+                             sizes["texts.bin"] + len(second[0]["paragraph_text"].encode("utf-8")))
+            self.assertEqual(writer.load()["paragraph_text"], [row["paragraph_text"] for row in first + second])
+            writer.close()
+
+@patch.object(pdf_vectorization, "model", FakeEncoder())
+@patch.object(hnsw_cosine, "model", FakeEncoder())
+class TestPersistentIndex(unittest.TestCase):
+    def test_index_is_persisted_and_filtered(self):
+        """
+        Testet, dass der globale Index einmal aufgebaut, gespeichert, nach dem Neustart geladen, um neue
+        Zeilen ergänzt und nach dem Kompaktieren neu aufgebaut wird; Treffer stammen nur aus dem gewählten PDF.
+        """
+        with tempfile.TemporaryDirectory() as directory, \
+                patch.object(hnsw_cosine, "EMBEDDING_STORE_DIR", Path(directory)), \
+                patch.object(hnsw_cosine, "EXACT_SEARCH_THRESHOLD", 0), \
+                patch.dict(hnsw_cosine._indexes, clear=True), \
+                patch.dict(hnsw_cosine._stores, clear=True):
+            store = EmbeddingStore(directory)
+            for pdf_id in ("a", "b"):
+                store.replace_document(pdf_id, pdf_id, embed_pages(pdf_id, pdf_id, [
+                    (page, f"Absatz {page} aus {pdf_id}") for page in range(1, 6)]))
+
+            results = search_within_pdfs("Absatz 3", ["b", "a"], k=3)
+            self.assertEqual([pdf_id for _, _, pdf_id in results], ["b"] * 3 + ["a"] * 3)
+            self.assertTrue(all("aus b" in text for text, _, _ in results[:3]))
+            exact = store.load(["b"])
+            query = hnsw_cosine.model.encode(["Absatz 3"], normalize_embeddings=True)[0]
+            best = exact["paragraph_text"][int(np.argmax(exact["embedding"] @ query))]
+            self.assertEqual(results[0][0], best)
+            self.assertTrue(os.path.exists(os.path.join(directory, "hnsw_index.bin")))
+
+            # Neuer Prozess: der gespeicherte Index wird geladen statt neu aufgebaut.
+            hnsw_cosine._indexes.clear()
+            with patch("rag.hnsw_cosine.hnswlib.Index.add_items", side_effect=AssertionError("neu aufgebaut")):
+                self.assertEqual(len(search_within_pdfs("Absatz", ["a"], k=2)), 2)
+
+            store.replace_document("c", "c", embed_pages("c", "c", [(1, "Absatz aus c")]))
+            self.assertEqual(search_within_pdfs("Absatz", ["c"], k=5)[0][2], "c")
+            self.assertEqual(get_index(directory).index.get_current_count(), 11)
+
+            store.remove_documents(["a"])
+            store.compact()
+            self.assertEqual([pdf_id for _, _, pdf_id in search_within_pdfs("Absatz", ["c"], k=5)], ["c"])
+            self.assertEqual(get_index(directory).index.get_current_count(), 6)
+            hnsw_cosine.get_store(directory).close()
+            store.close()
+
+    def test_small_documents_use_exact_search(self):
+        """
+        Testet, dass kleine PDFs ohne HNSW-Index exakt durchsucht werden und große den globalen Index nutzen.
+        """
+        with tempfile.TemporaryDirectory() as directory, \
+                patch.object(hnsw_cosine, "EMBEDDING_STORE_DIR", Path(directory)), \
+                patch.dict(hnsw_cosine._indexes, clear=True), \
+                patch.dict(hnsw_cosine._stores, clear=True):
+            store = EmbeddingStore(directory)
+            store.replace_document("a", "a", embed_pages("a", "a", [(page, f"Absatz {page}") for page in range(1, 8)]))
+            loaded = store.load(["a"])
+            query = hnsw_cosine.model.encode(["Frage"], normalize_embeddings=True)[0]
+            scores = loaded["embedding"] @ query
+            order = np.argsort(-scores, kind="stable")
+            expected = [loaded["paragraph_text"][i] for i in order]
+
+            with patch("rag.hnsw_cosine.get_index", side_effect=AssertionError("Index verwendet")), \
+                    patch("rag.hnsw_cosine.EmbeddingStore", wraps=EmbeddingStore) as opened:
+                results = search_within_pdfs("Frage", ["a"], k=10)
+                self.assertEqual(search_within_pdfs("Frage", ["a"], k=10), results)
+            # Der Speicher wird je Prozess nur einmal geöffnet.
+            self.assertEqual(opened.call_count, 1)
+            self.assertEqual([text for text, _, _ in results], expected)
+            self.assertEqual([pdf_id for _, _, pdf_id in results], ["a"] * 7)
+            np.testing.assert_allclose([score for _, score, _ in results], scores[order], rtol=0, atol=1e-5)
+
+            with patch.object(hnsw_cosine, "EXACT_SEARCH_THRESHOLD", 3):
+                results = search_within_pdfs("Frage", ["a"], k=3)
+            self.assertEqual([text for text, _, _ in results], expected[:3])
+            self.assertEqual([pdf_id for _, _, pdf_id in results], ["a"] * 3)
+            np.testing.assert_allclose([score for _, score, _ in results], scores[order[:3]], rtol=0, atol=1e-5)
+            self.assertIsNotNone(get_index(directory).index)
+            hnsw_cosine.get_store(directory).close()
+            store.close()
+
+class TestPipeline(unittest.TestCase):
+    def test_run_pipeline_overlaps_stages(self):
+        """
+        Testet Reihenfolge, Fehlerweitergabe und das Überlappen der Stufen.
+        """
+        def slow(factor):
+            def func(item):
+                time.sleep(0.05)
+                if item == 3 and factor == 10:
+                    raise ValueError("kaputt")
+                return item * factor
+            return func
+
+        stats = {}
+        results = run_pipeline(range(6), [Stage("a", slow(10), 1), Stage("b", slow(2), 1)], queue_size=2, stats=stats)
+        self.assertEqual(results, [0, 20, 40, 6, 80, 100])
+        self.assertEqual(stats["stages"]["a"]["errors"], 1)
+        self.assertLess(stats["seconds"], 0.55)
+
+    def test_run_pipeline_consumes_generator(self):
+        """
+        Testet, dass ein Generator erst beim Einspeisen konsumiert wird und seine Ausnahmen weitergereicht werden.
+        """
+        first_done = threading.Event()
+
+        def items():
+            yield 1
+            # Das zweite Element wird erst geliefert, nachdem das erste die Kette durchlaufen hat.
+            self.assertTrue(first_done.wait(5))
+            yield 2
+
+        def finish(item):
+            first_done.set()
+            return item
+
+        self.assertEqual(run_pipeline(items(), [Stage("a", lambda item: item * 10, 1), Stage("b", finish, 1)]),
+                         [10, 20])
+
+        def broken():
+            yield 1
+            raise ConnectionError("Stream abgebrochen")
+
+        with self.assertRaises(ConnectionError):
+            run_pipeline(broken(), [Stage("a", lambda item: item, 1)])
+
+    @patch("extraction.create_run_folder", lambda: "run")
+    @patch("extraction.create_session", lambda workers: None)
+    @patch("extraction.PdfStore")
+    @patch("extraction.TextCache")
+    @patch("extraction.document_key", lambda path, text_key=None: "key")
+    @patch("extraction.download_pdf", lambda session, store, url, path, paper_id: ("downloaded", 10))
+    @patch("pdf_manipulations.pdf_vectorization.stream_pages",
+           lambda path, **kwargs: iter([(1, "Erster Absatz. Zweiter Absatz.")]))
+    @patch("extraction.query_to_cohere", lambda question, pdf, stored_data=None: f"{pdf}: {stored_data and len(stored_data['pdf_id'])}")
+    def test_process_pipelined(self, text_cache_class, _):
+        """
+        Testet die Stufenkette: KI-Analyse mit den eigenen Absätzen des PDFs, Papers ohne PDF über den
+        EmbeddingStore; das PDF wird einmal gehasht und vor der Analyse indexiert, ein unverändertes PDF
+        wird beim zweiten Lauf nicht erneut vektorisiert.
+        """
+        records = [{"Title": "With PDF"}, {"Title": "Without PDF"}]
+        jobs = [{"url": "https://arxiv.org/pdf/1", "title": "With PDF", "paper_id": "p1"}, None]
+        with tempfile.TemporaryDirectory() as directory:
+            with patch("extraction.EmbeddingStore", lambda: EmbeddingStore(directory)):
+                stats = {}
+                processed = process_pipelined(zip(records, jobs), stats)
+
+                self.assertEqual(processed[0]["AI_analysis"]["Objective"], "With PDF: 1")
+                self.assertEqual(processed[1]["AI_analysis"]["Objective"], "Without PDF: None")
+                self.assertEqual(stats["stages"]["vectorise"]["items"], 2)
+                self.assertEqual(stats["stages"]["index"]["items"], 2)
+                text_cache_class.make_key.assert_called_once_with(os.path.join("run", "With PDF.pdf"))
+
+                with patch("pdf_manipulations.pdf_vectorization.stream_pages",
+                           side_effect=AssertionError("erneut extrahiert")):
+                    processed = process_pipelined([({"Title": "With PDF"}, jobs[0])])
+                self.assertEqual(processed[0]["AI_analysis"]["Objective"], "With PDF: 1")
+
+            store = EmbeddingStore(directory)
+            self.assertEqual(store.document_keys(), {"With PDF": "key"})
+            self.assertEqual(store.stats()["tombstones"], 0)
+            store.close()
+
+    @patch("extraction.create_run_folder", lambda: "run")
+    @patch("extraction.create_session", lambda workers: None)
+    @patch("extraction.PdfStore")
+    @patch("extraction.TextCache")
+    @patch("extraction.document_key", lambda path, text_key=None: f"key-{path}")
+    @patch("extraction.download_pdf", lambda session, store, url, path, paper_id: ("downloaded", 10))
+    @patch("pdf_manipulations.pdf_vectorization.stream_pages",
+           lambda path, **kwargs: iter([(1, "Erster Absatz. Zweiter Absatz.")]))
+    @patch("extraction.query_to_cohere", lambda question, pdf, stored_data=None: "Antwort")
+    def test_incremental_runs_keep_earlier_papers(self, *_):
+        """
+        Testet, dass zwei aufeinanderfolgende inkrementelle Läufe, die jeweils nur neue Papers liefern,
+        die Embeddings der Papers aus dem vorherigen Lauf nicht entfernen.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            with patch("extraction.EmbeddingStore", lambda: EmbeddingStore(directory)):
+                for title in ("First", "Second"):
+                    process_pipelined([({"Title": title},
+                                        {"url": f"https://arxiv.org/pdf/{title}", "title": title, "paper_id": title})])
+
+            store = EmbeddingStore(directory)
+            self.assertEqual(store.document_keys(), {"First": "key-run/First.pdf", "Second": "key-run/Second.pdf"})
+            self.assertEqual(store.stats()["tombstones"], 0)
+            self.assertEqual(store.pdf_ids(), ["First", "Second"])
+            store.close()
+
 class TestExtractionModule(unittest.TestCase):
     def test_extract_metadata(self):
         """